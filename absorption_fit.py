@@ -0,0 +1,404 @@
+import os
+import json
+import click
+import hashlib
+import numpy as np
+
+from room import Room
+from utils import get_subdirectories
+from materials import material_absorption
+from numpy_ism import WALLS
+from analysis import OCTAVE_BANDS, room_metrics
+
+"""
+Fit per-wall, per-band absorption coefficients of measured rooms so that the
+RT60 predicted by Eyring's (or Sabine's) formula matches the measured one.
+
+With a single RT60 per band and six walls, the problem is underdetermined,
+so absorption is kept close to a prior, e.g. the materials picked by hand in
+`room_materials_registry`, by minimizing
+```
+(RT60(absorption) / target - 1) ** 2 + reg * ||absorption - prior|| ** 2
+```
+for every room and band independently. This is solved with Gauss-Newton
+iterations, with closed-form Jacobians of the RT60 formulas, for all rooms
+and bands at once.
+
+Fitted materials are cached as `absorption_fit.json` next to the
+`config.json` of each room, and are only fitted again if the config or the
+fit settings change.
+
+Example usage:
+```
+python absorption_fit.py \
+measured_room_dataset_train_BUT_ReverbDB_7rooms_2020_05_07T15_23_53
+```
+"""
+
+# same constant as `utils.rt60_to_absorption`
+SABINE_CONSTANT = 0.163
+
+FIT_FILE = "absorption_fit.json"
+
+# bump when the fit changes in a way that invalidates cached results
+FIT_VERSION = 1
+
+
+def wall_areas(room_dim):
+    """
+    Area of each wall (in `WALLS` order) and volume of shoebox rooms.
+
+    Parameters
+    ----------
+    room_dim : array
+        Room dimensions of shape (n_rooms, 3).
+
+    Returns
+    -------
+    areas : array
+        Shape (n_rooms, 6).
+    volume : array
+        Shape (n_rooms,).
+    """
+    room_dim = np.atleast_2d(np.asarray(room_dim, dtype=float))
+    x, y, z = room_dim.T
+    areas = np.stack([y * z, y * z, x * z, x * z, x * y, x * y], axis=-1)
+    return areas, x * y * z
+
+
+def uniform_absorption(room_dim, rt60):
+    """
+    Same absorption for all walls, obtained with Eyring's formula as in
+    `utils.rt60_to_absorption`, of shape (n_rooms, 6, n_bands).
+
+    Parameters
+    ----------
+    room_dim : array
+        Room dimensions of shape (n_rooms, 3).
+    rt60 : array
+        RT60 in seconds, of shape (n_rooms, n_bands).
+    """
+    areas, volume = wall_areas(room_dim)
+    total_area = areas.sum(axis=1)[:, np.newaxis]
+    absorption = 1.0 - np.exp(
+        -SABINE_CONSTANT * volume[:, np.newaxis] / (rt60 * total_area)
+    )
+    return np.repeat(absorption[:, np.newaxis], len(WALLS), axis=1)
+
+
+def reverberation_time(absorption, areas, volume, method="eyring"):
+    """
+    RT60 of shoebox rooms and its derivative w.r.t. wall absorption.
+
+    Parameters
+    ----------
+    absorption : array
+        Energy absorption of each wall, shape (n_rooms, 6, n_bands).
+    areas : array
+        Area of each wall, shape (n_rooms, 6).
+    volume : array
+        Volume of rooms, shape (n_rooms,).
+    method : str, optional
+        `eyring` or `sabine`.
+
+    Returns
+    -------
+    rt60 : array
+        Shape (n_rooms, n_bands).
+    jac : array
+        Derivative of `rt60` w.r.t. `absorption`, shape (n_rooms, 6,
+        n_bands).
+    """
+    areas = areas[:, :, np.newaxis]
+    volume = volume[:, np.newaxis]
+    total_area = areas.sum(axis=1)
+    eq_area = np.sum(areas * absorption, axis=1)
+    if method == "sabine":
+        rt60 = SABINE_CONSTANT * volume / eq_area
+        jac = -(rt60 / eq_area)[:, np.newaxis] * areas
+    elif method == "eyring":
+        mean_absorption = eq_area / total_area
+        log_refl = -np.log1p(-mean_absorption)
+        rt60 = SABINE_CONSTANT * volume / (total_area * log_refl)
+        drt60 = -rt60 / (log_refl * (1 - mean_absorption))
+        jac = (drt60 / total_area)[:, np.newaxis] * areas
+    else:
+        raise ValueError("Unknown method : {}".format(method))
+    return rt60, jac
+
+
+def fit_absorption(
+    room_dim,
+    target_rt60,
+    prior=None,
+    method="eyring",
+    reg=1e-4,
+    n_iter=50,
+    tol=1e-4,
+    bounds=(0.01, 0.99),
+):
+    """
+    Fit per-wall, per-band absorption of a batch of rooms to target RT60s.
+
+    Parameters
+    ----------
+    room_dim : array
+        Room dimensions of shape (n_rooms, 3).
+    target_rt60 : array
+        Target RT60 in seconds, of shape (n_rooms, n_bands).
+    prior : array, optional
+        Absorption to stay close to and start from, of shape
+        (n_rooms, 6, n_bands). Default is the same absorption for all walls,
+        obtained with Eyring's formula.
+    method : str, optional
+        RT60 formula, `eyring` or `sabine`.
+    reg : float, optional
+        Weight of the distance to the prior.
+    n_iter : int, optional
+        Maximum number of Gauss-Newton iterations.
+    tol : float, optional
+        Stop once all relative RT60 errors, or all absorption updates, are
+        below this value.
+    bounds : tuple, optional
+        Range of absorption coefficients.
+
+    Returns
+    -------
+    absorption : array
+        Shape (n_rooms, 6, n_bands).
+    rt60 : array
+        RT60 of fitted absorption, shape (n_rooms, n_bands).
+    """
+    target_rt60 = np.atleast_2d(np.asarray(target_rt60, dtype=float))
+    areas, volume = wall_areas(room_dim)
+    if prior is None:
+        prior = uniform_absorption(room_dim, target_rt60)
+    prior = np.clip(prior, *bounds)
+
+    absorption = prior.copy()
+    for _ in range(n_iter):
+        rt60, jac = reverberation_time(absorption, areas, volume, method)
+        residual = rt60 / target_rt60 - 1
+        if np.max(np.abs(residual)) < tol:
+            break
+        jac = jac / target_rt60[:, np.newaxis]
+
+        # solve (reg * I + j j^T) step = -v per room and band, in closed form
+        # with the Sherman-Morrison formula as j j^T has rank one, and again
+        # without walls whose absorption is at a bound and pushed beyond it
+        v = jac * residual[:, np.newaxis] + reg * (absorption - prior)
+        free = np.ones(absorption.shape, dtype=bool)
+        for _ in range(len(WALLS)):
+            _jac = np.where(free, jac, 0.0)
+            _v = np.where(free, v, 0.0)
+            jv = np.sum(_jac * _v, axis=1, keepdims=True)
+            jj = np.sum(_jac * _jac, axis=1, keepdims=True)
+            step = -(_v - _jac * jv / (reg + jj)) / reg
+            blocked = free & (
+                ((absorption <= bounds[0]) & (step < 0))
+                | ((absorption >= bounds[1]) & (step > 0))
+            )
+            if not np.any(blocked):
+                break
+            free &= ~blocked
+        absorption = np.clip(absorption + step, *bounds)
+        if np.max(np.abs(step)) < tol:
+            break
+
+    rt60, _ = reverberation_time(absorption, areas, volume, method)
+    return absorption, rt60
+
+
+def measured_rt60(room, use_rirs=False, center_freqs=None):
+    """
+    Target RT60 of a measured room per band, the median of the RT60
+    estimates of its mics (`t60_estimate`), or the median T30 of its RIRs.
+
+    Parameters
+    ----------
+    room : Room
+        Measured room.
+    use_rirs : bool, optional
+        Whether to estimate the RT60 per band from the RIRs of the room,
+        falling back to `t60_estimate` for bands without a valid estimate.
+    center_freqs : list, optional
+        Bands, default is `analysis.OCTAVE_BANDS`.
+    """
+    if center_freqs is None:
+        center_freqs = OCTAVE_BANDS
+    estimates = np.hstack([_mic["t60_estimate"] for _mic in room.mic_metadata])
+    target = np.full(len(center_freqs), np.median(estimates))
+    if use_rirs:
+        metrics = room_metrics(room, center_freqs=center_freqs)
+        t30 = np.array(
+            [
+                metrics["t30_{}".format(fc)].median(skipna=True)
+                for fc in center_freqs
+            ]
+        )
+        target = np.where(np.isnan(t30), target, t30)
+    return target
+
+
+def _config_hash(room_path):
+    with open(os.path.join(room_path, "config.json"), "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_fit(room_path, settings=None):
+    """
+    Fitted materials of a room if cached, and fitted with `settings` (if
+    provided) on its current config, otherwise None.
+    """
+    fit_path = os.path.join(room_path, FIT_FILE)
+    if not os.path.isfile(fit_path):
+        return None
+    with open(fit_path) as f:
+        fit = json.load(f)
+    if fit["config_hash"] != _config_hash(room_path):
+        return None
+    if settings is not None and fit["settings"] != settings:
+        return None
+    return fit
+
+
+def fit_bundle(
+    dataset_path,
+    prior_materials=None,
+    method="eyring",
+    use_rirs=False,
+    reg=1e-4,
+    overwrite=False,
+):
+    """
+    Fit materials of all rooms of a measured bundle, reusing cached fits.
+
+    Parameters
+    ----------
+    dataset_path : str
+        Path to bundle, containing a `data` folder with one folder per room.
+    prior_materials : dict, optional
+        Materials (one per wall) to use as prior for each room ID, e.g.
+        `room_materials_registry`. Rooms without an entry get a uniform
+        prior.
+    method : str, optional
+        RT60 formula, `eyring` or `sabine`.
+    use_rirs : bool, optional
+        Whether to use the T30 of the measured RIRs per band as targets,
+        rather than `t60_estimate` for all bands.
+    reg : float, optional
+        Weight of the distance to the prior.
+    overwrite : bool, optional
+        Whether to fit again even if cached.
+
+    Returns
+    -------
+    dict
+        Materials of each room ID, one material description per wall that
+        can be passed to `compute_room_irs` as `room_properties`.
+    """
+    if prior_materials is None:
+        prior_materials = dict()
+    data_path = os.path.join(dataset_path, "data")
+
+    fitted = dict()
+    to_fit = []
+    for _id in sorted(get_subdirectories(data_path)):
+        room_path = os.path.join(data_path, _id)
+        room = Room.load(room_path)
+        settings = {
+            "version": FIT_VERSION,
+            "method": method,
+            "use_rirs": use_rirs,
+            "reg": reg,
+            "center_freqs": OCTAVE_BANDS,
+            "prior": prior_materials.get(room.id),
+        }
+        fit = None if overwrite else load_fit(room_path, settings)
+        if fit is not None:
+            fitted[room.id] = fit["materials"]
+        else:
+            to_fit.append((room_path, room, settings))
+    if len(to_fit) == 0:
+        return fitted
+
+    # fit all rooms and bands at once
+    room_dim = np.array([_room.params["dimensions"] for _, _room, _ in to_fit])
+    target_rt60 = np.array(
+        [measured_rt60(_room, use_rirs=use_rirs) for _, _room, _ in to_fit]
+    )
+    prior = uniform_absorption(room_dim, target_rt60)
+    for k, (_, _, _settings) in enumerate(to_fit):
+        if _settings["prior"] is not None:
+            prior[k] = material_absorption(
+                [_settings["prior"][wall] for wall in WALLS],
+                center_freqs=OCTAVE_BANDS,
+            )
+    absorption, rt60 = fit_absorption(
+        room_dim, target_rt60, prior=prior, method=method, reg=reg
+    )
+
+    for k, (room_path, room, settings) in enumerate(to_fit):
+        materials = {
+            wall: {
+                "description": "Fitted to RT60 of {}".format(room.id),
+                "coeffs": absorption[k, w].tolist(),
+                "center_freqs": list(OCTAVE_BANDS),
+            }
+            for w, wall in enumerate(WALLS)
+        }
+        fit = {
+            "config_hash": _config_hash(room_path),
+            "settings": settings,
+            "target_rt60": target_rt60[k].tolist(),
+            "fitted_rt60": rt60[k].tolist(),
+            "materials": materials,
+        }
+        with open(os.path.join(room_path, FIT_FILE), "w") as f:
+            json.dump(fit, f, indent=4)
+        fitted[room.id] = materials
+    return fitted
+
+
+@click.command()
+@click.argument("dataset_path", type=str)
+@click.option(
+    "--method", type=click.Choice(["eyring", "sabine"]), default="eyring"
+)
+@click.option(
+    "--use_rirs",
+    is_flag=True,
+    help="Fit to the T30 of measured RIRs per band, not `t60_estimate`.",
+)
+@click.option("--reg", type=float, default=1e-4)
+@click.option("--overwrite", is_flag=True, help="Ignore cached fits.")
+def fit(dataset_path, method, use_rirs, reg, overwrite):
+    """
+    Fit materials of the rooms of a measured bundle, starting from those of
+    `room_materials_registry`.
+    """
+    from simulate_measured_room_dataset import room_materials_registry
+
+    fitted = fit_bundle(
+        dataset_path,
+        prior_materials=room_materials_registry,
+        method=method,
+        use_rirs=use_rirs,
+        reg=reg,
+        overwrite=overwrite,
+    )
+    data_path = os.path.join(dataset_path, "data")
+    for _id in sorted(get_subdirectories(data_path)):
+        _fit = load_fit(os.path.join(data_path, _id))
+        print(
+            "{} : target {} s, fitted {} s".format(
+                _id,
+                np.round(_fit["target_rt60"], 3).tolist(),
+                np.round(_fit["fitted_rt60"], 3).tolist(),
+            )
+        )
+    print("\nFitted {} room(s).".format(len(fitted)))
+
+
+if __name__ == "__main__":
+    fit()
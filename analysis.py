@@ -0,0 +1,322 @@
+import os
+import click
+import numpy as np
+import pandas as pd
+
+from room import Room
+from utils import get_subdirectories
+from numpy_ism import octave_band_responses
+from augmentation import next_fast_len
+
+"""
+Acoustic metrics of every RIR of a bundle, e.g. to validate a simulated
+bundle against the measured one.
+
+For each RIR, the following metrics are computed:
+- T20 and T30 per octave band, from linear fits of the Schroeder energy decay
+curve (EDC) between -5 and -25 dB, and -5 and -35 dB respectively.
+- C50, the ratio of energy within the first 50 ms after the direct sound to
+the remaining energy.
+- DRR, the ratio of energy within 2.5 ms of the direct sound to the remaining
+energy.
+
+All RIRs of a room are processed together as one array: octave bands are
+obtained by FFT filtering, EDCs with cumulative sums and decay fits in closed
+form from masked sums, without per-RIR Python loops.
+
+Example usage:
+```
+python analysis.py measured_bundle simulated_bundle --output comparison.csv
+```
+"""
+
+OCTAVE_BANDS = [125, 250, 500, 1000, 2000, 4000]
+
+# EDC ranges (in dB) over which the decay is fitted
+DECAY_RANGES = {"t20": (-5.0, -25.0), "t30": (-5.0, -35.0)}
+
+# window of direct sound and early reflections, in seconds after the peak
+DIRECT_WINDOW = 2.5e-3
+EARLY_WINDOW = 50e-3
+
+# time resolution of EDCs, in seconds
+EDC_RESOLUTION = 1e-3
+
+# zero-padding for octave band filtering, in seconds, longer than the
+# (two-sided) impulse responses of the filters
+FILTER_MARGIN = 0.1
+
+
+def octave_filter(rirs, sample_rate, center_freqs=None):
+    """
+    Zero-phase octave band filtering in the frequency domain, with the
+    complementary band responses of `numpy_ism.octave_band_responses`.
+    Signals are zero-padded by `FILTER_MARGIN` so that filters do not wrap
+    around.
+
+    Return array of shape (n_rirs, n_bands, n_samples).
+
+    Parameters
+    ----------
+    rirs : array
+        RIRs of shape (n_rirs, n_samples).
+    sample_rate : int
+        Sample rate in Hz.
+    center_freqs : list, optional
+        Center frequencies of the bands, default is `OCTAVE_BANDS`.
+    """
+    if center_freqs is None:
+        center_freqs = OCTAVE_BANDS
+    n_samples = rirs.shape[-1]
+    n_fft = next_fast_len(n_samples + int(FILTER_MARGIN * sample_rate))
+    band_resp = octave_band_responses(center_freqs, n_fft, sample_rate)
+    spec = np.fft.rfft(rirs, n=n_fft, axis=-1)
+    return np.fft.irfft(
+        spec[:, np.newaxis] * band_resp.astype(np.float32), n=n_fft, axis=-1
+    )[..., :n_samples].astype(np.float32)
+
+
+def schroeder_edc(rirs, hop=1):
+    """
+    Schroeder energy decay curves in dB along the last axis, normalized to
+    0 dB at the first sample. Silent RIRs give -inf.
+
+    Parameters
+    ----------
+    rirs : array
+        RIRs of shape (..., n_samples).
+    hop : int, optional
+        Only evaluate the EDC every `hop` samples, from the energy of frames
+        of `hop` samples, which is exact at the evaluated samples.
+
+    Returns
+    -------
+    array
+        EDCs of shape (..., ceil(n_samples / hop)).
+    """
+    n_samples = rirs.shape[-1]
+    n_frames = -(-n_samples // hop)
+    if n_frames * hop > n_samples:
+        pad = [(0, 0)] * (rirs.ndim - 1) + [(0, n_frames * hop - n_samples)]
+        rirs = np.pad(rirs, pad)
+    energy = np.square(rirs).reshape(rirs.shape[:-1] + (n_frames, hop))
+    energy = energy.sum(axis=-1, dtype=np.float64)
+    edc = np.cumsum(energy[..., ::-1], axis=-1)[..., ::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 10 * np.log10(edc / edc[..., :1])
+
+
+def decay_time(edc, sample_rate, start_db=-5.0, stop_db=-35.0):
+    """
+    Reverberation time extrapolated to a 60 dB decay, from a least-squares
+    line fitted to the EDC between `start_db` and `stop_db`.
+
+    Return array of shape `edc.shape[:-1]`, NaN if the EDC does not decay
+    below `stop_db`.
+
+    Parameters
+    ----------
+    edc : array
+        Energy decay curves in dB, of shape (..., n_samples).
+    sample_rate : float
+        Sample rate of `edc` in Hz.
+    start_db : float, optional
+        Start of fit range.
+    stop_db : float, optional
+        End of fit range.
+    """
+    mask = (edc <= start_db) & (edc >= stop_db)
+    t = np.arange(edc.shape[-1]) / sample_rate
+    y = np.where(mask, edc, 0.0)
+    n = mask.sum(axis=-1)
+    sum_t = mask @ t
+    sum_tt = mask @ np.square(t)
+    sum_y = y.sum(axis=-1)
+    sum_ty = y @ t
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = (n * sum_ty - sum_t * sum_y) / (n * sum_tt - sum_t**2)
+        rt = -60.0 / slope
+    valid = (n >= 2) & (np.min(edc, axis=-1) < stop_db) & (slope < 0)
+    return np.where(valid, rt, np.nan)
+
+
+def energy_ratios(rirs, sample_rate, windows):
+    """
+    Ratios in dB of the energy up to some time after the direct sound (the
+    peak of each RIR) to the remaining energy, e.g. C50 for 50 ms.
+
+    Return array of shape (n_rirs, len(windows)).
+
+    Parameters
+    ----------
+    rirs : array
+        RIRs of shape (n_rirs, n_samples).
+    sample_rate : int
+        Sample rate in Hz.
+    windows : list
+        Durations in seconds.
+    """
+    energy = np.cumsum(np.square(rirs), axis=-1, dtype=np.float64)
+    onset = np.argmax(np.abs(rirs), axis=-1)
+    offsets = np.round(np.asarray(windows) * sample_rate).astype(int)
+    split = np.minimum(onset[:, np.newaxis] + offsets, rirs.shape[-1] - 1)
+    early = np.take_along_axis(energy, split, axis=-1)
+    late = energy[:, -1:] - early
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 10 * np.log10(early / late)
+
+
+def rir_metrics(rirs, sample_rate, center_freqs=None, batch_size=256):
+    """
+    Metrics of a batch of RIRs.
+
+    Parameters
+    ----------
+    rirs : array
+        RIRs of shape (n_rirs, n_samples).
+    sample_rate : int
+        Sample rate in Hz.
+    center_freqs : list, optional
+        Octave bands for T20 / T30, default is `OCTAVE_BANDS`.
+    batch_size : int, optional
+        Number of RIRs filtered at once, which bounds memory.
+
+    Returns
+    -------
+    dict
+        `t20` and `t30` of shape (n_rirs, n_bands), `c50` and `drr` of
+        shape (n_rirs,).
+    """
+    if center_freqs is None:
+        center_freqs = OCTAVE_BANDS
+    rirs = np.atleast_2d(rirs)
+    n_rirs = len(rirs)
+    hop = max(1, int(round(EDC_RESOLUTION * sample_rate)))
+    metrics = {
+        key: np.full((n_rirs, len(center_freqs)), np.nan)
+        for key in DECAY_RANGES
+    }
+    for start in range(0, n_rirs, batch_size):
+        batch = rirs[start : start + batch_size]
+        edc = schroeder_edc(
+            octave_filter(batch, sample_rate, center_freqs), hop=hop
+        )
+        for key, (start_db, stop_db) in DECAY_RANGES.items():
+            metrics[key][start : start + batch_size] = decay_time(
+                edc, sample_rate / hop, start_db, stop_db
+            )
+    ratios = energy_ratios(rirs, sample_rate, [EARLY_WINDOW, DIRECT_WINDOW])
+    metrics["c50"] = ratios[:, 0]
+    metrics["drr"] = ratios[:, 1]
+    return metrics
+
+
+def room_metrics(room, center_freqs=None, batch_size=256):
+    """
+    Metrics of all RIRs of a `Room` as a DataFrame with one row per
+    mic-speaker pair.
+    """
+    if center_freqs is None:
+        center_freqs = OCTAVE_BANDS
+    rirs = room.get_rirs()
+    n_mics, n_speakers, n_samples = rirs.shape
+    metrics = rir_metrics(
+        rirs.reshape(-1, n_samples),
+        room.sample_rate,
+        center_freqs=center_freqs,
+        batch_size=batch_size,
+    )
+    mic_idx, speaker_idx = np.meshgrid(
+        np.arange(n_mics), np.arange(n_speakers), indexing="ij"
+    )
+    table = {
+        "room_id": room.id,
+        "mic": mic_idx.ravel(),
+        "speaker": speaker_idx.ravel(),
+    }
+    for key in DECAY_RANGES:
+        for b, fc in enumerate(center_freqs):
+            table["{}_{}".format(key, fc)] = metrics[key][:, b]
+    table["c50"] = metrics["c50"]
+    table["drr"] = metrics["drr"]
+    return pd.DataFrame(table)
+
+
+def bundle_metrics(bundle_path, center_freqs=None, batch_size=256):
+    """
+    Metrics of all RIRs of a bundle, with rooms loaded with `Room.load`.
+    """
+    data_path = os.path.join(bundle_path, "data")
+    tables = [
+        room_metrics(
+            Room.load(os.path.join(data_path, _id)),
+            center_freqs=center_freqs,
+            batch_size=batch_size,
+        )
+        for _id in get_subdirectories(data_path)
+    ]
+    return pd.concat(tables, ignore_index=True)
+
+
+def compare_bundles(measured_path, simulated_path, **kwargs):
+    """
+    Compare metrics of a simulated bundle with those of the measured one.
+
+    Returns
+    -------
+    comparison : DataFrame
+        One row per mic-speaker pair of both bundles, with each metric as
+        `<metric>_measured`, `<metric>_simulated` and `<metric>_error`
+        (simulated - measured).
+    summary : DataFrame
+        Mean error, mean absolute error and number of valid pairs per
+        metric.
+    """
+    keys = ["room_id", "mic", "speaker"]
+    measured = bundle_metrics(measured_path, **kwargs)
+    simulated = bundle_metrics(simulated_path, **kwargs)
+    comparison = measured.merge(
+        simulated, on=keys, suffixes=("_measured", "_simulated")
+    )
+    metric_names = [col for col in measured.columns if col not in keys]
+    summary = dict()
+    for name in metric_names:
+        error = (
+            comparison[name + "_simulated"] - comparison[name + "_measured"]
+        )
+        comparison[name + "_error"] = error
+        summary[name] = {
+            "mean_error": error.mean(),
+            "mean_abs_error": error.abs().mean(),
+            "n_valid": int(error.notna().sum()),
+        }
+    return comparison, pd.DataFrame(summary).T
+
+
+@click.command()
+@click.argument("measured_path", type=str)
+@click.argument("simulated_path", type=str, required=False)
+@click.option(
+    "--output", type=str, default=None, help="CSV file for the table."
+)
+@click.option("--batch_size", type=int, default=256)
+def analysis(measured_path, simulated_path, output, batch_size):
+    """
+    Compute metrics of every RIR of MEASURED_PATH, and compare them with
+    those of SIMULATED_PATH if provided.
+    """
+    if simulated_path is None:
+        table = bundle_metrics(measured_path, batch_size=batch_size)
+        print(table.describe().T)
+    else:
+        table, summary = compare_bundles(
+            measured_path, simulated_path, batch_size=batch_size
+        )
+        print(summary)
+    if output is not None:
+        table.to_csv(output, index=False)
+        print("\nTable written to {}".format(output))
+
+
+if __name__ == "__main__":
+    analysis()
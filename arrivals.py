@@ -0,0 +1,344 @@
+import os
+import json
+import shutil
+import click
+import numpy as np
+import soundfile as sf
+from math import gcd
+from scipy.signal import resample_poly
+
+from numpy_ism import FRAC_DELAY_LENGTH, highpass_rirs, render_rirs
+
+"""
+Sparse representation of image source RIRs as lists of arrivals, i.e. the
+delay, amplitude per band and reflection order of each image source, which
+can be rendered into RIRs at any sample rate.
+
+Arrivals of all mic-speaker pairs of a simulation are packed in a dict of
+arrays, in the same way as `rir_store.py` packs RIRs:
+- `delays` of shape (n_arrivals,), in seconds,
+- `gains` of shape (n_arrivals, n_bands),
+- `orders` of shape (n_arrivals,),
+- `offsets` and `counts` of shape (n_mics, n_speakers), the position and the
+number of arrivals of each pair,
+- `center_freqs` of shape (n_bands,), empty for a single band.
+
+Example usage:
+```
+arrivals = compute_room_irs(..., software="numpy", arrivals=True)
+rirs_8k = render_arrivals(arrivals, sample_rate=8000)
+rirs_48k = render_arrivals(arrivals, sample_rate=48000)
+```
+
+Bundles simulated with `--arrivals` store the arrivals of each RIR next to
+its wav file, and can be rendered at another sample rate with:
+```
+python arrivals.py bundle_path 48000
+```
+"""
+
+# arrivals of a RIR are stored next to its wav file with this extension
+ARRIVALS_EXT = ".npz"
+
+
+def pack_arrivals(delays, gains, orders, center_freqs=None, floor_db=None):
+    """
+    Pack the arrivals of every mic-speaker pair, dropping arrivals with zero
+    amplitude and optionally those far below the strongest arrival of their
+    pair.
+
+    Parameters
+    ----------
+    delays : array
+        Arrival times in seconds, shape (n_mics, n_speakers, n_images).
+    gains : array
+        Amplitudes of shape (n_mics, n_speakers, n_images, n_bands).
+    orders : array
+        Reflection order of each image, shape (n_images,) or the same shape
+        as `delays`.
+    center_freqs : list, optional
+        Center frequencies of the bands if more than one.
+    floor_db : float, optional
+        Drop arrivals whose energy in every band is more than `floor_db` dB
+        below that of the strongest arrival of the pair.
+    """
+    delays = np.asarray(delays, dtype=float)
+    gains = np.asarray(gains, dtype=float)
+    orders = np.broadcast_to(orders, delays.shape)
+    energy = np.square(gains).max(axis=-1)
+    keep = energy > 0
+    if floor_db is not None:
+        floor = energy.max(axis=-1, keepdims=True) * 10 ** (-floor_db / 10)
+        keep &= energy >= floor
+    counts = keep.sum(axis=-1)
+    offsets = np.zeros_like(counts)
+    offsets.ravel()[1:] = np.cumsum(counts.ravel())[:-1]
+    if center_freqs is None:
+        center_freqs = []
+    return {
+        "delays": delays[keep],
+        "gains": gains[keep].astype(np.float32),
+        "orders": orders[keep].astype(np.int16),
+        "offsets": offsets,
+        "counts": counts,
+        "center_freqs": np.asarray(center_freqs, dtype=float),
+    }
+
+
+def select_arrivals(arrivals, mic_idx=None, speaker_idx=None):
+    """
+    Arrivals of a subset of mics and speakers, packed in the same format.
+
+    Parameters
+    ----------
+    arrivals : dict
+        Packed arrivals.
+    mic_idx : list, optional
+        Mics to keep, default is all.
+    speaker_idx : list, optional
+        Speakers to keep, default is all.
+    """
+    offsets = arrivals["offsets"]
+    counts = arrivals["counts"]
+    if mic_idx is not None:
+        offsets, counts = offsets[mic_idx], counts[mic_idx]
+    if speaker_idx is not None:
+        offsets, counts = offsets[:, speaker_idx], counts[:, speaker_idx]
+    idx = _arrival_indices(offsets.ravel(), counts.ravel())
+    new_offsets = np.zeros_like(counts)
+    new_offsets.ravel()[1:] = np.cumsum(counts.ravel())[:-1]
+    out = {key: arrivals[key][idx] for key in ["delays", "gains", "orders"]}
+    out.update(
+        offsets=new_offsets,
+        counts=counts,
+        center_freqs=arrivals["center_freqs"],
+    )
+    return out
+
+
+def concatenate_arrivals(arrivals):
+    """
+    Concatenate packed arrivals along the speaker axis, e.g. the arrivals of
+    every RIR of a mic stored separately.
+
+    Parameters
+    ----------
+    arrivals : list of lists
+        `arrivals[m][s]` are the packed arrivals of mic `m` and speaker `s`,
+        each with a single pair.
+    """
+    flat = [_arr for _mic in arrivals for _arr in _mic]
+    counts = np.array(
+        [[int(_arr["counts"].sum()) for _arr in _mic] for _mic in arrivals]
+    )
+    offsets = np.zeros_like(counts)
+    offsets.ravel()[1:] = np.cumsum(counts.ravel())[:-1]
+    out = {
+        key: np.concatenate([_arr[key] for _arr in flat])
+        for key in ["delays", "gains", "orders"]
+    }
+    out.update(
+        offsets=offsets,
+        counts=counts,
+        center_freqs=flat[0]["center_freqs"],
+    )
+    return out
+
+
+def _arrival_indices(offsets, counts):
+    """Indices of the arrivals of pairs with the given offsets and counts."""
+    starts = np.repeat(offsets - np.cumsum(counts) + counts, counts)
+    return starts + np.arange(counts.sum())
+
+
+def render_arrivals(arrivals, sample_rate, bands=None, dense=False):
+    """
+    Render arrivals into RIRs at any sample rate, all pairs at once. RIRs
+    rendered at the sample rate of the simulation are the same as those of
+    `numpy_ism.simulate_shoebox`.
+
+    Parameters
+    ----------
+    arrivals : dict
+        Packed arrivals.
+    sample_rate : int
+        Sample rate in Hz.
+    bands : list, optional
+        Indices of the bands to keep, i.e. band-pass filter the RIRs with the
+        complementary octave band filters of `numpy_ism`. Default is all.
+    dense : bool, optional
+        Whether to return a float32 array of shape (n_mics, n_speakers, T)
+        and the length of each RIR, rather than a list (one entry per mic) of
+        lists (one entry per speaker) of RIRs.
+    """
+    counts = arrivals["counts"]
+    n_mics, n_speakers = counts.shape
+    n_pairs = counts.size
+    center_freqs = arrivals["center_freqs"]
+    if len(center_freqs) == 0:
+        center_freqs = None
+
+    # pairs padded to the largest number of arrivals, with zero amplitude
+    n_max = max(1, int(counts.max()))
+    pair = np.repeat(np.arange(n_pairs), counts.ravel())
+    slot = np.arange(len(pair)) - np.repeat(
+        arrivals["offsets"].ravel(), counts.ravel()
+    )
+    delays = np.zeros((n_pairs, n_max))
+    delays[pair, slot] = arrivals["delays"]
+    gains = np.zeros((n_pairs, n_max, arrivals["gains"].shape[-1]))
+    gains[pair, slot] = arrivals["gains"]
+    if bands is not None:
+        mask = np.zeros(gains.shape[-1])
+        mask[bands] = 1.0
+        gains *= mask
+
+    lengths = (
+        np.floor(delays.max(axis=-1) * sample_rate).astype(int)
+        + FRAC_DELAY_LENGTH
+    )
+    out = None
+    if dense:
+        out = np.zeros((n_pairs, lengths.max()), dtype=np.float32)
+    rirs = render_rirs(
+        delays=delays,
+        gains=gains,
+        sample_rate=sample_rate,
+        center_freqs=center_freqs,
+        length=int(lengths.max()),
+        out=out,
+    )
+    highpass_rirs(rirs, sample_rate, lengths)
+    if dense:
+        return (
+            rirs.reshape(n_mics, n_speakers, -1),
+            lengths.reshape(n_mics, n_speakers),
+        )
+    rirs = [rirs[p, : lengths[p]] for p in range(n_pairs)]
+    return [rirs[m * n_speakers : (m + 1) * n_speakers] for m in range(n_mics)]
+
+
+def write_arrivals(path, arrivals):
+    """Write packed arrivals to an `.npz` file, atomically."""
+    with open(path + ".tmp", "wb") as f:
+        np.savez_compressed(f, **arrivals)
+    os.replace(path + ".tmp", path)
+
+
+def load_arrivals(path):
+    """Load packed arrivals written with `write_arrivals`."""
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def load_room_arrivals(room_path):
+    """
+    Arrivals of all RIRs of a room of a bundle simulated with `--arrivals`,
+    packed together.
+    """
+    with open(os.path.join(room_path, "config.json")) as f:
+        config = json.load(f)
+    rir_path = os.path.join(room_path, "rir")
+    return concatenate_arrivals(
+        [
+            [
+                load_arrivals(
+                    os.path.join(
+                        rir_path, "mic{}".format(m), str(n) + ARRIVALS_EXT
+                    )
+                )
+                for n in range(len(config["speaker_metadata"]))
+            ]
+            for m in range(len(config["mic_metadata"]))
+        ]
+    )
+
+
+def render_bundle(bundle_path, sample_rate, output_path=None, bands=None):
+    """
+    Copy a bundle simulated with `--arrivals`, with its RIRs rendered at
+    another sample rate and its background noise resampled to it. The
+    metadata and arrivals are copied as is.
+
+    Parameters
+    ----------
+    bundle_path : str
+        Bundle with arrivals.
+    sample_rate : int
+        Sample rate of the new RIRs, in Hz.
+    output_path : str, optional
+        New bundle, default is `bundle_path` followed by the sample rate.
+    bands : list, optional
+        Indices of the bands to keep, see `render_arrivals`.
+    """
+    if output_path is None:
+        output_path = "{}_{}Hz".format(
+            os.path.normpath(bundle_path), sample_rate
+        )
+    shutil.copytree(
+        bundle_path,
+        output_path,
+        ignore=shutil.ignore_patterns("*.wav"),
+        dirs_exist_ok=True,
+    )
+    data_path = os.path.join(bundle_path, "data")
+    for _id in sorted(os.listdir(data_path)):
+        if not os.path.isdir(os.path.join(data_path, _id)):
+            continue
+        noise_path = os.path.join(data_path, _id, "background_noise")
+        if os.path.isdir(noise_path):
+            for _file in os.listdir(noise_path):
+                if _file.endswith(".wav"):
+                    resample_wav(
+                        os.path.join(noise_path, _file),
+                        os.path.join(
+                            output_path,
+                            "data",
+                            _id,
+                            "background_noise",
+                            _file,
+                        ),
+                        sample_rate,
+                    )
+        rirs = render_arrivals(
+            load_room_arrivals(os.path.join(data_path, _id)),
+            sample_rate,
+            bands=bands,
+        )
+        rir_path = os.path.join(output_path, "data", _id, "rir")
+        for m, _mic in enumerate(rirs):
+            for n, _rir in enumerate(_mic):
+                sf.write(
+                    os.path.join(rir_path, "mic{}".format(m), f"{n}.wav"),
+                    _rir,
+                    sample_rate,
+                    format="WAV",
+                )
+    return output_path
+
+
+def resample_wav(path, destination_path, sample_rate):
+    """Write the wav file at `path` resampled to `sample_rate`."""
+    data, original_rate = sf.read(path)
+    if original_rate != sample_rate:
+        factor = gcd(sample_rate, original_rate)
+        data = resample_poly(
+            data, sample_rate // factor, original_rate // factor, axis=0
+        )
+    sf.write(destination_path, data, sample_rate, format="WAV")
+
+
+@click.command()
+@click.argument("bundle_path", type=str)
+@click.argument("sample_rate", type=int)
+@click.option("--output", type=str, default=None, help="New bundle.")
+def render(bundle_path, sample_rate, output):
+    """
+    Render the arrivals of BUNDLE_PATH into a new bundle at SAMPLE_RATE.
+    """
+    output = render_bundle(bundle_path, sample_rate, output_path=output)
+    print("Bundle written to {}".format(output))
+
+
+if __name__ == "__main__":
+    render()
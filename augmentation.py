@@ -0,0 +1,302 @@
+import time
+import click
+import numpy as np
+from functools import lru_cache
+from collections import OrderedDict
+
+from room import Room
+from partitioned_convolution import partition_rirs, PartitionedConvolver
+
+"""
+Batched data augmentation with the RIRs and background noise of a `Room`:
+clean utterances are convolved with RIRs in the frequency domain, many at
+once, and background noise of the corresponding mic is added at a target
+SNR.
+
+FFT lengths are rounded up to 5-smooth sizes, which NumPy's FFT handles
+efficiently, so that batches of similar durations share the same size, and
+the RIR spectra of a room are cached per FFT size.
+
+Example usage:
+```
+augmenter = RoomAugmenter(Room.load(room_path))
+reverberant = augmenter.augment(
+    signals, mic_idx=[0, 1], speaker_idx=[2, 0], snr_db=[10, 20]
+)
+```
+
+Throughput, in augmented seconds per CPU second, can be measured with:
+```
+python augmentation.py room_path --batch_size 32 --duration 4
+```
+"""
+
+
+@lru_cache(maxsize=None)
+def next_fast_len(n):
+    """Smallest integer >= `n` whose only prime factors are 2, 3 and 5."""
+    best = 1 << int(np.ceil(np.log2(max(n, 1))))
+    power5 = 1
+    while power5 < best:
+        power35 = power5
+        while power35 < best:
+            # smallest power of 2 that brings the product to at least n
+            power2 = 1 << max(0, int(np.ceil(np.log2(n / power35))))
+            best = min(best, power35 * power2)
+            power35 *= 3
+        power5 *= 5
+    return best
+
+
+def fft_convolve(signals, rirs, length=None, n_fft=None):
+    """
+    Convolve each signal with the RIR of the same index, all at once.
+
+    Parameters
+    ----------
+    signals : array
+        Signals of shape (batch, n_samples).
+    rirs : array
+        RIRs of shape (batch, rir_length).
+    length : int, optional
+        Number of output samples to keep, default is the full convolution.
+    n_fft : int, optional
+        FFT size, default is the next fast size for the full convolution.
+
+    Returns
+    -------
+    array
+        Convolved signals of shape (batch, length).
+    """
+    signals = np.atleast_2d(signals)
+    rirs = np.atleast_2d(rirs)
+    full_length = signals.shape[-1] + rirs.shape[-1] - 1
+    if length is None:
+        length = full_length
+    if n_fft is None:
+        n_fft = next_fast_len(full_length)
+    assert n_fft >= full_length
+    spec = np.fft.rfft(signals, n=n_fft, axis=-1)
+    spec *= np.fft.rfft(rirs, n=n_fft, axis=-1)
+    return np.fft.irfft(spec, n=n_fft, axis=-1)[:, :length]
+
+
+def mix_at_snr(signals, noise, snr_db):
+    """
+    Add noise to signals at a target signal-to-noise ratio.
+
+    Parameters
+    ----------
+    signals : array
+        Signals of shape (batch, n_samples).
+    noise : array
+        Noise of the same shape as `signals`.
+    snr_db : float or array
+        SNR in dB, one value for all signals or one per signal.
+
+    Returns
+    -------
+    array
+        Noisy signals.
+    """
+    signal_power = np.mean(np.square(signals), axis=-1, keepdims=True)
+    noise_power = np.mean(np.square(noise), axis=-1, keepdims=True)
+    snr = 10 ** (np.reshape(snr_db, (-1, 1)) / 10)
+    gain = np.sqrt(
+        signal_power / np.maximum(noise_power * snr, np.finfo(float).tiny)
+    )
+    return signals + gain * noise
+
+
+def crop_noise(noise, n_samples, offset):
+    """
+    Segment of `n_samples` of `noise` starting at `offset`, looping over the
+    recording if it is too short.
+    """
+    idx = (offset + np.arange(n_samples)) % len(noise)
+    return noise[idx]
+
+
+class RoomAugmenter(object):
+    def __init__(self, room, max_cached_spectra=4, dtype=np.float32):
+        """
+        Parameters
+        ----------
+        room : Room
+            Room whose RIRs and background noise are used.
+        max_cached_spectra : int, optional
+            Number of FFT sizes for which RIR spectra are kept.
+        dtype : numpy dtype, optional
+            Data type of output signals.
+        """
+        self.room = room
+        self.max_cached_spectra = max_cached_spectra
+        self.dtype = dtype
+        self._rirs = None
+        self._spectra = OrderedDict()
+        self._partitions = dict()
+
+    @property
+    def rirs(self):
+        """RIRs of room as an array of shape (n_mics, n_speakers, T)."""
+        if self._rirs is None:
+            self._rirs = self.room.get_rirs()
+        return self._rirs
+
+    def rir_spectra(self, n_fft):
+        """
+        Spectra of all RIRs for FFT size `n_fft`, of shape
+        (n_mics, n_speakers, n_fft // 2 + 1).
+        """
+        if n_fft in self._spectra:
+            self._spectra.move_to_end(n_fft)
+            return self._spectra[n_fft]
+        spectra = np.fft.rfft(self.rirs, n=n_fft, axis=-1).astype(np.complex64)
+        self._spectra[n_fft] = spectra
+        while len(self._spectra) > self.max_cached_spectra:
+            self._spectra.popitem(last=False)
+        return spectra
+
+    def convolver(self, speaker_idx, block_size=1024):
+        """
+        Streaming convolver of a signal played by `speaker_idx`, with one
+        output channel per mic, see `partitioned_convolution.py`. RIR
+        partitions are computed once per speaker and block size, and shared
+        by all convolvers.
+        """
+        key = (speaker_idx, block_size)
+        if key not in self._partitions:
+            self._partitions[key] = partition_rirs(
+                self.rirs[:, speaker_idx], block_size
+            )
+        return PartitionedConvolver(
+            block_size=block_size,
+            partitions=self._partitions[key],
+            rir_length=self.rirs.shape[-1],
+        )
+
+    def reverberate(self, signals, mic_idx, speaker_idx):
+        """
+        Convolve each signal with the RIR between `mic_idx` and `speaker_idx`
+        of the same index, keeping the length of the input.
+
+        Parameters
+        ----------
+        signals : array
+            Signals of shape (batch, n_samples).
+        mic_idx : int or array
+            Mic of each signal.
+        speaker_idx : int or array
+            Speaker of each signal.
+        """
+        signals = np.atleast_2d(signals)
+        n_samples = signals.shape[-1]
+        n_fft = next_fast_len(n_samples + self.rirs.shape[-1] - 1)
+        mic_idx = np.broadcast_to(mic_idx, (len(signals),))
+        speaker_idx = np.broadcast_to(speaker_idx, (len(signals),))
+
+        spec = np.fft.rfft(signals, n=n_fft, axis=-1)
+        spec *= self.rir_spectra(n_fft)[mic_idx, speaker_idx]
+        out = np.fft.irfft(spec, n=n_fft, axis=-1)[:, :n_samples]
+        return out.astype(self.dtype, copy=False)
+
+    def background_noise(self, mic_idx, n_samples, rng=None):
+        """
+        Segments of the background noise of each mic in `mic_idx` starting
+        at random offsets, of shape (len(mic_idx), n_samples). `rng` is a
+        seed or Generator, see `numpy.random.default_rng`.
+        """
+        rng = np.random.default_rng(rng)
+        noise = np.empty((len(mic_idx), n_samples), dtype=self.dtype)
+        for k, m in enumerate(mic_idx):
+            _noise = self.room.get_background_noise(m)
+            noise[k] = crop_noise(
+                _noise, n_samples, rng.integers(0, len(_noise))
+            )
+        return noise
+
+    def augment(self, signals, mic_idx, speaker_idx, snr_db=None, rng=None):
+        """
+        Reverberate signals and add the background noise of their mic.
+
+        Parameters
+        ----------
+        signals : array
+            Clean signals of shape (batch, n_samples), zero-padded to the
+            same length.
+        mic_idx : int or array
+            Mic of each signal.
+        speaker_idx : int or array
+            Speaker of each signal.
+        snr_db : float or array, optional
+            SNR of the reverberant signal w.r.t. the background noise, no
+            noise is added if not provided.
+        rng : int, SeedSequence or Generator, optional
+            Seed or random generator of the noise offsets, see
+            `numpy.random.default_rng`.
+
+        Returns
+        -------
+        array
+            Augmented signals, of the same shape as `signals`.
+        """
+        signals = np.atleast_2d(signals)
+        out = self.reverberate(signals, mic_idx, speaker_idx)
+        if snr_db is None:
+            return out
+        mic_idx = np.broadcast_to(np.asarray(mic_idx), (len(signals),))
+        noise = self.background_noise(mic_idx, signals.shape[-1], rng=rng)
+        return mix_at_snr(out, noise, snr_db).astype(self.dtype, copy=False)
+
+
+def measure_throughput(augmenter, signals, sample_rate, n_trials=5, **kwargs):
+    """
+    Throughput of `augmenter.augment` in augmented seconds of audio per CPU
+    second, for the given batch of signals.
+    """
+    signals = np.atleast_2d(signals)
+    augmenter.augment(signals, **kwargs)  # warmup, e.g. RIR spectra
+    start_time = time.process_time()
+    for _ in range(n_trials):
+        augmenter.augment(signals, **kwargs)
+    cpu_time = time.process_time() - start_time
+    audio_time = n_trials * signals.size / sample_rate
+    return audio_time / cpu_time
+
+
+@click.command()
+@click.argument("room_path", type=str)
+@click.option("--batch_size", type=int, default=32)
+@click.option("--duration", type=float, default=4.0, help="In seconds.")
+@click.option("--snr", type=float, default=10.0, help="In dB.")
+@click.option("--n_trials", type=int, default=5)
+@click.option("--seed", type=int, default=0)
+def throughput(room_path, batch_size, duration, snr, n_trials, seed):
+    """
+    Measure augmentation throughput with the RIRs and noise of a room, with
+    white noise as clean signals.
+    """
+    room = Room.load(room_path)
+    augmenter = RoomAugmenter(room)
+    rng = np.random.default_rng(seed)
+    sample_rate = room.sample_rate
+    signals = rng.standard_normal(
+        (batch_size, int(duration * sample_rate)), dtype=np.float32
+    )
+    mic_idx = rng.integers(0, room.n_mics, batch_size)
+    speaker_idx = rng.integers(0, room.n_speakers, batch_size)
+    res = measure_throughput(
+        augmenter,
+        signals,
+        sample_rate,
+        n_trials=n_trials,
+        mic_idx=mic_idx,
+        speaker_idx=speaker_idx,
+        snr_db=snr,
+        rng=rng,
+    )
+    print("{:.1f} augmented seconds per CPU second".format(res))
+
+
+if __name__ == "__main__":
+    throughput()
@@ -0,0 +1,406 @@
+import sys
+import json
+import time
+import click
+import platform
+import tracemalloc
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+
+from utils import compute_multi_mic_room_irs, get_backend, RoomSimSoftware
+
+"""
+Benchmark suite for room simulation software.
+
+Each sweep varies one parameter of a reference setup (see `BASE_SETUP`) while
+keeping the others fixed. Every case is run `n_warmup` times before being
+timed `n_trials` times with `time.perf_counter`, and once more under
+`tracemalloc` to record peak memory. Results are written as JSON and can be
+compared against a previous run to flag regressions.
+
+Example usage:
+```
+# run all sweeps
+python benchmark.py --output benchmark.json
+
+# run a subset and compare with a baseline
+python benchmark.py --sweep ism_order --sweep n_sources --software numpy \
+--output new.json --baseline benchmark.json --tolerance 0.2
+
+# plot stored results
+python benchmark.py --results benchmark.json --plot
+```
+"""
+
+font = {"family": "Times New Roman", "weight": "normal", "size": 18}
+matplotlib.rc("font", **font)
+
+
+BASE_SETUP = {
+    "room_dim": [8, 9, 3],
+    "rt60": 0.5,
+    "scattering": 0.5,
+    "ism_order": 3,
+    "n_rays": int(1e4),
+    "room_scale": 1.0,
+    "n_sources": 1,
+    "n_mics": 1,
+}
+
+# sweep name -> swept parameter values
+SWEEPS = {
+    "n_rays": [int(1e3), int(3e3), int(1e4), int(3e4), int(1e5)],
+    "ism_order": [2, 3, 4, 5, 6, 7],
+    "room_scale": [0.5, 1.0, 2.0, 4.0],
+    "n_sources": [1, 2, 4, 8, 16],
+    "n_mics": [1, 2, 4, 8, 16],
+}
+
+# sweeps that need ray tracing, skipped for software without it
+RAY_TRACING_SWEEPS = ["n_rays"]
+
+SOFTWARE = [
+    RoomSimSoftware.PYGSOUND,
+    RoomSimSoftware.PYROOMACOUSTICS,
+    RoomSimSoftware.NUMPY,
+]
+
+
+def available_software():
+    """Software of `SOFTWARE` whose backend can be imported."""
+    available = []
+    for _software in SOFTWARE:
+        try:
+            get_backend(_software).load()
+        except ImportError as e:
+            print("Skipping `{}` : {}".format(_software, e))
+            continue
+        available.append(_software)
+    return available
+
+
+def _positions(n, room_dim, seed):
+    """`n` reproducible positions at least 0.2 m away from the walls."""
+    rng = np.random.RandomState(seed)
+    room_dim = np.array(room_dim, dtype=float)
+    return (0.2 + rng.rand(n, 3) * (room_dim - 0.4)).tolist()
+
+
+def make_case(software, sweep, value):
+    """
+    Arguments of `compute_multi_mic_room_irs` for one benchmark case.
+
+    Parameters
+    ----------
+    software : str
+        Room simulation software, see `RoomSimSoftware`.
+    sweep : str
+        Swept parameter, key of `SWEEPS`.
+    value : int or float
+        Value of swept parameter.
+    """
+    setup = dict(BASE_SETUP)
+    setup[sweep] = value
+    ray_tracing = sweep in RAY_TRACING_SWEEPS
+
+    room_dim = (np.array(setup["room_dim"]) * setup["room_scale"]).tolist()
+    if setup["n_mics"] == 1 and setup["n_sources"] == 1:
+        # reference setup of the paper
+        mic_pos = [(np.array([0.3, 3, 0.2]) * setup["room_scale"]).tolist()]
+        source_pos = [(np.array([3.2, 3, 1.8]) * setup["room_scale"]).tolist()]
+    else:
+        mic_pos = _positions(setup["n_mics"], room_dim, seed=0)
+        source_pos = _positions(setup["n_sources"], room_dim, seed=1)
+
+    ray_tracing_param = None
+    ism_order = setup["ism_order"]
+    if software == RoomSimSoftware.PYGSOUND:
+        ray_tracing_param = {
+            "diffuse_count": setup["n_rays"],
+            "specular_count": 6**ism_order,
+            "specular_depth": ism_order,
+        }
+        ism_order = None
+    elif software == RoomSimSoftware.PYROOMACOUSTICS:
+        ray_tracing_param = {"n_rays": setup["n_rays"]}
+
+    return dict(
+        room_dim=room_dim,
+        mic_pos=mic_pos,
+        source_pos=source_pos,
+        room_properties=setup["rt60"],
+        scattering=setup["scattering"],
+        ism_order=ism_order,
+        ray_tracing=ray_tracing,
+        ray_tracing_param=ray_tracing_param,
+        software=software,
+    )
+
+
+def time_case(case, n_trials, n_warmup):
+    """
+    Time simulation of one case.
+
+    Returns
+    -------
+    timing : list
+        Processing time of each trial in seconds.
+    peak_memory : int
+        Peak memory allocated during a simulation in bytes, as traced by
+        `tracemalloc` (allocations of compiled extensions that bypass the
+        Python allocator are not included).
+    """
+    for _ in range(n_warmup):
+        compute_multi_mic_room_irs(**case)
+
+    timing = []
+    for _ in range(n_trials):
+        start_time = time.perf_counter()
+        compute_multi_mic_room_irs(**case)
+        timing.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    try:
+        compute_multi_mic_room_irs(**case)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return timing, peak_memory
+
+
+def run_benchmark(sweeps, software, n_trials, n_warmup):
+    """
+    Run sweeps for each software.
+
+    Returns
+    -------
+    dict
+        `metadata` describing the run and `results` with one entry per
+        (software, sweep, value).
+    """
+    results = []
+    for sweep in sweeps:
+        for value in SWEEPS[sweep]:
+            print("{} : {}".format(sweep, value))
+            for _software in software:
+                if (
+                    sweep in RAY_TRACING_SWEEPS
+                    and not get_backend(_software).ray_tracing
+                ):
+                    continue
+                case = make_case(_software, sweep, value)
+                timing, peak_memory = time_case(case, n_trials, n_warmup)
+                n_rirs = len(case["mic_pos"]) * len(case["source_pos"])
+                median = float(np.median(timing))
+                results.append(
+                    {
+                        "software": _software,
+                        "sweep": sweep,
+                        "value": value,
+                        "mean": float(np.mean(timing)),
+                        "std": float(np.std(timing)),
+                        "median": median,
+                        "min": float(np.min(timing)),
+                        "rirs_per_second": n_rirs / median,
+                        "peak_memory": int(peak_memory),
+                    }
+                )
+                print(
+                    "{} : {:.4f} seconds, {:.1f} MB".format(
+                        _software, median, peak_memory / 1e6
+                    )
+                )
+
+    metadata = {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "n_trials": n_trials,
+        "n_warmup": n_warmup,
+        "base_setup": BASE_SETUP,
+    }
+    return {"metadata": metadata, "results": results}
+
+
+def compare_results(results, baseline, tolerance=0.1):
+    """
+    Compare median processing times against a baseline.
+
+    Parameters
+    ----------
+    results : dict
+        Output of `run_benchmark`.
+    baseline : dict
+        Output of `run_benchmark` for the reference run.
+    tolerance : float, optional
+        Relative slowdown beyond which a case is flagged as a regression.
+
+    Returns
+    -------
+    comparison : list of dict
+        One entry per case present in both runs, with the ratio of medians
+        (new / baseline) and whether it is a regression.
+    """
+    reference = {
+        (_res["software"], _res["sweep"], _res["value"]): _res
+        for _res in baseline["results"]
+    }
+    comparison = []
+    for _res in results["results"]:
+        key = (_res["software"], _res["sweep"], _res["value"])
+        if key not in reference:
+            continue
+        ratio = _res["median"] / reference[key]["median"]
+        comparison.append(
+            {
+                "software": _res["software"],
+                "sweep": _res["sweep"],
+                "value": _res["value"],
+                "baseline": reference[key]["median"],
+                "median": _res["median"],
+                "ratio": ratio,
+                "regression": ratio > 1 + tolerance,
+            }
+        )
+    return comparison
+
+
+def plot_results(results):
+    markers = ["o", "^", "v", "x", ">", "<", "D", "+"]
+    for sweep in SWEEPS.keys():
+        sweep_res = [_res for _res in results if _res["sweep"] == sweep]
+        if len(sweep_res) == 0:
+            continue
+        plt.figure()
+        software = [
+            s for s in SOFTWARE if s in {r["software"] for r in sweep_res}
+        ]
+        for i, _software in enumerate(software):
+            _res = [r for r in sweep_res if r["software"] == _software]
+            values = np.array([r["value"] for r in _res])
+            proc_time = np.array([r["mean"] for r in _res])
+            proc_time_std = np.array([r["std"] for r in _res])
+            plt.loglog(values, proc_time, label=_software, marker=markers[i])
+            ax = plt.gca()
+            ax.fill_between(
+                values,
+                proc_time - proc_time_std,
+                proc_time + proc_time_std,
+                alpha=0.2,
+            )
+        plt.legend()
+        plt.xlabel(sweep)
+        plt.ylabel("Processing time (s)")
+        plt.grid()
+        plt.tight_layout()
+        plt.savefig("benchmark_{}.png".format(sweep))
+
+
+@click.command()
+@click.option(
+    "--sweep",
+    type=click.Choice(list(SWEEPS.keys())),
+    multiple=True,
+    help="Sweeps to run, all by default.",
+)
+@click.option(
+    "--software",
+    type=click.Choice(SOFTWARE),
+    multiple=True,
+    help="Software to benchmark, all installed ones by default.",
+)
+@click.option("--n_trials", type=int, default=10)
+@click.option("--n_warmup", type=int, default=2)
+@click.option(
+    "--output",
+    type=str,
+    default="benchmark.json",
+    help="Where to write results.",
+)
+@click.option(
+    "--results",
+    type=str,
+    default=None,
+    help="Previously computed results to use instead of running sweeps.",
+)
+@click.option(
+    "--baseline",
+    type=str,
+    default=None,
+    help="Results to compare against.",
+)
+@click.option(
+    "--tolerance",
+    type=float,
+    default=0.1,
+    help="Relative slowdown w.r.t. baseline considered a regression.",
+)
+@click.option("--plot", is_flag=True, help="Plot processing times.")
+def benchmark(
+    sweep,
+    software,
+    n_trials,
+    n_warmup,
+    output,
+    results,
+    baseline,
+    tolerance,
+    plot,
+):
+    """
+    Benchmark room simulation software. Exits with a non-zero status if a
+    regression with respect to `baseline` is found.
+    """
+
+    if results is None:
+        sweeps = list(sweep) if len(sweep) else list(SWEEPS.keys())
+        if len(software):
+            software = list(software)
+        else:
+            software = available_software()
+        print(
+            "\nBENCHMARKING ROOM SIMULATION SOFTWARE WITH {} TRIALS\n".format(
+                n_trials
+            )
+        )
+        data = run_benchmark(sweeps, software, n_trials, n_warmup)
+        with open(output, "w") as f:
+            json.dump(data, f, indent=4)
+        print("\nResults written to {}".format(output))
+    else:
+        with open(results) as f:
+            data = json.load(f)
+
+    if plot:
+        plot_results(data["results"])
+
+    if baseline is not None:
+        with open(baseline) as f:
+            baseline_data = json.load(f)
+        comparison = compare_results(data, baseline_data, tolerance)
+        print("\nCOMPARISON WITH {}\n".format(baseline))
+        n_regressions = 0
+        for _comp in comparison:
+            print(
+                "{}{} / {} = {} : {:.4f}s -> {:.4f}s ({:+.1f}%)".format(
+                    "REGRESSION " if _comp["regression"] else "",
+                    _comp["software"],
+                    _comp["sweep"],
+                    _comp["value"],
+                    _comp["baseline"],
+                    _comp["median"],
+                    100 * (_comp["ratio"] - 1),
+                )
+            )
+            n_regressions += _comp["regression"]
+        if n_regressions:
+            print("\n{} regression(s) found.".format(n_regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,311 @@
+import numpy as np
+
+from materials import material_absorption
+from numpy_ism import (
+    WALLS,
+    OCTAVE_CENTER_FREQS,
+    AIR_ABSORPTION_COEFFS,
+    FRAC_DELAY_LENGTH,
+    image_lattice,
+    image_distances,
+    octave_band_responses,
+    speed_of_sound,
+)
+
+"""
+Statistical late reverberation, as a fast alternative to ray tracing.
+
+Early reflections are simulated with a low-order image source method (ISM),
+up to the mixing time after which the sound field is considered diffuse. The
+late tail is synthesized as noise with the expected energy envelope of a
+diffuse field in each octave band
+
+    E[h^2](t) = 4 pi c / (V fs) * exp(-13.8 t / T60)
+
+where V is the volume of the room and T60 the reverberation time of the band,
+from the RT60 of the room or the per-band absorption of its walls (Eyring's
+equation). This is the expected energy of the arrivals of the ISM per sample
+for arrivals of amplitude `1 / r`, and is scaled to the amplitude
+convention of the simulation software otherwise. The ISM RIR and the tail are
+crossfaded over one mixing time, starting one mixing time after the direct
+sound.
+
+Example usage:
+```
+rirs, sample_rate = compute_room_irs(..., late_tail=True)
+```
+"""
+
+# mixing time in seconds per square root of the volume in m^3, i.e.
+# sqrt(V) ms
+MIXING_TIME_FACTOR = 1e-3
+
+# the tail is synthesized until it has decayed by this amount in every band
+TAIL_DECAY_DB = 60.0
+
+
+def mixing_time(room_dim):
+    """Mixing time of a room in seconds, `sqrt(V)` ms."""
+    return MIXING_TIME_FACTOR * np.sqrt(np.prod(room_dim))
+
+
+def decay_times(room_dim, absorption, air_absorption=False):
+    """
+    Reverberation time of each band from the absorption of each wall, with
+    Eyring's equation on the area-weighted average absorption.
+
+    Return array of shape (..., n_bands).
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) or a Shoebox room.
+    absorption : array
+        Energy absorption coefficient of each wall in `WALLS` order, shape
+        (..., 6, n_bands).
+    air_absorption : bool, optional
+        Whether to include air absorption, in which case `absorption` must
+        have one band per `OCTAVE_CENTER_FREQS`.
+    """
+    width, length, height = room_dim
+    volume = width * length * height
+    areas = np.repeat([length * height, width * height, width * length], 2)
+    absorption = np.asarray(absorption, dtype=float)
+    mean_absorption = np.einsum("w,...wb->...b", areas, absorption)
+    mean_absorption /= areas.sum()
+    decay = -areas.sum() * np.log(
+        np.maximum(1.0 - mean_absorption, np.finfo(float).tiny)
+    )
+    if air_absorption:
+        decay = decay + 4 * np.asarray(AIR_ABSORPTION_COEFFS) * volume
+    with np.errstate(divide="ignore"):
+        return 0.163 * volume / decay
+
+
+def room_decay_times(room_dim, room_properties, air_absorption=False):
+    """
+    Reverberation time of the room properties of `compute_room_irs`.
+
+    Returns
+    -------
+    t60 : array
+        Reverberation time of shape (1,) for an RT60, (n_mics, n_sources, 1)
+        for a (nested) list of RT60s, and (n_bands,) for materials, with air
+        absorption if `air_absorption`. RT60s are used as is.
+    center_freqs : list
+        Center frequencies of the bands of materials, None otherwise.
+    """
+    if isinstance(room_properties, list):
+        return np.array(room_properties, dtype=float, ndmin=2)[..., None], None
+    if not isinstance(room_properties, dict):
+        return np.array([room_properties], dtype=float), None
+    absorption = material_absorption(
+        [room_properties[wall] for wall in WALLS],
+        center_freqs=OCTAVE_CENTER_FREQS,
+    )
+    return (
+        decay_times(room_dim, absorption, air_absorption=air_absorption),
+        OCTAVE_CENTER_FREQS,
+    )
+
+
+def early_ism_order(room_dim, mic_pos, source_pos, temperature=None):
+    """
+    Smallest ISM order that includes every image arriving before the end of
+    the crossfade, for all mic-source pairs.
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) or a Shoebox room.
+    mic_pos : array
+        Mic coordinates, shape (n_mics, 3).
+    source_pos : array
+        Source coordinates, shape (n_sources, 3).
+    temperature : float, optional
+        Temperature in Celsius, to determine the speed of sound.
+    """
+    room_dim = np.asarray(room_dim, dtype=float)
+    mic_pos = np.array(mic_pos, dtype=float, ndmin=2)
+    source_pos = np.array(source_pos, dtype=float, ndmin=2)
+    direct = np.linalg.norm(mic_pos[:, None] - source_pos[None], axis=-1)
+    c = speed_of_sound(temperature)
+    max_distance = direct.max() + 2 * c * mixing_time(room_dim)
+
+    # along each axis, an image with `n` reflections is at least `n - 1`
+    # room lengths away, which bounds the orders to enumerate
+    bound = 3 * int(np.ceil(max_distance / room_dim.min() + 1))
+    lattice, orders, _ = image_lattice(bound)
+    distances = image_distances(room_dim, mic_pos, source_pos, lattice)
+    early = np.any(distances <= max_distance, axis=(0, 1))
+    return int(orders[early].max())
+
+
+def synthesize_tail(
+    t60,
+    volume,
+    sample_rate,
+    n_samples,
+    center_freqs=None,
+    temperature=None,
+    direct_gain=1.0,
+    seed=None,
+):
+    """
+    Noise with the expected energy envelope of the late reverberation, the
+    same noise being split into bands and weighted by the envelope of each
+    band. Time is counted from the emission, i.e. sample `n` is at
+    `n / sample_rate` seconds.
+
+    Return array of shape (n_pairs, n_samples).
+
+    Parameters
+    ----------
+    t60 : array
+        Reverberation time of each band, shape (n_pairs, n_bands).
+    volume : float
+        Volume of the room in m^3.
+    sample_rate : int
+        Sample rate in Hz.
+    n_samples : int
+        Length of the tail.
+    center_freqs : list, optional
+        Center frequencies of the bands if more than one, default is
+        `OCTAVE_CENTER_FREQS`.
+    temperature : float, optional
+        Temperature in Celsius, to determine the speed of sound.
+    direct_gain : float, optional
+        Amplitude of an arrival at a distance of 1 m.
+    seed : int, SeedSequence or Generator, optional
+        Seed of the noise, see `numpy.random.default_rng`. Unless it is a
+        Generator, the noise of each pair is drawn from its own generator,
+        spawned from `seed`.
+    """
+    t60 = np.array(t60, dtype=float, ndmin=2)
+    n_pairs, n_bands = t60.shape
+    t = np.arange(n_samples) / sample_rate
+    # 4 pi c^3 t^2 / V arrivals per second, of energy (g / (c t))^2
+    c = speed_of_sound(temperature)
+    scale = 4 * np.pi * c * direct_gain**2 / (volume * sample_rate)
+    # amplitude envelope, i.e. square root of the energy envelope, of shape
+    # (n_pairs, n_bands, n_samples)
+    envelope = np.sqrt(scale) * np.exp(-3 * np.log(10) * t / t60[..., None])
+
+    if isinstance(seed, np.random.Generator):
+        noise = seed.standard_normal((n_pairs, n_samples))
+    else:
+        # one generator per pair, so that the noise of a pair doesn't depend
+        # on the other pairs or on the length of the tail
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        noise = np.stack(
+            [
+                np.random.default_rng(_seed).standard_normal(n_samples)
+                for _seed in seed.spawn(n_pairs)
+            ]
+        )
+    if n_bands == 1:
+        return noise * envelope[:, 0]
+
+    if center_freqs is None:
+        center_freqs = OCTAVE_CENTER_FREQS
+    assert len(center_freqs) == n_bands
+    n_fft = 1 << int(np.ceil(np.log2(n_samples)))
+    band_resp = octave_band_responses(center_freqs, n_fft, sample_rate)
+    spec = np.fft.rfft(noise, n=n_fft, axis=-1)
+    tail = np.zeros((n_pairs, n_samples))
+    for b in range(n_bands):
+        band = np.fft.irfft(spec * band_resp[b], n=n_fft, axis=-1)
+        tail += band[:, :n_samples] * envelope[:, b]
+    return tail
+
+
+def add_late_tail(
+    rirs,
+    room_dim,
+    mic_pos,
+    source_pos,
+    t60,
+    sample_rate,
+    center_freqs=None,
+    temperature=None,
+    direct_gain=1.0,
+    seed=None,
+):
+    """
+    Crossfade ISM RIRs with a synthesized late tail.
+
+    Return a list (one entry per mic) of lists (one entry per source) of
+    RIRs, as long as the ISM RIR or until the tail has decayed by
+    `TAIL_DECAY_DB` in every band, whichever is longer.
+
+    Parameters
+    ----------
+    rirs : list
+        ISM RIRs, `rirs[m][s]` between mic `m` and source `s`, with the
+        fractional delay offset of `numpy_ism` and `pyroomacoustics`.
+    room_dim : array or list
+        3D array, specifying (width, length, height) or a Shoebox room.
+    mic_pos : array
+        Mic coordinates, shape (n_mics, 3).
+    source_pos : array
+        Source coordinates, shape (n_sources, 3).
+    t60 : array
+        Reverberation time of each band, broadcastable to shape
+        (n_mics, n_sources, n_bands).
+    sample_rate : int
+        Sample rate in Hz.
+    center_freqs : list, optional
+        Center frequencies of the bands if more than one, default is
+        `OCTAVE_CENTER_FREQS`.
+    temperature : float, optional
+        Temperature in Celsius, to determine the speed of sound.
+    direct_gain : float, optional
+        Amplitude of an arrival at a distance of 1 m in `rirs`.
+    seed : int, SeedSequence or Generator, optional
+        Seed of the noise of the tail, see `numpy.random.default_rng`.
+    """
+    mic_pos = np.array(mic_pos, dtype=float, ndmin=2)
+    source_pos = np.array(source_pos, dtype=float, ndmin=2)
+    n_mics, n_sources = len(mic_pos), len(source_pos)
+    t60 = np.array(t60, dtype=float, ndmin=1)
+    t60 = np.broadcast_to(t60, (n_mics, n_sources, t60.shape[-1]))
+    t60 = t60.reshape(n_mics * n_sources, -1)
+
+    # crossfade one mixing time after the direct sound, in samples of the
+    # RIRs, which are delayed by half the fractional delay filter
+    offset = (FRAC_DELAY_LENGTH - 1) // 2
+    t_mix = mixing_time(room_dim)
+    direct = np.linalg.norm(mic_pos[:, None] - source_pos[None], axis=-1)
+    fade_start = direct.reshape(-1) / speed_of_sound(temperature) + t_mix
+    fade_start = np.round(fade_start * sample_rate).astype(int) + offset
+    fade_length = max(1, int(round(t_mix * sample_rate)))
+
+    tail_length = offset + int(
+        np.ceil(TAIL_DECAY_DB / 60.0 * np.nanmax(t60) * sample_rate)
+    )
+    flat = [_rir for _mic in rirs for _rir in _mic]
+    length = max(tail_length, max(len(_rir) for _rir in flat))
+    tail = synthesize_tail(
+        t60,
+        volume=np.prod(room_dim),
+        sample_rate=sample_rate,
+        n_samples=length - offset,
+        center_freqs=center_freqs,
+        temperature=temperature,
+        direct_gain=direct_gain,
+        seed=seed,
+    )
+
+    # power complementary crossfade, ISM and tail being uncorrelated
+    x = (np.arange(length) - fade_start[:, None]) / fade_length
+    x = np.clip(x, 0.0, 1.0)
+    early_gain = np.cos(0.5 * np.pi * x)
+    out = np.zeros((len(flat), length))
+    out[:, offset:] = tail
+    out *= np.sin(0.5 * np.pi * x)
+    for p, _rir in enumerate(flat):
+        out[p, : len(_rir)] += early_gain[p, : len(_rir)] * _rir
+
+    out = [_rir.astype(flat[p].dtype) for p, _rir in enumerate(out)]
+    return [out[m * n_sources : (m + 1) * n_sources] for m in range(n_mics)]
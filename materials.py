@@ -1,3 +1,19 @@
+import numpy as np
+from functools import lru_cache
+
+"""
+Absorption and scattering coefficients of common materials, as in
+`pyroomacoustics`.
+
+Materials are defined on different octave bands, e.g. up to 4 or 8 kHz. They
+can be compiled once onto a common grid of center frequencies, as one
+contiguous array with a row per material, with `compile_materials`.
+"""
+
+# common center frequencies of compiled materials, i.e. the octave bands of
+# `pyroomacoustics` up to a sample rate of 48 kHz
+CENTER_FREQS = (125, 250, 500, 1000, 2000, 4000, 8000, 16000)
+
 materials_absorption_table = {
     "anechoic": {"description": "Anechoic material", "coeffs": [1.0]},
     # Massive constructions and hard surfaces
@@ -297,3 +313,104 @@ materials_scattering_table = {
         "center_freqs": [125, 250, 500, 1000, 2000],
     },
 }
+
+
+def resample_absorption(coeffs, center_freqs, target_freqs):
+    """
+    Interpolate absorption coefficients defined on some octave bands onto a
+    different set of bands, linearly in log-frequency. Values outside of
+    `center_freqs` are linearly extrapolated and clipped to [0, 1], like
+    `pyroomacoustics` does when resampling materials.
+
+    Parameters
+    ----------
+    coeffs : list
+        Absorption coefficients.
+    center_freqs : list
+        Center frequencies of `coeffs`.
+    target_freqs : list
+        Center frequencies to interpolate to.
+    """
+    x = np.log2(center_freqs)
+    y = np.asarray(coeffs, dtype=float)
+    t = np.log2(target_freqs)
+    if len(x) == 1:
+        return np.full(len(t), y[0])
+    res = np.interp(t, x, y)
+    below = t < x[0]
+    res[below] = y[0] + (t[below] - x[0]) * (y[1] - y[0]) / (x[1] - x[0])
+    above = t > x[-1]
+    res[above] = y[-1] + (t[above] - x[-1]) * (y[-1] - y[-2]) / (x[-1] - x[-2])
+    return np.clip(res, 0.0, 1.0)
+
+
+@lru_cache(maxsize=None)
+def _compile_materials(center_freqs):
+    names = sorted(materials_absorption_table.keys())
+    absorption = np.empty((len(names), len(center_freqs)))
+    for k, name in enumerate(names):
+        _mat = materials_absorption_table[name]
+        if "center_freqs" in _mat:
+            absorption[k] = resample_absorption(
+                _mat["coeffs"], _mat["center_freqs"], center_freqs
+            )
+        else:
+            # flat material
+            absorption[k] = _mat["coeffs"][0]
+    absorption.setflags(write=False)
+    index = {name: k for k, name in enumerate(names)}
+    return index, absorption
+
+
+def compile_materials(center_freqs=None):
+    """
+    Absorption coefficients of all materials in `materials_absorption_table`
+    on a common set of bands. Compiled once per set of bands.
+
+    Parameters
+    ----------
+    center_freqs : list, optional
+        Center frequencies of the bands. Default is `CENTER_FREQS`.
+
+    Returns
+    -------
+    index : dict
+        Row of each material in `absorption`.
+    absorption : array
+        Read-only array of shape (n_materials, n_bands).
+    """
+    if center_freqs is None:
+        center_freqs = CENTER_FREQS
+    return _compile_materials(tuple(center_freqs))
+
+
+def material_absorption(materials, center_freqs=None):
+    """
+    Absorption coefficients of a list of materials, e.g. one per wall, as an
+    array of shape (len(materials), n_bands).
+
+    Parameters
+    ----------
+    materials : list
+        Names of materials in `materials_absorption_table`, whose compiled
+        coefficients are used, or material descriptions with the same
+        format as its entries, e.g. fitted materials.
+    center_freqs : list, optional
+        Center frequencies of the bands. Default is `CENTER_FREQS`.
+    """
+    if center_freqs is None:
+        center_freqs = CENTER_FREQS
+    index, absorption = compile_materials(center_freqs)
+    if all(isinstance(_mat, str) for _mat in materials):
+        return absorption[[index[_mat] for _mat in materials]]
+    out = np.empty((len(materials), absorption.shape[1]))
+    for k, _mat in enumerate(materials):
+        if isinstance(_mat, str):
+            out[k] = absorption[index[_mat]]
+        elif "center_freqs" in _mat:
+            out[k] = resample_absorption(
+                _mat["coeffs"], _mat["center_freqs"], center_freqs
+            )
+        else:
+            out[k] = _mat["coeffs"][0]
+    return out
@@ -0,0 +1,595 @@
+import numpy as np
+
+from profiling import null_profiler
+from materials import resample_absorption
+
+"""
+Vectorized image source method (ISM) for ShoeBox rooms, written with NumPy
+only, apart from the high-pass filter designed with SciPy.
+
+All images up to a given order are enumerated at once as an integer lattice
+and their delays, distance attenuation and wall reflection products are
+computed as arrays for every (mic, source) pair. RIRs are then synthesized by
+scattering windowed-sinc fractional delays into the output buffers.
+
+Conventions follow `pyroomacoustics` so that the two backends can be
+compared: amplitude of `1 / distance`, reflection coefficient of
+`sqrt(1 - absorption)` per wall hit, an 81-tap Hann-windowed sinc for
+fractional delays and a zero-phase high-pass filter of the RIRs.
+"""
+
+
+# same ordering as `pyroomacoustics` for ShoeBox rooms, i.e. lower and upper
+# wall along x, y, and z axis (values of `room.WallRegistry`)
+WALLS = ["west", "east", "south", "north", "floor", "ceiling"]
+
+# octave bands used for frequency-dependent simulation
+OCTAVE_CENTER_FREQS = [125, 250, 500, 1000, 2000, 4000, 8000]
+
+# air absorption coefficients (1/m) at 20 C and 30-50% humidity for the above
+# octave bands, same values as `pyroomacoustics`
+AIR_ABSORPTION_COEFFS = [
+    0.1e-3,
+    0.2e-3,
+    0.5e-3,
+    1.1e-3,
+    2.7e-3,
+    9.4e-3,
+    29.0e-3,
+]
+
+FRAC_DELAY_LENGTH = 81
+
+# cut-off frequency in Hz and order of the Butterworth high-pass filter of
+# RIRs, same as the default `rir_hpf_fc` and `rir_hpf_kwargs` constants of
+# `pyroomacoustics`
+RIR_HPF_FC = 10.0
+RIR_HPF_ORDER = 2
+
+# maximum number of elements to allocate at once when rendering RIRs
+MAX_CHUNK_SIZE = int(2**23)
+
+
+def speed_of_sound(temperature=None):
+    """
+    Speed of sound in m/s.
+
+    Parameters
+    ----------
+    temperature : float, optional
+        Temperature in Celsius. Default is 343 m/s.
+    """
+    if temperature is None:
+        return 343.0
+    return 331.4 + 0.6 * temperature
+
+
+def image_lattice(ism_order):
+    """
+    Enumerate all image sources up to a given order as an integer lattice.
+
+    Along each axis, image index `i` is the number of reflections on the two
+    walls perpendicular to that axis, with the sign indicating whether the
+    first reflection is on the upper (positive) or lower (negative) wall.
+
+    Return lattice indices of shape (n_images, 3), reflection order of shape
+    (n_images,) and number of reflections on each wall (in `WALLS` order) of
+    shape (n_images, 6).
+
+    Parameters
+    ----------
+    ism_order : int
+        Maximum number of reflections.
+    """
+    r = np.arange(-ism_order, ism_order + 1)
+    idx = np.stack(np.meshgrid(r, r, r, indexing="ij"), axis=-1)
+    idx = idx.reshape(-1, 3)
+    orders = np.abs(idx).sum(axis=1)
+    keep = orders <= ism_order
+    idx = idx[keep]
+    orders = orders[keep]
+
+    # reflections on lower and upper wall of each axis
+    lower = np.where(idx >= 0, idx // 2, (1 - idx) // 2)
+    upper = np.where(idx >= 0, (idx + 1) // 2, (-idx) // 2)
+    wall_counts = np.stack([lower, upper], axis=-1).reshape(-1, 6)
+
+    return idx, orders, wall_counts
+
+
+def image_positions(room_dim, source_pos, lattice):
+    """
+    Coordinates of image sources.
+
+    Return array of shape (n_sources, n_images, 3).
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) or a Shoebox room.
+    source_pos : array or list
+        Source coordinates, shape (n_sources, 3).
+    lattice : array
+        Image lattice indices, shape (n_images, 3), see `image_lattice`.
+    """
+    room_dim = np.asarray(room_dim, dtype=float)
+    source_pos = np.array(source_pos, dtype=float, ndmin=2)
+    even = (lattice % 2 == 0)[None, :, :]
+    return lattice[None, :, :] * room_dim + np.where(
+        even,
+        source_pos[:, None, :],
+        room_dim - source_pos[:, None, :],
+    )
+
+
+def image_distances(room_dim, mic_pos, source_pos, lattice):
+    """
+    Distance between each mic and each image source.
+
+    Return array of shape (n_mics, n_sources, n_images).
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) or a Shoebox room.
+    mic_pos : array or list
+        Mic coordinates, shape (n_mics, 3).
+    source_pos : array or list
+        Source coordinates, shape (n_sources, 3).
+    lattice : array
+        Image lattice indices, shape (n_images, 3), see `image_lattice`.
+    """
+    mic_pos = np.array(mic_pos, dtype=float, ndmin=2)
+    images = image_positions(room_dim, source_pos, lattice)
+    diff = images[None, :, :, :] - mic_pos[:, None, None, :]
+    return np.sqrt(np.einsum("msid,msid->msi", diff, diff))
+
+
+def reflection_gains(wall_counts, absorption):
+    """
+    Product of wall reflection coefficients for each image source.
+
+    Return array of shape (..., n_images, n_bands).
+
+    Parameters
+    ----------
+    wall_counts : array
+        Number of reflections on each wall, shape (n_images, 6).
+    absorption : array
+        Energy absorption coefficient of each wall, shape (..., 6, n_bands).
+    """
+    # fully absorbing walls have a (vanishingly) small rather than a zero
+    # reflection coefficient, so that images not hitting them are unaffected
+    log_refl = 0.5 * np.log(
+        np.maximum(
+            1.0 - np.asarray(absorption, dtype=float), np.finfo(float).tiny
+        )
+    )
+    return np.exp(np.einsum("iw,...wb->...ib", wall_counts, log_refl))
+
+
+def order_energies(room_dim, absorption, ism_order):
+    """
+    Energy of the image sources of each reflection order, summed per order.
+
+    Distances are taken from the center of the room, where images of order
+    `n` lie on a lattice scaled by the room dimensions, and offset by the
+    mean free path as a typical source-mic distance.
+
+    Return array of shape (..., ism_order + 1, n_bands).
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) or a Shoebox room.
+    absorption : array
+        Energy absorption coefficient of each wall, shape (..., 6, n_bands).
+    ism_order : int
+        Maximum number of reflections.
+    """
+    room_dim = np.asarray(room_dim, dtype=float)
+    lattice, orders, wall_counts = image_lattice(ism_order)
+    width, length, height = room_dim
+    volume = width * length * height
+    area = 2 * (width * length + length * height + width * height)
+    mean_free_path = 4 * volume / area
+    dist2 = np.sum(np.square(lattice * room_dim), axis=1) + mean_free_path**2
+    energy = np.square(reflection_gains(wall_counts, absorption))
+    energy /= dist2[:, None]
+    order_idx = orders[None, :] == np.arange(ism_order + 1)[:, None]
+    return np.einsum("ki,...ib->...kb", order_idx.astype(float), energy)
+
+
+def wall_absorption(materials, center_freqs=None):
+    """
+    Stack absorption coefficients of each wall onto a common set of bands.
+
+    Return array of shape (6, n_bands) with walls in `WALLS` order.
+
+    Parameters
+    ----------
+    materials : dict
+        One entry per wall in `WALLS`, each being a material description as
+        in `materials_absorption_table`.
+    center_freqs : list, optional
+        Center frequencies of the output bands. Default is
+        `OCTAVE_CENTER_FREQS`.
+    """
+    if center_freqs is None:
+        center_freqs = OCTAVE_CENTER_FREQS
+    absorption = np.zeros((len(WALLS), len(center_freqs)))
+    for w, wall in enumerate(WALLS):
+        _mat = materials[wall]
+        if "center_freqs" in _mat:
+            absorption[w] = resample_absorption(
+                _mat["coeffs"], _mat["center_freqs"], center_freqs
+            )
+        else:
+            absorption[w] = _mat["coeffs"][0]
+    return absorption
+
+
+def octave_band_responses(center_freqs, n_fft, sample_rate):
+    """
+    Zero-phase, complementary octave band filters (magnitude responses sum to
+    one at all frequencies). Neighbouring bands cross over with a squared-sine
+    transition in log-frequency between their center frequencies.
+
+    Return array of shape (n_bands, n_fft // 2 + 1).
+
+    Parameters
+    ----------
+    center_freqs : list
+        Center frequency of each band, increasing.
+    n_fft : int
+        FFT length.
+    sample_rate : int
+        Sample rate in Hz.
+    """
+    n_bands = len(center_freqs)
+    freqs = np.fft.rfftfreq(n_fft, d=1.0 / sample_rate)
+    resp = np.zeros((n_bands, len(freqs)))
+    if n_bands == 1:
+        resp[0] = 1.0
+        return resp
+    log_f = np.log2(np.maximum(freqs, 1e-3))
+    log_c = np.log2(center_freqs)
+    resp[0, freqs <= center_freqs[0]] = 1.0
+    resp[-1, freqs >= center_freqs[-1]] = 1.0
+    for b in range(n_bands - 1):
+        sel = (freqs >= center_freqs[b]) & (freqs < center_freqs[b + 1])
+        t = (log_f[sel] - log_c[b]) / (log_c[b + 1] - log_c[b])
+        w = np.sin(0.5 * np.pi * t) ** 2
+        resp[b, sel] = 1.0 - w
+        resp[b + 1, sel] = w
+    return resp
+
+
+def fractional_delay_taps(frac):
+    """
+    Hann-windowed sinc fractional delay filters.
+
+    For integer tap offsets `n`, `sin(pi * (n - frac))` only depends on the
+    parity of `n`, so a single sine is evaluated per delay instead of one per
+    tap.
+
+    Return array of shape `frac.shape + (FRAC_DELAY_LENGTH,)`.
+
+    Parameters
+    ----------
+    frac : array
+        Fractional delays in samples, between 0 and 1.
+    """
+    n = np.arange(FRAC_DELAY_LENGTH) - (FRAC_DELAY_LENGTH - 1) // 2
+    coef = np.hanning(FRAC_DELAY_LENGTH) * np.where(n % 2 == 0, -1.0, 1.0)
+    # avoid 0 / 0 for delays falling exactly on a sample
+    frac = np.maximum(np.asarray(frac), 1e-12)[..., None]
+    taps = n - frac
+    np.reciprocal(taps, out=taps)
+    taps *= coef
+    taps *= np.sin(np.pi * frac) / np.pi
+    return taps
+
+
+def render_rirs(
+    delays, gains, sample_rate, length=None, center_freqs=None, out=None
+):
+    """
+    Synthesize RIRs from a set of arrivals, all pairs at once.
+
+    Arrivals with zero gain are ignored, which can be used to mask out
+    images for some pairs.
+
+    Return array of shape (n_pairs, length).
+
+    Parameters
+    ----------
+    delays : array
+        Arrival times in seconds, shape (n_pairs, n_arrivals).
+    gains : array
+        Arrival amplitudes, shape (n_pairs, n_arrivals) or
+        (n_pairs, n_arrivals, n_bands) for frequency-dependent amplitudes.
+    sample_rate : int
+        Sample rate in Hz.
+    length : int, optional
+        Length of output RIRs. Default is long enough for the latest arrival.
+    center_freqs : list, optional
+        Center frequencies of bands if `gains` has a band dimension.
+    out : array, optional
+        Pre-allocated output of shape (n_pairs, length).
+    """
+    delays = np.atleast_2d(delays)
+    gains = np.asarray(gains, dtype=float)
+    if gains.ndim == delays.ndim:
+        gains = gains[..., None]
+    n_pairs, n_arrivals, n_bands = gains.shape
+    if n_bands > 1:
+        assert center_freqs is not None and len(center_freqs) == n_bands
+
+    samples = delays * sample_rate
+    start = np.floor(samples).astype(np.int64)
+    frac = samples - start
+    if length is None:
+        length = int(start.max()) + FRAC_DELAY_LENGTH
+    # render into a buffer long enough for all arrivals and truncate after
+    full_length = max(length, int(start.max()) + FRAC_DELAY_LENGTH)
+    if out is None:
+        out = np.zeros((n_pairs, length))
+    else:
+        assert out.shape == (n_pairs, length)
+        out[:] = 0
+
+    # rendering the full bands for long RIRs requires an FFT length that
+    # avoids circular wrap-around of the zero-phase band filters
+    n_fft = None
+    if n_bands > 1:
+        n_fft = 1 << int(np.ceil(np.log2(full_length + FRAC_DELAY_LENGTH)))
+        band_resp = octave_band_responses(center_freqs, n_fft, sample_rate)
+
+    chunk = max(1, MAX_CHUNK_SIZE // (n_arrivals * FRAC_DELAY_LENGTH))
+    offsets = np.arange(FRAC_DELAY_LENGTH)
+    for p0 in range(0, n_pairs, chunk):
+        p1 = min(p0 + chunk, n_pairs)
+        n_chunk = p1 - p0
+        taps = fractional_delay_taps(frac[p0:p1])
+        idx = (
+            start[p0:p1, :, None]
+            + offsets
+            + (np.arange(n_chunk) * full_length)[:, None, None]
+        ).ravel()
+
+        band_rirs = np.zeros((n_bands, n_chunk, full_length))
+        for b in range(n_bands):
+            weights = (taps * gains[p0:p1, :, b, None]).ravel()
+            band_rirs[b] = np.bincount(
+                idx, weights=weights, minlength=n_chunk * full_length
+            ).reshape(n_chunk, full_length)
+
+        if n_bands == 1:
+            out[p0:p1] = band_rirs[0, :, :length]
+        else:
+            spec = np.fft.rfft(band_rirs, n=n_fft, axis=-1)
+            spec = np.einsum("bpf,bf->pf", spec, band_resp)
+            out[p0:p1] = np.fft.irfft(spec, n=n_fft, axis=-1)[:, :length]
+
+    return out
+
+
+def highpass_rirs(rirs, sample_rate, lengths=None):
+    """
+    High-pass filter RIRs in place, forward and backward as
+    `pyroomacoustics` does, each over its own length.
+
+    Return `rirs`.
+
+    Parameters
+    ----------
+    rirs : array
+        RIRs of shape (n_pairs, T).
+    sample_rate : int
+        Sample rate in Hz.
+    lengths : array, optional
+        Length of each RIR, shape (n_pairs,). Default is `T` for all RIRs.
+    """
+    from scipy.signal import butter, sosfiltfilt
+
+    sos = butter(
+        RIR_HPF_ORDER,
+        RIR_HPF_FC,
+        btype="highpass",
+        fs=sample_rate,
+        output="sos",
+    )
+    if lengths is None:
+        lengths = np.full(len(rirs), rirs.shape[-1])
+    for p, n in enumerate(lengths):
+        rirs[p, :n] = sosfiltfilt(sos, rirs[p, :n])
+    return rirs
+
+
+def shoebox_arrivals(
+    room_dim,
+    mic_pos,
+    source_pos,
+    absorption,
+    ism_order=17,
+    center_freqs=None,
+    air_absorption=False,
+    temperature=None,
+    profiler=None,
+):
+    """
+    Arrivals of the image sources between every mic and source position in
+    a ShoeBox room, i.e. their delay, amplitude per band and reflection
+    order, before rendering. Parameters are the same as for
+    `simulate_shoebox`.
+
+    Returns
+    -------
+    delays : array
+        Arrival times in seconds, shape (n_mics, n_sources, n_images).
+    gains : array
+        Amplitudes of shape (n_mics, n_sources, n_images, n_bands), zero for
+        images beyond the order of a pair.
+    orders : array
+        Reflection order of each image, shape (n_images,).
+    center_freqs : list
+        Center frequencies of the bands, None for a single band.
+    """
+
+    if profiler is None:
+        profiler = null_profiler
+
+    room_dim = np.asarray(room_dim, dtype=float)
+    mic_pos = np.array(mic_pos, dtype=float, ndmin=2)
+    source_pos = np.array(source_pos, dtype=float, ndmin=2)
+    for _pos in np.concatenate([mic_pos, source_pos]):
+        if np.any(_pos < 0) or np.any(_pos > room_dim):
+            raise ValueError("Either source or mic is outside of room.")
+    n_mics = len(mic_pos)
+    n_sources = len(source_pos)
+
+    # frequency bands
+    absorption = np.array(absorption, dtype=float, ndmin=2)
+    n_bands = absorption.shape[-1]
+    if center_freqs is None:
+        center_freqs = OCTAVE_CENTER_FREQS
+    if air_absorption:
+        assert n_bands in [1, len(OCTAVE_CENTER_FREQS)]
+        center_freqs = OCTAVE_CENTER_FREQS
+        n_bands = len(center_freqs)
+    elif n_bands == 1:
+        center_freqs = None
+    absorption = np.broadcast_to(
+        absorption, (n_mics, n_sources, len(WALLS), n_bands)
+    )
+
+    # image geometry for all pairs
+    pair_orders = np.broadcast_to(np.asarray(ism_order), (n_mics, n_sources))
+    with profiler.stage("image_source_model") as sizes:
+        lattice, orders, wall_counts = image_lattice(int(pair_orders.max()))
+        distances = image_distances(room_dim, mic_pos, source_pos, lattice)
+        delays = distances / speed_of_sound(temperature)
+        sizes["n_images"] = int(distances.size)
+
+    # amplitudes, shape (n_mics, n_sources, n_images, n_bands)
+    with profiler.stage("reflection_gains") as sizes:
+        gains = reflection_gains(wall_counts, absorption)
+        gains /= distances[..., None]
+        if np.any(pair_orders != pair_orders.max()):
+            keep = orders <= pair_orders[..., None]
+            gains *= keep[..., None]
+            delays = np.where(keep, delays, 0.0)
+        if air_absorption:
+            gains = gains * np.exp(
+                -0.5 * np.asarray(AIR_ABSORPTION_COEFFS) * distances[..., None]
+            )
+        sizes["n_gains"] = int(gains.size)
+
+    return delays, gains, orders, center_freqs
+
+
+def simulate_shoebox(
+    room_dim,
+    mic_pos,
+    source_pos,
+    absorption,
+    sample_rate=16000,
+    ism_order=17,
+    center_freqs=None,
+    air_absorption=False,
+    temperature=None,
+    profiler=None,
+    dense=False,
+):
+    """
+
+    Compute the RIRs between every mic and source position in a ShoeBox room
+    with the image source method.
+
+    Return a list (one entry per mic) of lists (one entry per source) of
+    RIRs, each trimmed after the latest arrival. If `dense`, return a float32
+    array of shape (n_mics, n_sources, T) padded with zeros after the latest
+    arrival of each RIR, and an array of shape (n_mics, n_sources) with the
+    length of each RIR.
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) or a Shoebox room.
+    mic_pos : list of arrays
+        Mic coordinates, shape (n_mics, 3).
+    source_pos : list of arrays
+        Source coordinates, shape (n_sources, 3).
+    absorption : float or array
+        Energy absorption coefficient, broadcastable to shape
+        (n_mics, n_sources, 6, n_bands) with walls in `WALLS` order. For
+        example a single value for all walls and frequencies, an array of
+        shape (6, n_bands) for per-wall materials, or an array of shape
+        (n_mics, n_sources, 1, 1) for a different uniform absorption for each
+        mic-source pair. Image geometry is shared by all pairs, only the
+        amplitudes depend on `absorption`.
+    sample_rate : int, optional
+        Sample rate in Hz.
+    ism_order : int or array, optional
+        Number of specular reflections to model, or one order per
+        mic-source pair as an array of shape (n_mics, n_sources), in which
+        case images are computed up to the largest order and those beyond
+        the order of a pair are dropped.
+    center_freqs : list, optional
+        Center frequencies if `absorption` has multiple bands. Default is
+        `OCTAVE_CENTER_FREQS`.
+    air_absorption : bool, optional
+        Whether to include air absorption in the simulation.
+    temperature : float, optional
+        Temperature in Celsius, to determine the speed of sound.
+    profiler : StageProfiler, optional
+        Collector of the duration and sizes of each stage, see
+        `profiling.StageProfiler`.
+    dense : bool, optional
+        Whether to render into a single float32 array.
+    """
+
+    if profiler is None:
+        profiler = null_profiler
+
+    delays, gains, _, center_freqs = shoebox_arrivals(
+        room_dim=room_dim,
+        mic_pos=mic_pos,
+        source_pos=source_pos,
+        absorption=absorption,
+        ism_order=ism_order,
+        center_freqs=center_freqs,
+        air_absorption=air_absorption,
+        temperature=temperature,
+        profiler=profiler,
+    )
+    n_mics, n_sources, n_images = delays.shape
+
+    # length of each RIR, after its latest arrival
+    lengths = (
+        np.floor(delays.max(axis=-1) * sample_rate).astype(int)
+        + FRAC_DELAY_LENGTH
+    )
+
+    out = None
+    if dense:
+        out = np.zeros((n_mics * n_sources, lengths.max()), dtype=np.float32)
+    with profiler.stage("compute_rir") as sizes:
+        rirs = render_rirs(
+            delays=delays.reshape(n_mics * n_sources, -1),
+            gains=gains.reshape(n_mics * n_sources, n_images, -1),
+            sample_rate=sample_rate,
+            center_freqs=center_freqs,
+            length=int(lengths.max()),
+            out=out,
+        )
+        highpass_rirs(rirs, sample_rate, lengths.reshape(-1))
+        sizes["rir_samples"] = int(rirs.size)
+
+    if dense:
+        return rirs.reshape(n_mics, n_sources, -1), lengths
+
+    lengths = lengths.reshape(-1)
+    rirs = [rirs[p, : lengths[p]] for p in range(n_mics * n_sources)]
+    return [rirs[m * n_sources : (m + 1) * n_sources] for m in range(n_mics)]
@@ -0,0 +1,60 @@
+import os
+import shutil
+import argparse
+
+from utils import get_subdirectories
+from room import Room
+
+"""
+Convert the RIRs of a room bundle (measured or simulated) from one wav file
+per mic-speaker pair to a single packed array per room (see `rir_store.py`).
+
+Example usage:
+```
+python pack_rir_dataset.py \
+measured_room_dataset_train_BUT_ReverbDB_7rooms_2020_05_07T15_23_53
+```
+"""
+
+
+def pack_bundle(dataset_path, remove_wav=False):
+    """
+    Parameters
+    ----------
+    dataset_path : str
+        Path to bundle, containing a `data` folder with one folder per room.
+    remove_wav : bool, optional
+        Whether to delete the wav files of the RIRs after packing them.
+    """
+    data_path = os.path.join(dataset_path, "data")
+    rooms = sorted(get_subdirectories(data_path))
+    for k, _id in enumerate(rooms):
+        room_path = os.path.join(data_path, _id)
+        room = Room.load(room_path)
+        print(
+            "room {} / {} : {}, {} mics, {} speakers".format(
+                k + 1, len(rooms), room.id, room.n_mics, room.n_speakers
+            )
+        )
+        room.save_packed(room_path)
+        if remove_wav:
+            shutil.rmtree(os.path.join(room_path, "rir"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Pack the RIRs of a room bundle into one array per room."
+    )
+    parser.add_argument(
+        "dataset",
+        type=str,
+        default=None,
+        help="Room bundle to pack.",
+    )
+    parser.add_argument(
+        "--remove_wav",
+        action="store_true",
+        help="Whether to delete wav files after packing.",
+    )
+    args = parser.parse_args()
+    pack_bundle(args.dataset, remove_wav=args.remove_wav)
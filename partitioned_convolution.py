@@ -0,0 +1,216 @@
+import click
+import numpy as np
+import soundfile as sf
+
+"""
+Uniformly partitioned overlap-save convolution, for streams or recordings
+too long to convolve in one FFT.
+
+RIRs are split into partitions of `block_size` samples whose spectra are
+computed once. Input is processed block by block: the spectrum of each input
+block enters a frequency-domain delay line (FDL), and each output block is
+the sum of the FDL spectra multiplied by the partition spectra. Latency is
+one block and memory only depends on the RIR length and the block size, not
+on the length of the input.
+
+Example usage:
+```
+convolver = PartitionedConvolver(room.get_rirs()[:, speaker], block_size=512)
+for block in blocks:
+    out = convolver.process(block)  # shape (n_mics, n_samples)
+tail = convolver.flush()
+```
+
+Or from the command line, for a recording played by speaker 0 of a room:
+```
+python partitioned_convolution.py room_path 0 input.wav output.wav
+```
+"""
+
+
+def partition_rirs(rirs, block_size):
+    """
+    Spectra of the partitions of RIRs.
+
+    Parameters
+    ----------
+    rirs : array
+        RIRs of shape (n_channels, rir_length), e.g. one per mic.
+    block_size : int
+        Number of samples per partition and per processed block.
+
+    Returns
+    -------
+    array
+        Complex array of shape (n_partitions, n_channels, block_size + 1).
+    """
+    rirs = np.atleast_2d(rirs)
+    n_channels, rir_length = rirs.shape
+    n_partitions = max(1, int(np.ceil(rir_length / block_size)))
+    padded = np.zeros(
+        (n_channels, n_partitions * block_size), dtype=rirs.dtype
+    )
+    padded[:, :rir_length] = rirs
+    partitions = padded.reshape(n_channels, n_partitions, block_size)
+    spectra = np.fft.rfft(partitions, n=2 * block_size, axis=-1)
+    return np.ascontiguousarray(
+        spectra.transpose(1, 0, 2).astype(np.complex64)
+    )
+
+
+class PartitionedConvolver(object):
+    def __init__(
+        self, rirs=None, block_size=1024, partitions=None, rir_length=None
+    ):
+        """
+        Stateful convolution of a single-channel input with one or more
+        RIRs, e.g. the RIRs between a speaker and every mic of a room.
+
+        Parameters
+        ----------
+        rirs : array, optional
+            RIRs of shape (n_channels, rir_length) or (rir_length,).
+        block_size : int, optional
+            Number of samples per block, i.e. the latency.
+        partitions : array, optional
+            Output of `partition_rirs` for `block_size`, to share
+            precomputed partitions between convolvers instead of `rirs`.
+        rir_length : int, optional
+            Length of RIRs when `partitions` is provided, default is the
+            length of all partitions.
+        """
+        if partitions is None:
+            assert rirs is not None
+            partitions = partition_rirs(rirs, block_size)
+        assert partitions.shape[-1] == block_size + 1
+        self.block_size = block_size
+        self.partitions = partitions
+        self.n_partitions, self.n_channels, n_freqs = partitions.shape
+        if rirs is not None:
+            rir_length = np.shape(rirs)[-1]
+        elif rir_length is None:
+            rir_length = self.n_partitions * block_size
+        self.rir_length = rir_length
+
+        # FDL as a ring buffer of input block spectra, most recent at `_head`
+        self._fdl = np.zeros((self.n_partitions, n_freqs), dtype=np.complex64)
+        self._head = 0
+        self._input = np.zeros(2 * block_size)
+        self._pending = np.zeros(0)
+        self._ring = np.arange(self.n_partitions)
+
+    def reset(self):
+        """Clear internal state, to start a new stream."""
+        self._fdl[:] = 0
+        self._head = 0
+        self._input[:] = 0
+        self._pending = np.zeros(0)
+
+    def _process_block(self, block):
+        B = self.block_size
+        # overlap-save: previous block followed by the new one
+        self._input[:B] = self._input[B:]
+        self._input[B:] = block
+        self._head = (self._head + 1) % self.n_partitions
+        self._fdl[self._head] = np.fft.rfft(self._input)
+
+        # partition p is applied to the input block from p blocks ago
+        order = (self._head - self._ring) % self.n_partitions
+        spec = np.einsum("pcf,pf->cf", self.partitions, self._fdl[order])
+        return np.fft.irfft(spec, n=2 * B, axis=-1)[:, B:]
+
+    def process(self, samples):
+        """
+        Feed input samples, of any length.
+
+        Return the output for all complete blocks so far, of shape
+        (n_channels, n_samples) where `n_samples` is a multiple of
+        `block_size`. Remaining samples are kept until the next call.
+        """
+        samples = np.concatenate([self._pending, np.ravel(samples)])
+        n_blocks = len(samples) // self.block_size
+        out = np.empty((self.n_channels, n_blocks * self.block_size))
+        for k in range(n_blocks):
+            start = k * self.block_size
+            out[:, start : start + self.block_size] = self._process_block(
+                samples[start : start + self.block_size]
+            )
+        self._pending = samples[n_blocks * self.block_size :]
+        return out
+
+    def flush(self):
+        """
+        Output for remaining input samples and the reverberation tail, and
+        reset the convolver.
+        """
+        n_samples = len(self._pending) + self.rir_length - 1
+        n_blocks = int(np.ceil(n_samples / self.block_size))
+        out = self.process(
+            np.zeros(n_blocks * self.block_size - len(self._pending))
+        )
+        self.reset()
+        return out[:, :n_samples]
+
+
+def convolve_file(
+    convolver, input_path, output_path, read_size=None, subtype=None
+):
+    """
+    Convolve a (mono) audio file with a `PartitionedConvolver`, reading and
+    writing block by block so that files of any duration can be processed.
+    The output file has one channel per RIR of the convolver.
+
+    Parameters
+    ----------
+    convolver : PartitionedConvolver
+        Convolver, reset before processing.
+    input_path : str
+        Mono audio file.
+    output_path : str
+        Output audio file.
+    read_size : int, optional
+        Number of samples to read at a time, default is 16 blocks.
+    subtype : str, optional
+        Subtype of output file, see `soundfile`. Default is `FLOAT`.
+    """
+    if read_size is None:
+        read_size = 16 * convolver.block_size
+    if subtype is None:
+        subtype = "FLOAT"
+    convolver.reset()
+    info = sf.info(input_path)
+    assert info.channels == 1, "Input must be mono."
+    with sf.SoundFile(
+        output_path,
+        "w",
+        samplerate=info.samplerate,
+        channels=convolver.n_channels,
+        subtype=subtype,
+    ) as out:
+        for block in sf.blocks(input_path, blocksize=read_size):
+            out.write(convolver.process(block).T)
+        out.write(convolver.flush().T)
+
+
+@click.command()
+@click.argument("room_path", type=str)
+@click.argument("speaker", type=int)
+@click.argument("input_path", type=str)
+@click.argument("output_path", type=str)
+@click.option("--block_size", type=int, default=1024)
+def convolve(room_path, speaker, input_path, output_path, block_size):
+    """
+    Convolve a mono recording played by SPEAKER of a room with the RIRs of
+    all its mics, writing one channel per mic.
+    """
+    from room import Room
+
+    room = Room.load(room_path)
+    convolver = PartitionedConvolver(
+        room.get_rirs()[:, speaker], block_size=block_size
+    )
+    convolve_file(convolver, input_path, output_path)
+
+
+if __name__ == "__main__":
+    convolve()
@@ -0,0 +1,115 @@
+import json
+import time
+import numpy as np
+from contextlib import contextmanager
+
+"""
+Opt-in, stage-level timing of room simulation.
+
+Simulation functions accept a `profiler` whose `stage` context manager times a
+block of code and records sizes describing the work done, e.g. the number of
+image sources or the length of the RIRs. Records can be merged across calls
+and processes and summarized per stage.
+
+Example usage:
+```
+profiler = StageProfiler()
+for _ in range(10):
+    compute_room_irs(..., profiler=profiler)
+pprint(profiler.summary())
+profiler.to_json("profile.json")
+```
+"""
+
+
+class StageProfiler(object):
+    def __init__(self):
+        """
+        Collect the duration and sizes of simulation stages. Each record is a
+        dictionary with the stage name, its duration in seconds and any size
+        passed to `stage`.
+        """
+        self.records = []
+
+    @contextmanager
+    def stage(self, name, **sizes):
+        """
+        Time the enclosed block as stage `name`. Sizes can be given upfront
+        or added to the yielded dictionary once they are known.
+        """
+        start_time = time.perf_counter()
+        yield sizes
+        self.add(name, time.perf_counter() - start_time, **sizes)
+
+    def add(self, name, duration, **sizes):
+        """Record stage `name` that took `duration` seconds."""
+        record = {"stage": name, "duration": duration}
+        record.update(sizes)
+        self.records.append(record)
+
+    def merge(self, records):
+        """Append records of another profiler, e.g. from a worker process."""
+        if isinstance(records, StageProfiler):
+            records = records.records
+        self.records += list(records)
+
+    def summary(self):
+        """
+        Aggregate records per stage, in order of first appearance.
+
+        Returns
+        -------
+        dict
+            For each stage, the number of calls, total / mean / max duration,
+            share of the total profiled time and the sum of each size.
+        """
+        stages = dict()
+        for _record in self.records:
+            stages.setdefault(_record["stage"], []).append(_record)
+
+        total_time = sum(_record["duration"] for _record in self.records)
+        summary = dict()
+        for name, records in stages.items():
+            durations = np.array([_record["duration"] for _record in records])
+            summary[name] = {
+                "count": len(records),
+                "total": float(durations.sum()),
+                "mean": float(durations.mean()),
+                "max": float(durations.max()),
+                "fraction": (
+                    float(durations.sum() / total_time)
+                    if total_time > 0
+                    else 0.0
+                ),
+            }
+            for _record in records:
+                for key, value in _record.items():
+                    if key in ["stage", "duration"]:
+                        continue
+                    summary[name].setdefault(key, 0)
+                    summary[name][key] += value
+        return summary
+
+    def to_json(self, path, include_records=False):
+        """
+        Write summary, and optionally every record, to a JSON file.
+        """
+        data = {"summary": self.summary()}
+        if include_records:
+            data["records"] = self.records
+        with open(path, "w") as f:
+            json.dump(data, f, indent=4)
+
+
+class NullProfiler(object):
+    """Profiler that records nothing, used when profiling is not requested."""
+
+    @contextmanager
+    def stage(self, name, **sizes):
+        yield sizes
+
+    def add(self, name, duration, **sizes):
+        pass
+
+
+null_profiler = NullProfiler()
@@ -0,0 +1,230 @@
+import os
+import json
+import hashlib
+import tempfile
+import numpy as np
+
+from materials import materials_absorption_table
+
+"""
+Persistent, content-addressed cache of simulated RIRs.
+
+Each entry is stored as a `.npz` file whose name is a hash of every parameter
+that affects the simulation. Entries are evicted in least-recently-used order
+(based on file modification time, which is refreshed on each hit) once the
+total size of the cache exceeds a limit.
+
+Example usage:
+```
+cache = RIRCache("rir_cache", max_size=int(10e9))
+rirs, sample_rate = compute_room_irs(..., cache=cache)
+```
+"""
+
+
+# bump when the simulation code changes in a way that invalidates entries
+CACHE_VERSION = 3
+
+
+def _to_serializable(obj):
+    """Convert nested parameters to JSON-friendly types."""
+    if isinstance(obj, dict):
+        return {str(k): _to_serializable(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, np.ndarray)):
+        return [_to_serializable(v) for v in obj]
+    if isinstance(obj, (np.integer, np.floating)):
+        return obj.item()
+    return obj
+
+
+def resolve_room_properties(room_properties):
+    """
+    Replace material names by their entry in `materials_absorption_table`,
+    so that a change of the table also changes the cache key.
+
+    Parameters
+    ----------
+    room_properties : float, list or dict
+        Room properties as passed to `compute_room_irs`.
+    """
+    if isinstance(room_properties, dict):
+        return {
+            wall: (
+                materials_absorption_table[_mat]
+                if isinstance(_mat, str)
+                else _mat
+            )
+            for wall, _mat in room_properties.items()
+        }
+    return room_properties
+
+
+def make_cache_key(**params):
+    """
+    Stable hash of simulation parameters.
+
+    Parameters are serialized to canonical JSON (sorted keys, NumPy types
+    converted to Python types) and hashed with SHA-256.
+    """
+    params = dict(params)
+    if "room_properties" in params:
+        params["room_properties"] = resolve_room_properties(
+            params["room_properties"]
+        )
+    params["cache_version"] = CACHE_VERSION
+    serialized = json.dumps(
+        _to_serializable(params), sort_keys=True, separators=(",", ":")
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+# number of writes after which the size of the cache directory is scanned
+# again, to account for entries written by other processes
+RESCAN_INTERVAL = 100
+
+
+class RIRCache(object):
+    def __init__(self, cache_dir, max_size=int(10e9)):
+        """
+        Parameters
+        ----------
+        cache_dir : str
+            Directory to store entries in, created if it doesn't exist.
+        max_size : int, optional
+            Maximum total size of entries in bytes, least recently used
+            entries are deleted beyond this size.
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+        # total size of entries tracked across writes, scanned on first write
+        # and every `RESCAN_INTERVAL` writes
+        self._size = None
+        self._n_puts = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, "{}.npz".format(key))
+
+    def _entries(self):
+        entries = []
+        for fn in os.listdir(self.cache_dir):
+            if not fn.endswith(".npz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, fn))
+            except FileNotFoundError:
+                # evicted by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, fn))
+        return entries
+
+    def size(self):
+        """Total size of entries in bytes."""
+        return sum(_size for _, _size, _ in self._entries())
+
+    def get(self, key):
+        """
+        Return cached `(rirs, sample_rate)` for `key` or `None` if missing,
+        with `rirs[m][s]` the RIR between mic `m` and source `s`.
+        """
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                samples = data["samples"]
+                lengths = data["lengths"]
+                sample_rate = int(data["sample_rate"])
+        except (FileNotFoundError, OSError, ValueError, KeyError):
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+
+        offsets = np.concatenate([[0], np.cumsum(lengths.ravel())])
+        rirs = []
+        k = 0
+        for m in range(lengths.shape[0]):
+            mic_rirs = []
+            for _ in range(lengths.shape[1]):
+                mic_rirs.append(samples[offsets[k] : offsets[k + 1]])
+                k += 1
+            rirs.append(mic_rirs)
+        return rirs, sample_rate
+
+    def put(self, key, rirs, sample_rate):
+        """
+        Store RIRs for `key` and evict least recently used entries if the
+        cache is too large. The size of the cache is tracked across writes
+        rather than scanned on each of them.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, see `make_cache_key`.
+        rirs : list of lists
+            `rirs[m][s]` is the RIR between mic `m` and source `s`.
+        sample_rate : int
+            Sample rate in Hz.
+        """
+        lengths = np.array(
+            [[len(_rir) for _rir in _mic] for _mic in rirs], dtype=np.int64
+        )
+        samples = np.concatenate(
+            [np.asarray(_rir, dtype=float) for _mic in rirs for _rir in _mic]
+        )
+
+        path = self._path(key)
+        try:
+            replaced_size = os.path.getsize(path)
+        except FileNotFoundError:
+            replaced_size = 0
+
+        # write to temporary file first so that entries are never partial
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(
+                    f,
+                    samples=samples,
+                    lengths=lengths,
+                    sample_rate=sample_rate,
+                )
+            new_size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        self._n_puts += 1
+        if self._size is None or self._n_puts % RESCAN_INTERVAL == 0:
+            self._size = self.size()
+        else:
+            self._size += new_size - replaced_size
+        if self._size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """Delete least recently used entries until under `max_size`."""
+        entries = sorted(self._entries())
+        total = sum(_size for _, _size, _ in entries)
+        for _, _size, fn in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, fn))
+            except FileNotFoundError:
+                pass
+            total -= _size
+        self._size = total
+
+    def clear(self):
+        """Delete all entries."""
+        for _, _, fn in self._entries():
+            try:
+                os.remove(os.path.join(self.cache_dir, fn))
+            except FileNotFoundError:
+                pass
+        self._size = 0
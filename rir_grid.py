@@ -0,0 +1,316 @@
+import os
+import numpy as np
+
+from utils import compute_multi_mic_room_irs, positions_inside
+from numpy_ism import (
+    FRAC_DELAY_LENGTH,
+    fractional_delay_taps,
+    speed_of_sound,
+)
+
+"""
+RIRs precomputed over a lattice of source positions inside a room, for fixed
+mics, and interpolated at arbitrary source positions, e.g. for moving sources
+or augmentation with dense source positions.
+
+RIRs of all grid points are stored in a single `.npy` array of shape
+(n_mics, nx, ny, nz, T) that is memory-mapped when loading, so that a lookup
+only reads the RIRs of the eight grid points around the requested position.
+Interpolation is trilinear and delay-aligned: each of the eight RIRs is first
+shifted by the difference between the direct path delay of the requested
+position and its own, with the fractional delay filters of `numpy_ism`, so
+that direct paths add up at the same time instead of being smeared over the
+cell.
+
+Example usage:
+```
+compute_rir_grid(
+    room_dim, mic_pos, "grid", spacing=0.25, room_properties=0.5,
+    software="numpy",
+)
+grid = RIRGrid("grid")
+rir = grid.rir(mic=0, position=[1.2, 3.4, 1.5])
+```
+"""
+
+
+RIR_GRID_FILE = "rir_grid.npy"
+RIR_GRID_INDEX_FILE = "rir_grid_index.npz"
+
+# grid points closer than this to a wall or to any mic, in meters, are not
+# simulated, as their direct path is degenerate
+MIN_WALL_DISTANCE = 0.1
+MIN_MIC_DISTANCE = 0.1
+
+
+def grid_axes(room_dim, spacing, min_distance=0.0):
+    """
+    Coordinates of the grid along each axis, evenly spaced by at most
+    `spacing` between `min_distance` from opposite walls.
+
+    Return list of three arrays.
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) of a Shoebox room.
+    spacing : float
+        Largest distance between neighbouring grid points, in meters.
+    min_distance : float, optional
+        Minimum distance of grid points to every wall.
+    """
+    axes = []
+    for _dim in room_dim:
+        extent = _dim - 2 * min_distance
+        if extent < 0:
+            raise ValueError("Room too small for `min_distance`.")
+        n_points = int(np.ceil(extent / spacing - 1e-9)) + 1
+        axes.append(np.linspace(min_distance, _dim - min_distance, n_points))
+    return axes
+
+
+def compute_rir_grid(
+    room_dim,
+    mic_pos,
+    destination_path,
+    spacing=0.5,
+    min_distance=MIN_WALL_DISTANCE,
+    mic_distance=MIN_MIC_DISTANCE,
+    batch_size=256,
+    length=None,
+    **sim_param,
+):
+    """
+    Simulate RIRs between each mic and every point of a lattice of source
+    positions inside the room, and write them to `destination_path`. Points
+    outside of the room, see `utils.is_inside`, or closer than `mic_distance`
+    to any mic are marked as invalid, not simulated and never used for
+    interpolation.
+
+    Return `RIRGrid` of the written RIRs.
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) of a Shoebox room.
+    mic_pos : list of arrays
+        List of coordinates for microphone positions.
+    destination_path : str
+        Directory to write `RIR_GRID_FILE` and `RIR_GRID_INDEX_FILE` to.
+    spacing : float, optional
+        Largest distance between neighbouring grid points, in meters.
+    min_distance : float, optional
+        Minimum distance of grid points to every wall.
+    mic_distance : float, optional
+        Minimum distance of valid grid points to every mic.
+    batch_size : int, optional
+        Number of grid points simulated together, i.e. as the sources of a
+        single room.
+    length : int, optional
+        Length of stored RIRs. Default is the length of the longest RIR of
+        the first batch, later RIRs being truncated or zero-padded to it.
+    sim_param : kwargs
+        Other parameters of `compute_multi_mic_room_irs`, e.g.
+        `room_properties`, `sample_rate` or `software`.
+    """
+    mic_pos = np.array(mic_pos, dtype=float, ndmin=2)
+    axes = grid_axes(room_dim, spacing, min_distance=min_distance)
+    shape = tuple(len(_axis) for _axis in axes)
+    points = np.stack(np.meshgrid(*axes, indexing="ij"), axis=-1)
+    valid = positions_inside(points, room_dim, min_distance=min_distance)
+    distances = np.linalg.norm(points[..., None, :] - mic_pos, axis=-1)
+    valid &= np.all(distances >= mic_distance, axis=-1)
+    valid_idx = np.flatnonzero(valid)
+    points = points.reshape(-1, 3)
+
+    os.makedirs(destination_path, exist_ok=True)
+    grid_path = os.path.join(destination_path, RIR_GRID_FILE)
+    rirs = None
+    for start in range(0, len(valid_idx), batch_size):
+        batch = valid_idx[start : start + batch_size]
+        resp, lengths, sample_rate = compute_multi_mic_room_irs(
+            room_dim=room_dim,
+            mic_pos=mic_pos,
+            source_pos=points[batch],
+            dense=True,
+            **sim_param,
+        )
+        if rirs is None:
+            if length is None:
+                length = int(lengths.max())
+            # fill array on disk directly, invalid points are left at zero
+            rirs = np.lib.format.open_memmap(
+                grid_path + ".tmp",
+                mode="w+",
+                dtype=np.float32,
+                shape=(len(mic_pos), int(np.prod(shape)), length),
+            )
+        n_samples = min(length, resp.shape[-1])
+        rirs[:, batch, :n_samples] = resp[..., :n_samples]
+    if rirs is None:
+        raise ValueError("No grid point inside the room.")
+    rirs.flush()
+    del rirs
+    os.replace(grid_path + ".tmp", grid_path)
+
+    temperature = sim_param.get("temperature")
+    index_path = os.path.join(destination_path, RIR_GRID_INDEX_FILE)
+    with open(index_path + ".tmp", "wb") as f:
+        np.savez(
+            f,
+            x=axes[0],
+            y=axes[1],
+            z=axes[2],
+            valid=valid,
+            mic_pos=mic_pos,
+            room_dim=np.asarray(room_dim, dtype=float),
+            sample_rate=sample_rate,
+            temperature=np.nan if temperature is None else temperature,
+        )
+    os.replace(index_path + ".tmp", index_path)
+    return RIRGrid(destination_path)
+
+
+class RIRGrid(object):
+    def __init__(self, source_path, mmap=True):
+        """
+        RIRs of a grid of source positions written by `compute_rir_grid`.
+
+        Parameters
+        ----------
+        source_path : str
+            Directory containing `RIR_GRID_FILE` and `RIR_GRID_INDEX_FILE`.
+        mmap : bool, optional
+            Whether to memory-map RIRs rather than reading them into memory.
+        """
+        self.path = source_path
+        with np.load(os.path.join(source_path, RIR_GRID_INDEX_FILE)) as index:
+            self.axes = [index["x"], index["y"], index["z"]]
+            self.valid = index["valid"]
+            self.mic_pos = index["mic_pos"]
+            self.room_dim = index["room_dim"]
+            self.sample_rate = int(index["sample_rate"])
+            temperature = float(index["temperature"])
+        self.temperature = None if np.isnan(temperature) else temperature
+        self.c = speed_of_sound(self.temperature)
+        self.shape = self.valid.shape
+        rirs = np.load(
+            os.path.join(source_path, RIR_GRID_FILE),
+            mmap_mode="r" if mmap else None,
+        )
+        self.rirs = rirs.reshape(len(self.mic_pos), *self.shape, -1)
+        self.n_mics = len(self.mic_pos)
+        self.length = self.rirs.shape[-1]
+
+    @staticmethod
+    def exists(source_path):
+        return os.path.isfile(
+            os.path.join(source_path, RIR_GRID_INDEX_FILE)
+        ) and os.path.isfile(os.path.join(source_path, RIR_GRID_FILE))
+
+    def positions(self):
+        """Coordinates of the grid points, shape (nx, ny, nz, 3)."""
+        return np.stack(np.meshgrid(*self.axes, indexing="ij"), axis=-1)
+
+    def _corners(self, position):
+        """
+        Indices and trilinear weights of the valid grid points around
+        `position`, whose coordinates are clipped to the grid.
+        """
+        idx, frac = [], []
+        for _axis, _coord in zip(self.axes, position):
+            if len(_axis) == 1:
+                idx.append(np.zeros(2, dtype=int))
+                frac.append(0.0)
+                continue
+            i = np.searchsorted(_axis, _coord, side="right") - 1
+            i = min(max(i, 0), len(_axis) - 2)
+            t = (_coord - _axis[i]) / (_axis[i + 1] - _axis[i])
+            idx.append(np.array([i, i + 1]))
+            frac.append(min(max(t, 0.0), 1.0))
+        corners = np.stack(np.meshgrid(*idx, indexing="ij"), axis=-1).reshape(
+            -1, 3
+        )
+        weights = np.ones(8)
+        for d, t in enumerate(frac):
+            bit = (np.arange(8) >> (2 - d)) & 1
+            weights *= np.where(bit, t, 1.0 - t)
+        # a same grid point can appear twice along flat axes
+        corners, inverse = np.unique(corners, axis=0, return_inverse=True)
+        weights = np.bincount(inverse.ravel(), weights=weights)
+        weights *= self.valid[tuple(corners.T)]
+        keep = weights > 0
+        if not np.any(keep):
+            raise ValueError("No valid grid point around {}.".format(position))
+        return corners[keep], weights[keep] / weights[keep].sum()
+
+    def rir(self, mic, position, out=None):
+        """
+        RIR between `mic` and a source at `position`, interpolated from the
+        surrounding grid points with their direct paths aligned on that of
+        `position`.
+
+        Return array of shape (length,).
+
+        Parameters
+        ----------
+        mic : int
+            Index of the mic.
+        position : array
+            Source coordinates, inside the room.
+        out : array, optional
+            Pre-allocated float32 output of shape (length,).
+        """
+        position = np.asarray(position, dtype=float)
+        if not positions_inside(position, self.room_dim):
+            raise ValueError("Source is outside of room.")
+        corners, weights = self._corners(position)
+        if out is None:
+            out = np.zeros(self.length, dtype=np.float32)
+        else:
+            out[:] = 0
+
+        # shift of each grid RIR in samples, from its direct path to that of
+        # the requested position
+        mic_pos = self.mic_pos[mic]
+        points = np.stack(
+            [_axis[corners[:, d]] for d, _axis in enumerate(self.axes)],
+            axis=-1,
+        )
+        delays = np.linalg.norm(points - mic_pos, axis=-1)
+        delay = np.linalg.norm(position - mic_pos)
+        shifts = (delay - delays) / self.c * self.sample_rate
+        half = (FRAC_DELAY_LENGTH - 1) // 2
+        for _corner, _weight, _shift in zip(corners, weights, shifts):
+            rir = self.rirs[(mic,) + tuple(_corner)]
+            i = int(np.floor(_shift))
+            taps = _weight * fractional_delay_taps(_shift - i)
+            rir = np.convolve(rir, taps)[half : half + len(rir)]
+            _shift_add(out, rir, i)
+        return out
+
+    def rirs_at(self, positions):
+        """
+        Interpolated RIRs between each mic and each source position, e.g.
+        along the trajectory of a moving source.
+
+        Return float32 array of shape (n_mics, n_positions, length).
+        """
+        positions = np.array(positions, dtype=float, ndmin=2)
+        out = np.zeros(
+            (self.n_mics, len(positions), self.length), dtype=np.float32
+        )
+        for m in range(self.n_mics):
+            for p, _pos in enumerate(positions):
+                self.rir(m, _pos, out=out[m, p])
+        return out
+
+
+def _shift_add(out, x, shift):
+    """Add `x` delayed by `shift` samples to `out`, in place."""
+    n = len(out)
+    if shift >= 0:
+        if shift < n:
+            out[shift:] += x[: n - shift]
+    elif -shift < n:
+        out[: n + shift] += x[-shift:]
@@ -0,0 +1,94 @@
+import os
+import numpy as np
+
+"""
+Packed storage of the RIRs of a room: all RIRs are concatenated into a single
+contiguous `.npy` array, with a small index of offsets and lengths for each
+(mic, speaker) pair. The array is memory-mapped when loading, so that
+accessing a RIR is a zero-copy slice instead of opening and decoding a wav
+file.
+"""
+
+
+RIR_SAMPLES_FILE = "rir_samples.npy"
+RIR_INDEX_FILE = "rir_index.npz"
+
+
+def write_packed_rirs(rirs, sample_rate, destination_path, dtype=np.float32):
+    """
+    Write RIRs of a room in packed format.
+
+    Parameters
+    ----------
+    rirs : list of lists
+        `rirs[m][s]` is the RIR between mic `m` and speaker `s`.
+    sample_rate : int
+        Sample rate in Hz.
+    destination_path : str
+        Directory to write `RIR_SAMPLES_FILE` and `RIR_INDEX_FILE` to.
+    dtype : numpy dtype, optional
+        Data type of stored samples.
+    """
+    lengths = np.array(
+        [[len(_rir) for _rir in _mic] for _mic in rirs], dtype=np.int64
+    )
+    offsets = np.zeros_like(lengths)
+    offsets.ravel()[1:] = np.cumsum(lengths.ravel())[:-1]
+
+    # fill array on disk directly to avoid holding a second copy in memory
+    samples_path = os.path.join(destination_path, RIR_SAMPLES_FILE)
+    samples = np.lib.format.open_memmap(
+        samples_path + ".tmp",
+        mode="w+",
+        dtype=dtype,
+        shape=(int(lengths.sum()),),
+    )
+    for m, _mic in enumerate(rirs):
+        for s, _rir in enumerate(_mic):
+            samples[offsets[m, s] : offsets[m, s] + lengths[m, s]] = _rir
+    samples.flush()
+    del samples
+    os.replace(samples_path + ".tmp", samples_path)
+
+    index_path = os.path.join(destination_path, RIR_INDEX_FILE)
+    with open(index_path + ".tmp", "wb") as f:
+        np.savez(f, offsets=offsets, lengths=lengths, sample_rate=sample_rate)
+    os.replace(index_path + ".tmp", index_path)
+
+
+class PackedRIRStore(object):
+    def __init__(self, source_path, mmap=True):
+        """
+        Parameters
+        ----------
+        source_path : str
+            Directory containing `RIR_SAMPLES_FILE` and `RIR_INDEX_FILE`.
+        mmap : bool, optional
+            Whether to memory-map samples rather than reading them into
+            memory.
+        """
+        self.path = source_path
+        with np.load(os.path.join(source_path, RIR_INDEX_FILE)) as index:
+            self.offsets = index["offsets"]
+            self.lengths = index["lengths"]
+            self.sample_rate = int(index["sample_rate"])
+        self.samples = np.load(
+            os.path.join(source_path, RIR_SAMPLES_FILE),
+            mmap_mode="r" if mmap else None,
+        )
+        self.n_mics, self.n_speakers = self.lengths.shape
+
+    @staticmethod
+    def exists(source_path):
+        return os.path.isfile(
+            os.path.join(source_path, RIR_INDEX_FILE)
+        ) and os.path.isfile(os.path.join(source_path, RIR_SAMPLES_FILE))
+
+    def rir(self, mic, speaker):
+        """RIR between `mic` and `speaker`, as a read-only view."""
+        start = self.offsets[mic, speaker]
+        return self.samples[start : start + self.lengths[mic, speaker]]
+
+    def mic(self, mic):
+        """List of RIRs between `mic` and each speaker."""
+        return [self.rir(mic, s) for s in range(self.n_speakers)]
@@ -0,0 +1,210 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from utils import (
+    get_subdirectories,
+    compute_multi_mic_room_irs,
+    get_backend,
+    RoomSimSoftware,
+    ISM_ENERGY_DB,
+)
+from room import Room
+from absorption_fit import fit_bundle
+from simulate_measured_room_dataset import (
+    simulation_options,
+    measured_room_param,
+    group_mics,
+    room_materials_registry,
+    job_seed,
+)
+
+"""
+Stream simulated RIRs in memory, e.g. for on-the-fly augmentation, without
+writing anything to disk.
+
+Simulations are described by specs: dictionaries with the arguments of
+`compute_multi_mic_room_irs` and a `room_id`, and optionally `mic_idx` and
+`speaker_idx` to label the mics and sources of the spec (default is their
+position in `mic_pos` and `source_pos`). Specs are consumed lazily and at
+most a bounded number of them are simulated ahead of the consumer.
+
+Example usage:
+```
+specs = measured_room_specs(
+    "measured_room_dataset_train_BUT_ReverbDB_7rooms_2020_05_07T15_23_53",
+    software="numpy",
+)
+for room_id, mic_idx, speaker_idx, rir, sample_rate in stream_rirs(specs):
+    ...
+```
+"""
+
+
+def measured_room_specs(
+    original_dataset,
+    air_abs=False,
+    ism_order=17,
+    ray_tracing=False,
+    freq_dep=False,
+    software=RoomSimSoftware.PYROOMACOUSTICS,
+    seed=None,
+    cache=None,
+    fit_absorption=False,
+    ism_energy_db=ISM_ENERGY_DB,
+    late_tail=False,
+    n_rays=None,
+):
+    """
+    Yield specs to simulate the rooms of a measured room bundle, with the
+    same parameters (and seeds) as `simulate_measured_bundle`.
+
+    Parameters are the same as for `simulate_measured_bundle`.
+    """
+    options = simulation_options(
+        software=software,
+        air_abs=air_abs,
+        ism_order=ism_order,
+        ray_tracing=ray_tracing,
+        freq_dep=freq_dep or fit_absorption,
+        late_tail=late_tail,
+        n_rays=n_rays,
+    )
+    fitted_materials = dict()
+    if fit_absorption and options["freq_dep"]:
+        fitted_materials = fit_bundle(
+            original_dataset, prior_materials=room_materials_registry
+        )
+
+    data_path = os.path.join(original_dataset, "data")
+    for _id in get_subdirectories(data_path):
+        room = Room.load(os.path.join(data_path, _id))
+        speaker_pos = [
+            _speaker["target_location"] for _speaker in room.speaker_metadata
+        ]
+        sim_param = measured_room_param(room.params)
+
+        for materials, mic_idx in group_mics(
+            _id,
+            room.mic_metadata,
+            freq_dep=options["freq_dep"],
+            materials=fitted_materials.get(room.id),
+        ):
+            # one spec per mic for ray tracing, to match seeds of bundles
+            if options["ray_tracing"]:
+                groups = [([m], [i]) for i, m in enumerate(mic_idx)]
+            else:
+                groups = [(mic_idx, list(range(len(mic_idx))))]
+            for _mics, _rows in groups:
+                if isinstance(materials, list):
+                    # unique RT60 per mic-speaker pair
+                    props = [materials[i] for i in _rows]
+                else:
+                    props = materials
+                spec = dict(sim_param)
+                spec.update(
+                    {
+                        "room_id": room.id,
+                        "mic_idx": _mics,
+                        "speaker_idx": list(range(len(speaker_pos))),
+                        "mic_pos": [
+                            room.mic_metadata[m]["mic_location"] for m in _mics
+                        ],
+                        "source_pos": speaker_pos,
+                        "room_properties": props,
+                        "ism_order": options["ism_order"],
+                        "ism_energy_db": ism_energy_db,
+                        "late_tail": options["late_tail"],
+                        "ray_tracing": options["ray_tracing"],
+                        "ray_tracing_param": options["ray_tracing_param"],
+                        "air_absorption": options["air_abs"],
+                        "software": software,
+                        "cache": cache,
+                    }
+                )
+                if seed is not None:
+                    spec["seed"] = job_seed(seed, room.id, _mics[0])
+                yield spec
+
+
+def simulate_spec(spec):
+    """
+    Simulate the RIRs of a spec.
+
+    Return `(room_id, mic_idx, speaker_idx, rirs, sample_rate)` where
+    `rirs[m][s]` is the RIR between `mic_idx[m]` and `speaker_idx[s]`.
+    """
+    spec = dict(spec)
+    room_id = spec.pop("room_id")
+    mic_idx = spec.pop("mic_idx", None)
+    speaker_idx = spec.pop("speaker_idx", None)
+    if mic_idx is None:
+        mic_idx = list(range(len(spec["mic_pos"])))
+    if speaker_idx is None:
+        speaker_idx = list(range(len(spec["source_pos"])))
+    rirs, sample_rate = compute_multi_mic_room_irs(**spec)
+    return room_id, mic_idx, speaker_idx, rirs, sample_rate
+
+
+def _init_worker(software):
+    if software is not None:
+        get_backend(software).load()
+
+
+def stream_rirs(specs, workers=1, max_pending=None, software=None):
+    """
+    Lazily simulate specs and yield one record per RIR:
+    `(room_id, mic_idx, speaker_idx, rir, sample_rate)`.
+
+    Records are yielded in the order of `specs`, whatever the number of
+    workers.
+
+    Parameters
+    ----------
+    specs : iterable of dict
+        Simulation specs, e.g. from `measured_room_specs`.
+    workers : int, optional
+        Number of processes to simulate with, in the current process if 1.
+    max_pending : int, optional
+        Maximum number of specs simulated ahead of the consumer when
+        `workers > 1`, which bounds memory. Default is `2 * workers`.
+    software : str, optional
+        Software to load once in each worker process.
+    """
+    if workers <= 1:
+        for spec in specs:
+            room_id, mic_idx, speaker_idx, rirs, sample_rate = simulate_spec(
+                spec
+            )
+            for m, mic_rirs in zip(mic_idx, rirs):
+                for n, _rir in zip(speaker_idx, mic_rirs):
+                    yield room_id, m, n, _rir, sample_rate
+        return
+
+    if max_pending is None:
+        max_pending = 2 * workers
+    specs = iter(specs)
+    pending = deque()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(software,),
+    ) as executor:
+        try:
+            while True:
+                while len(pending) < max_pending:
+                    spec = next(specs, None)
+                    if spec is None:
+                        break
+                    pending.append(executor.submit(simulate_spec, spec))
+                if len(pending) == 0:
+                    break
+                res = pending.popleft().result()
+                room_id, mic_idx, speaker_idx, rirs, sample_rate = res
+                for m, mic_rirs in zip(mic_idx, rirs):
+                    for n, _rir in zip(speaker_idx, mic_rirs):
+                        yield room_id, m, n, _rir, sample_rate
+        finally:
+            # consumer stopped early or a simulation failed
+            for future in pending:
+                future.cancel()
@@ -1,9 +1,86 @@
 import glob
 import json
 import os
+import re
 import shutil
+import threading
+import numpy as np
+import soundfile as sf
+from collections import OrderedDict
 
 from utils import get_subdirectories
+from rir_store import PackedRIRStore, write_packed_rirs
+
+
+def _numeric_sort(paths):
+    """
+    Sort paths by the last integer in their name, e.g. mic2 < mic10, and then
+    by name. Names without an integer come first.
+    """
+
+    def key(path):
+        name = os.path.basename(path)
+        numbers = re.findall(r"\d+", name)
+        return (int(numbers[-1]) if numbers else -1, name)
+
+    return sorted(paths, key=key)
+
+
+class AudioCache(object):
+    def __init__(self, max_bytes=int(1e9)):
+        """
+        Bounded least-recently-used cache of decoded audio files, keyed by
+        file path. Cached arrays are read-only as they are shared.
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            Maximum total size of cached arrays in bytes.
+        """
+        self.max_bytes = max_bytes
+        self.n_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        """Return `(data, sample_rate)` of audio file at `path`."""
+        with self._lock:
+            if path in self._entries:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return self._entries[path]
+            self.misses += 1
+
+        data, sample_rate = sf.read(path, dtype="float32")
+        data.flags.writeable = False
+
+        with self._lock:
+            if path not in self._entries and data.nbytes <= self.max_bytes:
+                self._entries[path] = (data, sample_rate)
+                self.n_bytes += data.nbytes
+                self._evict()
+        return data, sample_rate
+
+    def set_max_bytes(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.n_bytes = 0
+
+    def _evict(self):
+        while self.n_bytes > self.max_bytes:
+            _, (data, _) = self._entries.popitem(last=False)
+            self.n_bytes -= data.nbytes
+
+
+# shared by all rooms unless one is provided
+default_audio_cache = AudioCache()
 
 
 class Room(object):
@@ -15,18 +92,76 @@ class Room(object):
         room_params,
         room_id,
         background_noise,
+        rir_store=None,
+        audio_cache=None,
     ):
 
         self.id = room_id
         self.responses = responses
-        self.n_mics = len(responses)
-        self.n_speakers = len(responses[0])
+        self.rir_store = rir_store
+        if responses is not None:
+            if len(responses) == 0:
+                raise ValueError("Room {} has no RIRs.".format(room_id))
+            self.n_mics = len(responses)
+            self.n_speakers = len(responses[0])
+        else:
+            # packed RIRs only
+            self.n_mics = rir_store.n_mics
+            self.n_speakers = rir_store.n_speakers
         self.mic_metadata = mic_metadata
         self.speaker_metadata = speaker_metadata
         self.params = room_params
         self.background_noise = background_noise
+        if audio_cache is None:
+            audio_cache = default_audio_cache
+        self.audio_cache = audio_cache
+
+    @property
+    def sample_rate(self):
+        if self.rir_store is not None:
+            return self.rir_store.sample_rate
+        return self.audio_cache.read(self.responses[0][0])[1]
+
+    def get_rir(self, mic, speaker):
+        """
+        RIR between `mic` and `speaker` as a read-only array, decoded on first
+        access and then cached (or sliced from packed RIRs if available).
+        """
+        if self.rir_store is not None:
+            return self.rir_store.rir(mic, speaker)
+        return self.audio_cache.read(self.responses[mic][speaker])[0]
+
+    def get_mic_rirs(self, mic):
+        """List of RIRs between `mic` and each speaker."""
+        return [self.get_rir(mic, n) for n in range(self.n_speakers)]
 
-    def save(self, destination_path):
+    def get_rirs(self, dtype=np.float32):
+        """
+        All RIRs of the room as an array of shape (n_mics, n_speakers, T),
+        zero-padded to the longest RIR.
+        """
+        rirs = [self.get_mic_rirs(m) for m in range(self.n_mics)]
+        max_len = max(len(_rir) for _mic in rirs for _rir in _mic)
+        out = np.zeros((self.n_mics, self.n_speakers, max_len), dtype=dtype)
+        for m, _mic in enumerate(rirs):
+            for n, _rir in enumerate(_mic):
+                out[m, n, : len(_rir)] = _rir
+        return out
+
+    def get_background_noise(self, mic):
+        """Background noise recording of `mic` as a read-only array."""
+        return self.audio_cache.read(self.background_noise[mic])[0]
+
+    def save(self, destination_path, packed=False):
+        """
+        Parameters
+        ----------
+        destination_path : str
+            Directory to create for the room.
+        packed : bool, optional
+            Whether to store RIRs as a single packed array (see
+            `rir_store.py`) instead of one wav file per mic-speaker pair.
+        """
         os.mkdir(destination_path)
 
         # -- room metadata
@@ -41,15 +176,24 @@ class Room(object):
             json.dump(config, outfile, indent=4, sort_keys=True)
 
         # -- room impulse responses
-        rir_path = os.path.join(destination_path, "rir")
-        os.mkdir(rir_path)
-        for m, _mic in enumerate(self.responses):
-            mic_path = os.path.join(rir_path, "mic{}".format(m))
-            os.mkdir(mic_path)
-            for n, _response in enumerate(_mic):
-                shutil.copyfile(
-                    _response, os.path.join(mic_path, "{}.wav".format(n))
-                )
+        if packed:
+            self.save_packed(destination_path)
+        else:
+            rir_path = os.path.join(destination_path, "rir")
+            os.mkdir(rir_path)
+            for m in range(self.n_mics):
+                mic_path = os.path.join(rir_path, "mic{}".format(m))
+                os.mkdir(mic_path)
+                for n in range(self.n_speakers):
+                    _dest = os.path.join(mic_path, "{}.wav".format(n))
+                    if self.responses is not None:
+                        shutil.copyfile(self.responses[m][n], _dest)
+                    else:
+                        sf.write(
+                            _dest,
+                            self.rir_store.rir(m, n),
+                            self.rir_store.sample_rate,
+                        )
 
         # -- background noise
         background_noise_path = os.path.join(
@@ -61,8 +205,49 @@ class Room(object):
                 _fp, os.path.join(background_noise_path, "mic{}.wav".format(k))
             )
 
+    def save_packed(self, destination_path):
+        """
+        Write RIRs into packed format in an existing room directory.
+
+        Parameters
+        ----------
+        destination_path : str
+            Room directory.
+        """
+        if self.rir_store is not None:
+            rirs = [
+                self.rir_store.mic(m) for m in range(self.rir_store.n_mics)
+            ]
+            sample_rate = self.rir_store.sample_rate
+        else:
+            rirs = []
+            sample_rate = None
+            for _mic in self.responses:
+                mic_rirs = []
+                for _fp in _mic:
+                    _rir, _sample_rate = sf.read(_fp, dtype="float32")
+                    if sample_rate is None:
+                        sample_rate = _sample_rate
+                    assert _sample_rate == sample_rate
+                    mic_rirs.append(_rir)
+                rirs.append(mic_rirs)
+        write_packed_rirs(rirs, sample_rate, destination_path)
+
     @classmethod
-    def load(cls, source_path):
+    def load(cls, source_path, mmap=True, audio_cache=None):
+        """
+        Load room saved with `save`, with RIRs as wav files and/or in packed
+        format.
+
+        Parameters
+        ----------
+        source_path : str
+            Room directory.
+        mmap : bool, optional
+            Whether to memory-map packed RIRs.
+        audio_cache : AudioCache, optional
+            Cache of decoded wav files, `default_audio_cache` if not provided.
+        """
 
         metadata_path = os.path.join(source_path, "config.json")
         rir_path = os.path.join(source_path, "rir")
@@ -71,17 +256,24 @@ class Room(object):
         with open(metadata_path) as json_file:
             metadata = json.load(json_file)
 
-        # load responses
-        mic_responses = get_subdirectories(rir_path)
-        responses = []
-        for _mic in mic_responses:
-            rir_files = glob.glob(os.path.join(rir_path, _mic, "*.wav"))
-            responses.append(rir_files)
+        # load responses, ordered by mic and speaker index
+        responses = None
+        if os.path.isdir(rir_path):
+            mic_responses = _numeric_sort(get_subdirectories(rir_path))
+            responses = []
+            for _mic in mic_responses:
+                rir_files = glob.glob(os.path.join(rir_path, _mic, "*.wav"))
+                responses.append(_numeric_sort(rir_files))
+
+        # load packed responses if available
+        rir_store = None
+        if PackedRIRStore.exists(source_path):
+            rir_store = PackedRIRStore(source_path, mmap=mmap)
 
         # load background if available
         background_noise_path = os.path.join(source_path, "background_noise")
-        background_files = glob.glob(
-            os.path.join(background_noise_path, "*.wav")
+        background_files = _numeric_sort(
+            glob.glob(os.path.join(background_noise_path, "*.wav"))
         )
 
         return cls(
@@ -91,6 +283,8 @@ class Room(object):
             room_params=metadata["room_params"],
             room_id=metadata["id"],
             background_noise=background_files,
+            rir_store=rir_store,
+            audio_cache=audio_cache,
         )
 
 
@@ -0,0 +1,256 @@
+import numpy as np
+
+from materials import materials_absorption_table
+from utils import positions_inside
+from numpy_ism import WALLS
+
+"""
+Randomized shoebox rooms for domain randomization, e.g. to simulate many
+more rooms than the measured ones in `room_materials_registry`.
+
+Room dimensions, reverberation (RT60 or one material per wall) and mic /
+source positions are drawn for a whole batch of rooms at once. Positions
+are kept a minimum distance away from the walls and sources a minimum
+distance away from mics by rejection sampling: all sources violating a
+constraint are redrawn together, with vectorized checks, until every room
+of the batch is valid.
+
+Example usage:
+```
+sampler = RoomSampler(n_sources=2, seed=0, software="numpy", ism_order=10)
+for spec in sampler.specs(n_rooms=1000):
+    rirs, sample_rate = compute_room_irs(**spec)
+```
+"""
+
+# materials that can be drawn by default, i.e. all but anechoic walls
+MATERIALS = sorted(
+    _material
+    for _material in materials_absorption_table
+    if _material != "anechoic"
+)
+
+# number of rejection rounds after which all positions of a room are redrawn
+REDRAW_PERIOD = 10
+
+
+class RoomSampler(object):
+    def __init__(
+        self,
+        dim_range=((3.0, 10.0), (3.0, 10.0), (2.5, 4.0)),
+        rt60_range=(0.2, 1.0),
+        materials=None,
+        n_mics=1,
+        n_sources=1,
+        min_wall_distance=0.5,
+        min_source_mic_distance=1.0,
+        seed=None,
+        max_iter=100,
+        **sim_param
+    ):
+        """
+        Parameters
+        ----------
+        dim_range : list of tuples, optional
+            Range of (width, length, height) in meters, as one (min, max)
+            tuple per axis.
+        rt60_range : tuple, optional
+            Range of RT60 in seconds, used if `materials` is not provided.
+        materials : list or dict, optional
+            Materials of `materials_absorption_table` to draw for every wall,
+            or one list per wall of `WallRegistry`. Use `MATERIALS` for all
+            materials. If not provided, an RT60 is drawn instead.
+        n_mics : int, optional
+            Number of mics per room.
+        n_sources : int, optional
+            Number of sources per room.
+        min_wall_distance : float, optional
+            Minimum distance between mics / sources and walls in meters.
+        min_source_mic_distance : float, optional
+            Minimum distance between every source and mic in meters.
+        seed : int, optional
+            Seed of random generator.
+        max_iter : int, optional
+            Maximum number of rejection rounds per batch.
+        sim_param : kwargs
+            Other arguments of `compute_room_irs` added to every spec, e.g.
+            `software` or `ism_order`.
+        """
+        self.dim_range = np.array(dim_range, dtype=float)
+        assert self.dim_range.shape == (3, 2)
+        if np.any(self.dim_range[:, 0] <= 2 * min_wall_distance):
+            raise ValueError(
+                "Rooms must be larger than twice the minimum wall distance."
+            )
+        self.rt60_range = rt60_range
+
+        if isinstance(materials, dict):
+            self.materials = {wall: list(materials[wall]) for wall in WALLS}
+        elif materials is not None:
+            self.materials = {wall: list(materials) for wall in WALLS}
+        else:
+            self.materials = None
+        if self.materials is not None:
+            for wall in WALLS:
+                for _material in self.materials[wall]:
+                    if _material not in materials_absorption_table:
+                        raise ValueError(
+                            "Unknown material : {}".format(_material)
+                        )
+
+        self.n_mics = n_mics
+        self.n_sources = n_sources
+        self.min_wall_distance = min_wall_distance
+        self.min_source_mic_distance = min_source_mic_distance
+        self.max_iter = max_iter
+        self.sim_param = sim_param
+        self.rng = np.random.RandomState(seed)
+
+    def _sample_positions(self, room_dim, n_positions):
+        """
+        Uniform positions of shape (n_rooms, n_positions, 3) inside rooms
+        shrunk by the minimum wall distance.
+        """
+        return self.min_wall_distance + self.rng.rand(
+            len(room_dim), n_positions, 3
+        ) * (room_dim[:, np.newaxis] - 2 * self.min_wall_distance)
+
+    def invalid_sources(self, room_dim, mic_pos, source_pos):
+        """
+        Whether each source violates a constraint, i.e. is too close to a
+        wall or to a mic, or if a mic of its room is too close to a wall.
+
+        Parameters
+        ----------
+        room_dim : array
+            Room dimensions of shape (n_rooms, 3).
+        mic_pos : array
+            Mic positions of shape (n_rooms, n_mics, 3).
+        source_pos : array
+            Source positions of shape (n_rooms, n_sources, 3).
+
+        Returns
+        -------
+        array
+            Boolean array of shape (n_rooms, n_sources).
+        """
+        room_dim = room_dim[:, np.newaxis]
+        mics_inside = np.all(
+            positions_inside(
+                mic_pos, room_dim, min_distance=self.min_wall_distance
+            ),
+            axis=1,
+        )
+        sources_inside = positions_inside(
+            source_pos, room_dim, min_distance=self.min_wall_distance
+        )
+        dist = np.linalg.norm(
+            source_pos[:, :, np.newaxis] - mic_pos[:, np.newaxis], axis=-1
+        )
+        return (
+            ~mics_inside[:, np.newaxis]
+            | ~sources_inside
+            | np.any(dist < self.min_source_mic_distance, axis=-1)
+        )
+
+    def sample(self, n_rooms):
+        """
+        Draw a batch of rooms.
+
+        Returns
+        -------
+        dict
+            `room_dim` of shape (n_rooms, 3), `mic_pos` of shape
+            (n_rooms, n_mics, 3), `source_pos` of shape
+            (n_rooms, n_sources, 3), and either `rt60` of shape (n_rooms,) or
+            `materials`, a list with one dict of wall materials per room.
+        """
+        low, high = self.dim_range[:, 0], self.dim_range[:, 1]
+        room_dim = low + self.rng.rand(n_rooms, 3) * (high - low)
+
+        mic_pos = self._sample_positions(room_dim, self.n_mics)
+        source_pos = self._sample_positions(room_dim, self.n_sources)
+
+        # redraw sources that are too close to a mic, only checking rooms
+        # that still have invalid sources, and periodically redraw all
+        # positions of these rooms in case their mics leave no valid space
+        rooms = np.arange(n_rooms)
+        for n_iter in range(self.max_iter + 1):
+            invalid = self.invalid_sources(
+                room_dim[rooms], mic_pos[rooms], source_pos[rooms]
+            )
+            keep = np.any(invalid, axis=1)
+            rooms, invalid = rooms[keep], invalid[keep]
+            if len(rooms) == 0:
+                break
+            if (n_iter + 1) % REDRAW_PERIOD == 0:
+                mic_pos[rooms] = self._sample_positions(
+                    room_dim[rooms], self.n_mics
+                )
+                invalid[:] = True
+            room_idx, source_idx = np.nonzero(invalid)
+            source_pos[rooms[room_idx], source_idx] = self._sample_positions(
+                room_dim[rooms[room_idx]], 1
+            )[:, 0]
+        else:
+            raise RuntimeError(
+                "Could not place sources in {} room(s) after {} "
+                "iterations, consider relaxing the distance "
+                "constraints.".format(len(rooms), self.max_iter)
+            )
+
+        batch = {
+            "room_dim": room_dim,
+            "mic_pos": mic_pos,
+            "source_pos": source_pos,
+        }
+        if self.materials is None:
+            batch["rt60"] = self.rng.uniform(
+                self.rt60_range[0], self.rt60_range[1], n_rooms
+            )
+        else:
+            choices = {
+                wall: self.rng.randint(0, len(self.materials[wall]), n_rooms)
+                for wall in WALLS
+            }
+            batch["materials"] = [
+                {
+                    wall: self.materials[wall][choices[wall][k]]
+                    for wall in WALLS
+                }
+                for k in range(n_rooms)
+            ]
+        return batch
+
+    def specs(self, n_rooms, batch_size=10000):
+        """
+        Lazily draw rooms in batches and yield arguments of
+        `compute_room_irs`, one spec per room and mic, with all sources of
+        the room. Specs of a room are consecutive, in the order of its mics.
+
+        Parameters
+        ----------
+        n_rooms : int
+            Number of rooms.
+        batch_size : int, optional
+            Number of rooms drawn at once. The same seed and batch size give
+            the same rooms.
+        """
+        for start in range(0, n_rooms, batch_size):
+            batch = self.sample(min(batch_size, n_rooms - start))
+            for k in range(len(batch["room_dim"])):
+                if self.materials is None:
+                    room_properties = float(batch["rt60"][k])
+                else:
+                    room_properties = batch["materials"][k]
+                for mic_pos in batch["mic_pos"][k]:
+                    spec = dict(self.sim_param)
+                    spec.update(
+                        {
+                            "room_dim": batch["room_dim"][k].tolist(),
+                            "mic_pos": mic_pos.tolist(),
+                            "source_pos": batch["source_pos"][k].tolist(),
+                            "room_properties": room_properties,
+                        }
+                    )
+                    yield spec
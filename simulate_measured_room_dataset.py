@@ -1,17 +1,32 @@
 import os
 import json
+import time
 import shutil
 import click
 import argparse
+import zlib
 import soundfile as sf
 from pprint import pprint
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from utils import (
     get_subdirectories,
-    compute_room_irs,
+    compute_multi_mic_room_irs,
+    resolve_ism_order,
+    get_backend,
     RoomSimSoftware,
+    ISM_ENERGY_DB,
 )
 from room import Room, WallRegistry
+from rir_cache import RIRCache
+from profiling import StageProfiler
+from absorption_fit import fit_bundle
+from arrivals import (
+    ARRIVALS_EXT,
+    render_arrivals,
+    select_arrivals,
+    write_arrivals,
+)
 
 """
 Copy a measured room bundle by copying its parameters such as:
@@ -26,12 +41,55 @@ python simulate_measured_room_dataset.py \
 measured_room_dataset_train_BUT_ReverbDB_7rooms_2020_05_07T15_23_53
 ```
 
+Example with the NumPy image source method.
+```
+python simulate_measured_room_dataset.py \
+measured_room_dataset_train_BUT_ReverbDB_7rooms_2020_05_07T15_23_53 \
+--software numpy
+```
+
+Example with the ISM order selected per room from its RT60s, down to an
+energy floor, see `utils.select_ism_order`. The selected order of each RIR is
+written to the `ism_order` entry of the mic metadata of the room.
+```
+python simulate_measured_room_dataset.py \
+measured_room_dataset_train_BUT_ReverbDB_7rooms_2020_05_07T15_23_53 \
+--software numpy --ism auto
+```
+
+Example with early reflections and a statistical late tail instead of ray
+tracing, see `late_tail.py`.
+```
+python simulate_measured_room_dataset.py \
+measured_room_dataset_train_BUT_ReverbDB_7rooms_2020_05_07T15_23_53 \
+--late_tail --freq_dep
+```
+
+Example with the arrivals of the image sources stored next to each RIR, to
+render the bundle at another sample rate with `arrivals.py`. Arrivals are
+only smaller than the wav files for low ISM orders or when pruned, e.g. the
+arrivals of order 17 are about half the size of the wav files once pruned
+20 dB below the strongest arrival of each RIR.
+```
+python simulate_measured_room_dataset.py \
+measured_room_dataset_train_BUT_ReverbDB_7rooms_2020_05_07T15_23_53 \
+--software numpy --arrivals --arrivals_floor_db 20
+```
+
 Example with `pygsound`.
 ```
 python simulate_measured_room_dataset.py \
 measured_room_dataset_dev_BUT_ReverbDB_2rooms_2020_05_07T15_23_53 \
 --software pygsound
 ```
+
+Example with materials of `room_materials_registry` adjusted to match the
+measured RT60s, see `absorption_fit.py`.
+```
+python simulate_measured_room_dataset.py \
+measured_room_dataset_train_BUT_ReverbDB_7rooms_2020_05_07T15_23_53 \
+--fit_absorption
+```
 """
 
 
@@ -113,25 +171,112 @@ room_materials_registry = {
 }
 
 
-def simulate_measured_bundle(
-    original_dataset,
-    air_abs=False,
-    ism_order=17,
-    ray_tracing=False,
-    freq_dep=False,
-    software=RoomSimSoftware.PYROOMACOUSTICS,
+class SimulationJournal(object):
+    """
+    Append-only record of the (room, mic, speaker) units already simulated
+    for a bundle, so that an interrupted simulation can be resumed. The first
+    entry holds the simulation config, resuming with a different config is
+    not allowed. The number of rays of adaptive ray tracing is recorded with
+    each unit.
+    """
+
+    def __init__(self, path, config):
+        self.path = path
+        self.completed = set()
+        self.n_rays = dict()
+        if not os.path.isfile(path):
+            self._append({"config": config})
+            return
+
+        with open(path) as f:
+            content = f.read()
+        for line in content.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # partially written entry from an interrupted run
+                continue
+            if "config" in entry:
+                if entry["config"] != config:
+                    raise ValueError(
+                        "Cannot resume, {} was created with a different "
+                        "config : {}".format(path, entry["config"])
+                    )
+            else:
+                n_rays = entry.get("n_rays", [None] * len(entry["speakers"]))
+                for n, _n_rays in zip(entry["speakers"], n_rays):
+                    self.completed.add((entry["room"], entry["mic"], n))
+                    if _n_rays is not None:
+                        self.n_rays[(entry["room"], entry["mic"], n)] = _n_rays
+        if len(content) > 0 and not content.endswith("\n"):
+            with open(path, "a") as f:
+                f.write("\n")
+
+    def is_done(self, room_id, mic, speaker):
+        return (room_id, mic, speaker) in self.completed
+
+    def record(self, room_id, mic_idx, speaker_idx, n_rays=None):
+        for m in mic_idx:
+            entry = {"room": room_id, "mic": m, "speakers": list(speaker_idx)}
+            if n_rays is not None:
+                entry["n_rays"] = list(n_rays)
+            self._append(entry)
+            for k, n in enumerate(speaker_idx):
+                self.completed.add((room_id, m, n))
+                if n_rays is not None:
+                    self.n_rays[(room_id, m, n)] = n_rays[k]
+
+    def _append(self, entry):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def simulation_options(
+    software,
+    air_abs,
+    ism_order,
+    ray_tracing,
+    freq_dep,
+    late_tail=False,
+    n_rays=None,
+    arrivals=False,
 ):
-    if software == RoomSimSoftware.PYGSOUND:
+    """
+    Restrict simulation options to what `software` supports and set its
+    ray tracing parameters. `n_rays` is the number of rays of
+    `pyroomacoustics`, "auto" for adaptive ray tracing, default is 1e5.
+
+    Return a dict with `air_abs`, `ism_order`, `ray_tracing`, `freq_dep`,
+    `late_tail`, `arrivals` and `ray_tracing_param`.
+    """
+    backend = get_backend(software)
+    if not backend.ism_order:
         ism_order = None
+        late_tail = False
+    if backend.arrivals is None or late_tail:
+        arrivals = False
+    if arrivals:
+        # arrivals of the image sources only
+        ray_tracing = False
+    if late_tail:
+        # statistical tail instead of ray tracing
+        ray_tracing = False
+    if not backend.air_absorption:
         air_abs = False
+    if not backend.freq_dep:
         freq_dep = False
+    if backend.ray_tracing_only:
         ray_tracing = True
+    elif not backend.ray_tracing:
+        ray_tracing = False
 
     ray_tracing_param = None
     if ray_tracing:
         if software == RoomSimSoftware.PYROOMACOUSTICS:
             ray_tracing_param = {
-                "n_rays": int(1e5),
+                "n_rays": int(1e5) if n_rays is None else n_rays,
                 "receiver_radius": 0.5,
                 "time_thres": 10.0,
                 # "energy_thres": 1e-7,
@@ -145,6 +290,274 @@ def simulate_measured_bundle(
                 "mic_radius": 0.01,
             }
 
+    return {
+        "air_abs": air_abs,
+        "ism_order": ism_order,
+        "ray_tracing": ray_tracing,
+        "freq_dep": freq_dep,
+        "late_tail": late_tail,
+        "arrivals": arrivals,
+        "ray_tracing_param": ray_tracing_param,
+    }
+
+
+def job_seed(seed, room_id, mic_idx):
+    """
+    Seed of the simulation of a mic of a room, derived from its room ID
+    rather than the position of the room in the bundle so that it doesn't
+    depend on the listing order of the filesystem or on the other rooms.
+    """
+    return [seed, zlib.crc32(room_id.encode()), mic_idx]
+
+
+def int_or_auto(value):
+    """Argument of the command line that is an int or "auto"."""
+    if value == "auto":
+        return value
+    return int(value)
+
+
+def measured_room_param(room_params):
+    """
+    Simulation parameters derived from the metadata of a measured room:
+    dimensions, temperature and scattering.
+    """
+    # use furniture coverage as proxy for average scattering
+    scattering = room_params.get("furniture_coverage", 0.5)
+    scattering = max(scattering, 0.1)
+    return {
+        "room_dim": room_params["dimensions"],
+        "temperature": room_params.get("temperature"),
+        "scattering": scattering,
+    }
+
+
+def group_mics(room_id, mic_metadata, freq_dep=False, materials=None):
+    """
+    Group the mics of a measured room that share the same room properties,
+    so that each group can be simulated in a single room.
+
+    Return a list of `(room_properties, mic_idx)`. Mics with one RT60
+    estimate per speaker form a single group, whose room properties are a
+    list with the list of RT60s of each mic.
+
+    Parameters
+    ----------
+    room_id : str
+        Room ID, to look up materials in `room_materials_registry`.
+    mic_metadata : list of dict
+        Mic metadata of the room.
+    freq_dep : bool, optional
+        Whether to use frequency-dependent materials rather than RT60
+        estimates.
+    materials : dict, optional
+        Materials to use instead of those of `room_materials_registry` when
+        `freq_dep` is set, e.g. fitted with `absorption_fit.py`.
+    """
+    wall_materials = materials
+    shared_properties = dict()
+    per_pair_rt60 = []
+    for m, _mic in enumerate(mic_metadata):
+
+        # estimate from impulse
+        if freq_dep and wall_materials is not None:
+            materials = wall_materials
+        elif freq_dep:
+            materials = room_materials_registry[room_id]
+        else:
+            materials = _mic["t60_estimate"]
+
+        if isinstance(materials, list):
+            # unique RT60 per mic-speaker pair
+            per_pair_rt60.append(m)
+        else:
+            key = json.dumps(materials, sort_keys=True)
+            if key not in shared_properties:
+                shared_properties[key] = (materials, [])
+            shared_properties[key][1].append(m)
+
+    groups = list(shared_properties.values())
+    if len(per_pair_rt60) > 0:
+        groups.append(
+            (
+                [mic_metadata[m]["t60_estimate"] for m in per_pair_rt60],
+                per_pair_rt60,
+            )
+        )
+    return groups
+
+
+def _write_wav(path, data, sample_rate):
+    """Write wav file atomically, i.e. never leave a partial file."""
+    tmp_path = path + ".tmp"
+    sf.write(tmp_path, data, sample_rate, format="WAV")
+    os.replace(tmp_path, path)
+
+
+def _init_worker(software):
+    """Load simulation backend once per worker process."""
+    get_backend(software).load()
+
+
+def _simulate_mics(
+    room_id,
+    mic_idx,
+    mic_pos,
+    speaker_idx,
+    speaker_pos,
+    room_properties,
+    rir_dir,
+    sim_param,
+    profile=False,
+):
+    """
+    Simulate and write the RIRs between a group of mics and speakers from the
+    same room that share the same room properties.
+
+    Return the indices of the simulated RIRs, the number of rays of each
+    speaker with adaptive ray tracing (None otherwise or if RIRs are read from
+    the cache), and the records of a `StageProfiler` if `profile` is set
+    (empty otherwise) so that they can be collected from worker processes.
+
+    If `sim_param["arrivals"]` is set, the arrivals of the image sources are
+    also written next to each RIR, see `arrivals.py`, without those below
+    `sim_param["arrivals_floor_db"]` if set. RIRs are then rendered from the
+    stored arrivals.
+    """
+    sim_param = dict(sim_param)
+    store_arrivals = sim_param.pop("arrivals", False)
+    arrivals_floor_db = sim_param.pop("arrivals_floor_db", None)
+    ray_tracing_param = sim_param.get("ray_tracing_param") or dict()
+    adaptive_rays = ray_tracing_param.get("n_rays") == "auto"
+    profiler = StageProfiler() if profile or adaptive_rays else None
+    try:
+        if store_arrivals:
+            arrivals = compute_multi_mic_room_irs(
+                room_properties=room_properties,
+                mic_pos=mic_pos,
+                source_pos=speaker_pos,
+                profiler=profiler,
+                arrivals=True,
+                arrivals_floor_db=arrivals_floor_db,
+                **sim_param,
+            )
+            sample_rate = sim_param.get("sample_rate", 16000)
+            start_time = time.perf_counter()
+            resp = render_arrivals(arrivals, sample_rate)
+            if profile:
+                profiler.add(
+                    "render_arrivals",
+                    time.perf_counter() - start_time,
+                    n_arrivals=len(arrivals["delays"]),
+                )
+        else:
+            resp, sample_rate = compute_multi_mic_room_irs(
+                room_properties=room_properties,
+                mic_pos=mic_pos,
+                source_pos=speaker_pos,
+                profiler=profiler,
+                **sim_param,
+            )
+    except Exception as e:
+        raise RuntimeError(
+            "Simulation failed for room {}, mic(s) {} : {}".format(
+                room_id, mic_idx, e
+            )
+        ) from e
+
+    # rays traced per room, i.e. for all speakers or one room per speaker
+    # with one RT60 per speaker (jobs with ray tracing have a single mic)
+    n_rays = None
+    if adaptive_rays:
+        counts = [
+            _record["n_rays"]
+            for _record in profiler.records
+            if _record["stage"] == "ray_tracing"
+        ]
+        if len(counts) == 1:
+            n_rays = counts * len(speaker_idx)
+        elif len(counts) == len(speaker_idx):
+            n_rays = counts
+
+    # write RIRs
+    start_time = time.perf_counter()
+    for i, (m, mic_responses) in enumerate(zip(mic_idx, resp)):
+        mic_subdir = os.path.join(rir_dir, "mic{}".format(m))
+        os.makedirs(mic_subdir, exist_ok=True)
+        for k, (n, _rir) in enumerate(zip(speaker_idx, mic_responses)):
+            _write_wav(
+                os.path.join(mic_subdir, "{}.wav".format(n)),
+                _rir,
+                sample_rate,
+            )
+            if store_arrivals:
+                write_arrivals(
+                    os.path.join(mic_subdir, str(n) + ARRIVALS_EXT),
+                    select_arrivals(
+                        arrivals,
+                        mic_idx=[i],
+                        speaker_idx=[k],
+                    ),
+                )
+    if not profile:
+        return room_id, mic_idx, speaker_idx, n_rays, []
+    profiler.add(
+        "write_wav",
+        time.perf_counter() - start_time,
+        n_files=len(mic_idx) * len(speaker_idx),
+    )
+    return room_id, mic_idx, speaker_idx, n_rays, profiler.records
+
+
+def simulate_measured_bundle(
+    original_dataset,
+    air_abs=False,
+    ism_order=17,
+    ray_tracing=False,
+    freq_dep=False,
+    software=RoomSimSoftware.PYROOMACOUSTICS,
+    cache_dir=None,
+    cache_size=10.0,
+    workers=1,
+    seed=None,
+    resume=False,
+    profile=None,
+    fit_absorption=False,
+    ism_energy_db=ISM_ENERGY_DB,
+    late_tail=False,
+    n_rays=None,
+    arrivals=False,
+    arrivals_floor_db=None,
+):
+    if fit_absorption:
+        freq_dep = True
+    options = simulation_options(
+        software=software,
+        air_abs=air_abs,
+        ism_order=ism_order,
+        ray_tracing=ray_tracing,
+        freq_dep=freq_dep,
+        late_tail=late_tail,
+        n_rays=n_rays,
+        arrivals=arrivals,
+    )
+    air_abs = options["air_abs"]
+    ism_order = options["ism_order"]
+    ray_tracing = options["ray_tracing"]
+    freq_dep = options["freq_dep"]
+    late_tail = options["late_tail"]
+    arrivals = options["arrivals"]
+    ray_tracing_param = options["ray_tracing_param"]
+    adaptive_rays = (
+        ray_tracing_param is not None
+        and ray_tracing_param.get("n_rays") == "auto"
+    )
+
+    # on-disk cache of simulated RIRs, shared across runs
+    cache = None
+    if cache_dir is not None:
+        cache = RIRCache(cache_dir, max_size=int(cache_size * 1e9))
+
     # load dataset
     with open(
         os.path.join(original_dataset, "dataset_metadata.json")
@@ -156,33 +569,97 @@ def simulate_measured_bundle(
     timestamp = metadata["timestamp"]
 
     # create output dir
-    if ray_tracing and ism_order is not None and ism_order >= 0:
+    if (
+        ray_tracing
+        and ism_order is not None
+        and (ism_order == "auto" or ism_order >= 0)
+    ):
         sim_type = f"hyb{ism_order}"
     elif ray_tracing:
         sim_type = f"srt"
+    elif late_tail:
+        sim_type = "tail" if ism_order is None else f"tail{ism_order}"
     else:
         sim_type = f"ism{ism_order}"
+    if adaptive_rays:
+        sim_type += "_adaptive"
     if air_abs:
         sim_type += "_air_abs"
-    if freq_dep:
+    if fit_absorption:
+        sim_type += "_fit"
+    elif freq_dep:
         sim_type += "_freq_dep"
     dataset_id = (
         f"measured_room_dataset_SIM_{software}_{sim_type}"
         f"_{dataset_type}_{n_rooms}rooms_{timestamp}"
     )
-    if os.path.isdir(dataset_id):
-        click.confirm(
-            "\n{} exists. Delete and replace?".format(dataset_id),
-            default=True,
-            abort=True,
-        )
-        shutil.rmtree(dataset_id)
-    os.mkdir(dataset_id)
     data_index_file = "data_index.json"
     data_folder = "data"
     data_path = os.path.join(dataset_id, data_folder)
+    journal_path = os.path.join(dataset_id, "simulation_journal.jsonl")
+    if os.path.isdir(dataset_id):
+        if not resume:
+            click.confirm(
+                "\n{} exists. Delete and replace?".format(dataset_id),
+                default=True,
+                abort=True,
+            )
+            shutil.rmtree(dataset_id)
+        elif not os.path.isfile(journal_path) and os.path.isfile(
+            os.path.join(dataset_id, "dataset_metadata.json")
+        ):
+            print("{} is already complete.".format(dataset_id))
+            return
     print("New dataset ID : {}".format(dataset_id))
-    os.mkdir(data_path)
+    os.makedirs(data_path, exist_ok=True)
+
+    # record simulated units to be able to resume
+    journal_config = {
+        "original_dataset": os.path.basename(
+            os.path.normpath(original_dataset)
+        ),
+        "air_abs": air_abs,
+        "ism_order": ism_order,
+        "ray_tracing": ray_tracing,
+        "freq_dep": freq_dep,
+        "fit_absorption": fit_absorption,
+        "software": software,
+        "seed": seed,
+    }
+    if ism_order == "auto":
+        journal_config["ism_energy_db"] = ism_energy_db
+    if late_tail:
+        journal_config["late_tail"] = late_tail
+    if arrivals:
+        journal_config["arrivals"] = arrivals
+        if arrivals_floor_db is not None:
+            journal_config["arrivals_floor_db"] = arrivals_floor_db
+    if ray_tracing_param is not None and n_rays is not None:
+        journal_config["n_rays"] = ray_tracing_param.get("n_rays")
+    journal = SimulationJournal(journal_path, config=journal_config)
+    if len(journal.completed) > 0:
+        print("Resuming, {} RIRs done.".format(len(journal.completed)))
+
+    # per-wall, per-band absorption fitted to measured RT60s, cached with
+    # each room of the original dataset
+    fitted_materials = dict()
+    if fit_absorption and freq_dep:
+        fitted_materials = fit_bundle(
+            original_dataset, prior_materials=room_materials_registry
+        )
+
+    # stage timings of all jobs, written to `profile` at the end
+    profiler = StageProfiler() if profile is not None else None
+
+    # (room, mic) jobs are spread over a process pool if more than one worker
+    executor = None
+    if workers > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(software,),
+        )
+    futures = []
 
     # loop through rooms
     original_data_folder = os.path.join(original_dataset, data_folder)
@@ -195,12 +672,6 @@ def simulate_measured_bundle(
 
         # get room params
         room_params = room.params
-        dimensions = room_params["dimensions"]
-        temperature = room_params.get("temperature")
-
-        # use furniture coverage as proxy for average scattering
-        scattering = room_params.get("furniture_coverage", 0.5)
-        scattering = max(scattering, 0.1)
 
         # get mic and speaker metadata, loop over
         speaker_metadata = room.speaker_metadata
@@ -218,9 +689,8 @@ def simulate_measured_bundle(
 
         # create new room dir
         room_subdir = os.path.join(data_path, room.id)
-        os.mkdir(room_subdir)
         rir_dir = os.path.join(room_subdir, "rir")
-        os.mkdir(rir_dir)
+        os.makedirs(rir_dir, exist_ok=True)
         shutil.copy(
             os.path.join(original_room_subdir, "config.json"),
             os.path.join(room_subdir, "config.json"),
@@ -228,63 +698,158 @@ def simulate_measured_bundle(
         shutil.copytree(
             os.path.join(original_room_subdir, "background_noise"),
             os.path.join(room_subdir, "background_noise"),
+            dirs_exist_ok=True,
         )
 
-        for m, _mic in enumerate(mic_metadata):
-            mic_subdir = os.path.join(rir_dir, "mic{}".format(m))
-            os.mkdir(mic_subdir)
+        sim_param = measured_room_param(room_params)
+        sim_param.update(
+            {
+                "ism_order": ism_order,
+                "ism_energy_db": ism_energy_db,
+                "late_tail": late_tail,
+                "arrivals": arrivals,
+                "arrivals_floor_db": arrivals_floor_db,
+                "ray_tracing_param": ray_tracing_param,
+                "ray_tracing": ray_tracing,
+                "air_absorption": air_abs,
+                "software": software,
+                "cache": cache,
+            }
+        )
 
-            mic_pos = _mic["mic_location"]
-            print("    mic pos : {}".format(mic_pos))
+        # compute RIRs, mics sharing the same room properties are simulated
+        # together in a single room
+        for _mic in mic_metadata:
+            print("    mic pos : {}".format(_mic["mic_location"]))
+        groups = group_mics(
+            _id,
+            mic_metadata,
+            freq_dep=freq_dep,
+            materials=fitted_materials.get(room.id),
+        )
 
-            # estimate from impulse
-            if freq_dep:
-                materials = room_materials_registry[_id]
-            else:
-                materials = _mic["t60_estimate"]
-
-            if isinstance(materials, list):
-                # unique RT60 per mic-speaker pair
-                mic_responses = []
-                for spk_idx, rt60 in enumerate(materials):
-                    resp, sample_rate = compute_room_irs(
-                        room_dim=dimensions,
-                        room_properties=rt60,
-                        mic_pos=mic_pos,
-                        source_pos=[speaker_pos[spk_idx]],
-                        ism_order=ism_order,
-                        ray_tracing_param=ray_tracing_param,
-                        ray_tracing=ray_tracing,
-                        air_absorption=air_abs,
-                        temperature=temperature,
-                        scattering=scattering,
-                        software=software,
+        # report the selected ISM order of each RIR in the mic metadata
+        if ism_order == "auto":
+            config_path = os.path.join(room_subdir, "config.json")
+            with open(config_path) as f:
+                config = json.load(f)
+            for materials, mic_idx in groups:
+                orders = resolve_ism_order(
+                    room_dim=sim_param["room_dim"],
+                    room_properties=materials,
+                    n_mics=len(mic_idx),
+                    n_sources=len(speaker_pos),
+                    energy_db=ism_energy_db,
+                )
+                for i, m in enumerate(mic_idx):
+                    config["mic_metadata"][m]["ism_order"] = (
+                        orders[i]
+                        if isinstance(orders, list)
+                        else [orders] * len(speaker_pos)
                     )
-                    mic_responses += resp
-            else:
+            with open(config_path, "w") as f:
+                json.dump(config, f, indent=4, sort_keys=True)
 
-                # compute RIR(s)
-                mic_responses, sample_rate = compute_room_irs(
-                    room_dim=dimensions,
-                    room_properties=materials,
-                    mic_pos=mic_pos,
-                    source_pos=speaker_pos,
-                    ism_order=ism_order,
-                    ray_tracing_param=ray_tracing_param,
-                    ray_tracing=ray_tracing,
-                    air_absorption=air_abs,
-                    temperature=temperature,
-                    scattering=scattering,
-                    software=software,
+        # one job per mic when running in parallel, and also for ray tracing
+        # and late tails so that (seeded) results don't depend on the number
+        # of workers, skipping RIRs that are already done
+        jobs = []
+        for materials, mic_idx in groups:
+            pending = dict()
+            for m in mic_idx:
+                speaker_idx = tuple(
+                    n
+                    for n in range(len(speaker_pos))
+                    if not journal.is_done(room.id, m, n)
+                )
+                if len(speaker_idx) > 0:
+                    pending.setdefault(speaker_idx, []).append(m)
+
+            for speaker_idx, _mics in pending.items():
+                if executor is not None or ray_tracing or late_tail:
+                    job_mics = [[m] for m in _mics]
+                else:
+                    job_mics = [_mics]
+                for _job_mics in job_mics:
+                    if isinstance(materials, list):
+                        # unique RT60 per mic-speaker pair
+                        rt60 = dict(zip(mic_idx, materials))
+                        props = [
+                            [rt60[m][n] for n in speaker_idx]
+                            for m in _job_mics
+                        ]
+                    else:
+                        props = materials
+                    jobs.append((props, _job_mics, list(speaker_idx)))
+
+        for materials, mic_idx, speaker_idx in jobs:
+            job_param = dict(sim_param)
+            if seed is not None:
+                job_param["seed"] = job_seed(seed, room.id, mic_idx[0])
+            job = {
+                "room_id": room.id,
+                "mic_idx": mic_idx,
+                "mic_pos": [mic_metadata[m]["mic_location"] for m in mic_idx],
+                "speaker_idx": speaker_idx,
+                "speaker_pos": [speaker_pos[n] for n in speaker_idx],
+                "room_properties": materials,
+                "rir_dir": rir_dir,
+                "sim_param": job_param,
+                "profile": profiler is not None,
+            }
+            if executor is None:
+                room_id, mic_idx, speaker_idx, n_rays, records = (
+                    _simulate_mics(**job)
                 )
+                journal.record(room_id, mic_idx, speaker_idx, n_rays=n_rays)
+                if profiler is not None:
+                    profiler.merge(records)
+            else:
+                futures.append(executor.submit(_simulate_mics, **job))
 
-            # write RIRs
-            for n, _rir in enumerate(mic_responses):
-                sf.write(
-                    os.path.join(mic_subdir, "{}.wav".format(n)),
-                    mic_responses[n],
-                    sample_rate,
+    # wait for parallel jobs, on failure pending jobs are cancelled but those
+    # that complete are still recorded
+    if executor is not None:
+        error = None
+        for n, future in enumerate(as_completed(futures)):
+            if future.cancelled():
+                continue
+            try:
+                room_id, mic_idx, speaker_idx, n_rays, records = (
+                    future.result()
+                )
+            except Exception as e:
+                if error is None:
+                    error = e
+                    for _future in futures:
+                        _future.cancel()
+                continue
+            journal.record(room_id, mic_idx, speaker_idx, n_rays=n_rays)
+            if profiler is not None:
+                profiler.merge(records)
+            print(
+                "job {} / {} done : room {}, mic(s) {}".format(
+                    n + 1, len(futures), room_id, mic_idx
                 )
+            )
+        executor.shutdown()
+        if error is not None:
+            raise error
+
+    # report the number of rays of adaptive ray tracing of each RIR in the
+    # mic metadata
+    if adaptive_rays:
+        for _id in get_subdirectories(data_path):
+            config_path = os.path.join(data_path, _id, "config.json")
+            with open(config_path) as f:
+                config = json.load(f)
+            for m, _mic in enumerate(config["mic_metadata"]):
+                _mic["n_rays"] = [
+                    journal.n_rays.get((_id, m, n))
+                    for n in range(len(config["speaker_metadata"]))
+                ]
+            with open(config_path, "w") as f:
+                json.dump(config, f, indent=4, sort_keys=True)
 
     # write bundle metadata
     dataset_metadata = metadata.copy()
@@ -300,6 +865,15 @@ def simulate_measured_bundle(
         dst=os.path.join(dataset_id, data_index_file),
     )
 
+    # bundle is complete
+    os.remove(journal_path)
+
+    if profiler is not None:
+        print("\nSimulation stages : ")
+        pprint(profiler.summary())
+        profiler.to_json(profile, include_records=True)
+        print("Profile written to {}".format(profile))
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(
@@ -319,9 +893,39 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--ism",
-        type=int,
-        default=17,
-        help="Image source method order, i.e. max number of wall reflections.",
+        type=int_or_auto,
+        default=None,
+        help="Image source method order, i.e. max number of wall reflections, "
+        "or `auto` to select it per room from its RT60s. Default is 17, or "
+        "the order of the early reflections with `--late_tail`.",
+    )
+    parser.add_argument(
+        "--ism_energy_db",
+        type=float,
+        default=ISM_ENERGY_DB,
+        help="Energy floor in dB below the full decay of `--ism auto`, "
+        "default is 60 dB, i.e. the range of the RT60. Lower floors select "
+        "lower orders but cut the decay short.",
+    )
+    parser.add_argument(
+        "--late_tail",
+        action="store_true",
+        help="Whether to synthesize the late reverberation from the RT60s or "
+        "materials instead of ray tracing, see `late_tail.py`.",
+    )
+    parser.add_argument(
+        "--arrivals",
+        action="store_true",
+        help="Whether to also store the arrivals of the image sources of "
+        "each RIR, to render it at another sample rate, see `arrivals.py`.",
+    )
+    parser.add_argument(
+        "--arrivals_floor_db",
+        type=float,
+        default=None,
+        help="Drop stored arrivals more than this many dB below the strongest "
+        "arrival of their RIR in every band, e.g. 20, to shrink `--arrivals`. "
+        "RIRs are rendered from the remaining arrivals.",
     )
     parser.add_argument(
         "--rt",
@@ -339,7 +943,57 @@ if __name__ == "__main__":
         default=RoomSimSoftware.PYROOMACOUSTICS,
         help="Simulation software to use.",
     )
+    parser.add_argument(
+        "--cache_dir",
+        type=str,
+        default=None,
+        help="Directory of on-disk RIR cache, disabled if not provided.",
+    )
+    parser.add_argument(
+        "--cache_size",
+        type=float,
+        default=10.0,
+        help="Maximum size of RIR cache in GB.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes to simulate (room, mic) jobs in parallel.",
+    )
+    parser.add_argument(
+        "--n_rays",
+        type=int_or_auto,
+        default=None,
+        help="Number of rays of `pyroomacoustics` ray tracing (default is "
+        "1e5), or `auto` to trace rays until the energy decay converges.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for ray tracing and late tails, set per (room, mic) job.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Resume an interrupted simulation instead of restarting it.",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="JSON file to write the duration of each simulation stage to.",
+    )
+    parser.add_argument(
+        "--fit_absorption",
+        action="store_true",
+        help="Use per-wall, per-band absorption fitted to the measured RT60s "
+        "(implies `--freq_dep`), see `absorption_fit.py`.",
+    )
     args = parser.parse_args()
+    if args.ism is None and not args.late_tail:
+        args.ism = 17
     simulate_measured_bundle(
         original_dataset=args.dataset,
         air_abs=args.air_abs,
@@ -347,4 +1001,16 @@ if __name__ == "__main__":
         ray_tracing=args.rt,
         freq_dep=args.freq_dep,
         software=args.software,
+        cache_dir=args.cache_dir,
+        cache_size=args.cache_size,
+        workers=args.workers,
+        seed=args.seed,
+        resume=args.resume,
+        profile=args.profile,
+        fit_absorption=args.fit_absorption,
+        ism_energy_db=args.ism_energy_db,
+        late_tail=args.late_tail,
+        n_rays=args.n_rays,
+        arrivals=args.arrivals,
+        arrivals_floor_db=args.arrivals_floor_db,
     )
@@ -0,0 +1,40 @@
+import pytest
+
+from analysis import decay_time, schroeder_edc
+from utils import compute_room_irs, resolve_ism_order
+
+"""
+The "auto" ISM order should not cut the decay of the RIRs short, i.e. their
+T30 should match that of RIRs simulated with a much higher order.
+"""
+
+
+ROOM_DIM = [5, 4, 3]
+MIC_POS = [1.3, 1.1, 1.4]
+SOURCE_POS = [[3.6, 2.7, 1.7]]
+SAMPLE_RATE = 16000
+
+# order at which the T30 of the rooms below has converged
+REFERENCE_ORDER = 80
+
+
+def _t30(rt60, ism_order):
+    rirs, sample_rate = compute_room_irs(
+        room_dim=ROOM_DIM,
+        mic_pos=MIC_POS,
+        source_pos=SOURCE_POS,
+        room_properties=rt60,
+        sample_rate=SAMPLE_RATE,
+        ism_order=ism_order,
+        software="numpy",
+    )
+    return float(decay_time(schroeder_edc(rirs[0]), sample_rate))
+
+
+@pytest.mark.parametrize("rt60", [0.2, 0.3])
+def test_auto_ism_order_keeps_t30(rt60):
+    order = resolve_ism_order(ROOM_DIM, rt60)
+    assert order < REFERENCE_ORDER
+    t30 = _t30(rt60, "auto")
+    reference = _t30(rt60, REFERENCE_ORDER)
+    assert t30 == pytest.approx(reference, rel=0.05)
@@ -1,14 +1,103 @@
 import os
+import importlib
 import numpy as np
-import pyroomacoustics as pra
-import pygsound as ps
+from collections import OrderedDict
 
-from materials import materials_absorption_table
+from materials import CENTER_FREQS, compile_materials, material_absorption
+from rir_cache import make_cache_key
+from profiling import null_profiler
 
 
 class RoomSimSoftware(object):
     PYROOMACOUSTICS = "pyroomacoustics"
     PYGSOUND = "pygsound"
+    NUMPY = "numpy"
+
+
+class SimulationBackend(object):
+    def __init__(
+        self,
+        name,
+        module,
+        simulate,
+        air_absorption=False,
+        ism_order=False,
+        freq_dep=False,
+        ray_tracing=False,
+        ray_tracing_only=False,
+        per_pair_rt60=False,
+        direct_gain=1.0,
+        arrivals=None,
+    ):
+        """
+        Room simulation software, whose module is only imported on first use.
+
+        Parameters
+        ----------
+        name : str
+            Name of software, see `RoomSimSoftware`.
+        module : str
+            Module to import to run the simulation.
+        simulate : function
+            Function computing the RIRs, called by
+            `compute_multi_mic_room_irs` with prepared parameters.
+        air_absorption : bool, optional
+            Whether air absorption can be simulated.
+        ism_order : bool, optional
+            Whether the ISM order can be set.
+        freq_dep : bool, optional
+            Whether frequency-dependent materials can be used.
+        ray_tracing : bool, optional
+            Whether ray tracing is available.
+        ray_tracing_only : bool, optional
+            Whether the software always uses ray tracing.
+        per_pair_rt60 : bool, optional
+            Whether one RT60 per mic-source pair can be simulated in a single
+            call, otherwise one room is simulated per pair.
+        direct_gain : float, optional
+            Amplitude of the direct sound at a distance of 1 m, i.e. the
+            scale of the RIRs, e.g. to match a synthesized late tail.
+        arrivals : function, optional
+            Function computing the packed arrivals of the image sources
+            instead of RIRs, see `arrivals.py`, if available.
+        """
+        self.name = name
+        self.module = module
+        self.simulate = simulate
+        self.air_absorption = air_absorption
+        self.ism_order = ism_order
+        self.freq_dep = freq_dep
+        self.ray_tracing = ray_tracing
+        self.ray_tracing_only = ray_tracing_only
+        self.per_pair_rt60 = per_pair_rt60
+        self.direct_gain = direct_gain
+        self.arrivals = arrivals
+
+    def load(self):
+        """Import and return the module of the backend."""
+        try:
+            return importlib.import_module(self.module)
+        except ImportError as e:
+            raise ImportError(
+                "`{}` is required for the `{}` software, see README for "
+                "installation : {}".format(self.module, self.name, e)
+            ) from e
+
+
+# name -> SimulationBackend, see `register_backend`
+BACKENDS = dict()
+
+
+def register_backend(backend):
+    """Make `backend` available as `software` of `compute_room_irs`."""
+    BACKENDS[backend.name] = backend
+
+
+def get_backend(software):
+    """Return `SimulationBackend` registered as `software`."""
+    if software not in BACKENDS:
+        raise ValueError("Invalid simulation software.")
+    return BACKENDS[software]
 
 
 def is_inside(source_loc, room_dim):
@@ -26,10 +115,34 @@ def is_inside(source_loc, room_dim):
         width, length, and height of room
 
     """
-    for s, r in zip(*[source_loc, room_dim]):
-        if s > r or s < 0:
-            return False
-    return True
+    return bool(positions_inside(source_loc, room_dim))
+
+
+def positions_inside(positions, room_dim, min_distance=0.0):
+    """
+
+    Vectorized version of `is_inside` for batches of positions and rooms,
+    with an optional minimum distance to the walls.
+
+    Return boolean array of shape `positions.shape[:-1]`.
+
+    Parameters
+    ------------
+    positions : array
+        x, y, and z coordinates, of shape (..., 3).
+    room_dim : array
+        Width, length, and height of rooms, broadcastable to the shape of
+        `positions`.
+    min_distance : float, optional
+        Minimum distance to every wall.
+
+    """
+    positions = np.asarray(positions, dtype=float)
+    room_dim = np.asarray(room_dim, dtype=float)
+    return np.all(
+        (positions >= min_distance) & (positions <= room_dim - min_distance),
+        axis=-1,
+    )
 
 
 def get_subdirectories(parent_dir):
@@ -68,6 +181,119 @@ def rt60_to_absorption(room_dim, rt60):
     return 1.0 - np.exp(-0.163 * vol / rt60 / area)
 
 
+# ISM order when not provided
+DEFAULT_ISM_ORDER = 17
+
+# largest order selected with "auto", above which the number of images, and
+# the cost of the simulation, becomes prohibitive
+MAX_ISM_ORDER = 50
+
+# energy of the images left out by the "auto" ISM order, in dB below the
+# energy of the full decay, i.e. the range of the RT60 so that the EDC, and
+# T20 / T30, are not cut short. E.g. orders 27 and 41 are selected for a
+# 5x4x3 m room with an RT60 of 0.2 s and 0.3 s, higher than
+# `DEFAULT_ISM_ORDER` for all but absorptive rooms, while very reverberant
+# rooms are limited to `MAX_ISM_ORDER`
+ISM_ENERGY_DB = 60.0
+
+
+def select_ism_order(
+    room_dim, absorption, energy_db=ISM_ENERGY_DB, max_order=MAX_ISM_ORDER
+):
+    """
+    Smallest ISM order such that the energy of the images beyond it is at
+    least `energy_db` dB below the energy of the full decay, in every band.
+
+    Image energies are summed per order up to `max_order`, see
+    `numpy_ism.order_energies`, and the full decay is extrapolated beyond
+    `max_order` as a geometric series, as the energy of successive orders
+    tends to decrease by a constant ratio. Return `max_order` if no lower
+    order reaches the floor.
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) or a Shoebox room.
+    absorption : float or array
+        Energy absorption coefficient, broadcastable to (..., 6, n_bands)
+        with walls in `WALLS` order, e.g. from `rt60_to_absorption`.
+    energy_db : float, optional
+        Energy floor in dB below the full decay.
+    max_order : int, optional
+        Largest order considered.
+
+    Returns
+    -------
+    int or array
+        Order of shape `absorption.shape[:-2]`.
+    """
+    numpy_ism = get_backend(RoomSimSoftware.NUMPY).load()
+    absorption = np.asarray(absorption, dtype=float)
+    if absorption.ndim == 0:
+        absorption = absorption[None, None]
+    absorption = np.broadcast_to(
+        absorption, absorption.shape[:-2] + (6, absorption.shape[-1])
+    )
+    if max_order < 2:
+        return np.full(absorption.shape[:-2], max_order)[()]
+
+    energies = numpy_ism.order_energies(room_dim, absorption, max_order)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = energies[..., -1, :] / energies[..., -2, :]
+    ratio = np.clip(np.nan_to_num(ratio), 0.0, 1.0 - 1e-9)
+    tail = energies[..., -1, :] * ratio / (1.0 - ratio)
+
+    # energy of the images beyond each order
+    beyond = np.cumsum(energies[..., :0:-1, :], axis=-2)[..., ::-1, :]
+    beyond = np.concatenate(
+        [beyond, np.zeros_like(energies[..., :1, :])], axis=-2
+    )
+    beyond += tail[..., None, :]
+    total = energies.sum(axis=-2) + tail
+    below = np.all(
+        beyond <= 10 ** (-energy_db / 10) * total[..., None, :], axis=-1
+    )
+    # last order is always accepted
+    below[..., -1] = True
+    return np.argmax(below, axis=-1)[()]
+
+
+def resolve_ism_order(
+    room_dim,
+    room_properties,
+    n_mics=1,
+    n_sources=1,
+    energy_db=ISM_ENERGY_DB,
+    max_order=MAX_ISM_ORDER,
+):
+    """
+    ISM order selected by `select_ism_order` for the room properties of
+    `compute_room_irs`, i.e. the order used with `ism_order="auto"`.
+
+    Return an int for an RT60 or materials, shared by all RIRs of the room,
+    and a list (one entry per mic) of lists (one order per source) for a list
+    of RT60s.
+    """
+    if isinstance(room_properties, dict):
+        numpy_ism = get_backend(RoomSimSoftware.NUMPY).load()
+        absorption = material_absorption(
+            [room_properties[wall] for wall in numpy_ism.WALLS],
+            center_freqs=numpy_ism.OCTAVE_CENTER_FREQS,
+        )
+    elif isinstance(room_properties, list):
+        rt60 = np.array(room_properties, dtype=float, ndmin=2)
+        rt60 = np.broadcast_to(rt60, (n_mics, n_sources))
+        absorption = rt60_to_absorption(room_dim, rt60)[:, :, None, None]
+    else:
+        absorption = rt60_to_absorption(room_dim, room_properties)
+    order = select_ism_order(
+        room_dim, absorption, energy_db=energy_db, max_order=max_order
+    )
+    if isinstance(room_properties, list):
+        return order.tolist()
+    return int(order)
+
+
 def compute_room_irs(
     room_dim,
     mic_pos,
@@ -81,6 +307,15 @@ def compute_room_irs(
     scattering=0.5,
     temperature=None,
     software=RoomSimSoftware.PYROOMACOUSTICS,
+    seed=None,
+    cache=None,
+    profiler=None,
+    dense=False,
+    trim_db=None,
+    ism_energy_db=ISM_ENERGY_DB,
+    late_tail=False,
+    arrivals=False,
+    arrivals_floor_db=None,
 ):
     """
 
@@ -98,76 +333,553 @@ def compute_room_irs(
         List of coordinates for source positions.
     ray_tracing : bool
         Whether to apply ray tracing.
-    room_properties : float or dict, optional
+    room_properties : float, list or dict, optional
         If float, average RT60 of the room from which the average absorption is
-        determined using Eyring's equation. If dict, one entry per wall in
-        `WallRegistry` for the corresponding material.
+        determined using Eyring's equation. If list, one RT60 per source. If
+        dict, one entry per wall in `WallRegistry` for the corresponding
+        material, either its name in `materials_absorption_table` or a
+        description in the same format, e.g. from `absorption_fit.py`.
     sample_rate : int, optional
         Sample rate in Hz.
-    ism_order : int, optional
-        Number of specular reflections to model with ISM.
+    ism_order : int or str, optional
+        Number of specular reflections to model with ISM, default is
+        `DEFAULT_ISM_ORDER`. If "auto", the smallest order whose left out
+        images are `ism_energy_db` below the full decay, see
+        `select_ism_order`. The selected order is the same for all RIRs of a
+        room, except with one RT60 per source, and is given by
+        `resolve_ism_order`.
     air_absorption : bool
         Whether to include air absorption in the simulation.
     ray_tracing_param : dict, optional
-        Dict of parameters for ray tracing.
+        Dict of parameters for ray tracing. With `pyroomacoustics`,
+        `n_rays="auto"` traces rays until the EDCs converge, see
+        `pra_adaptive_ray_tracing`, with the keys of `ADAPTIVE_RAYS_PARAM`
+        as additional parameters. The number of rays used is recorded in the
+        `ray_tracing` stage of `profiler`.
     scattering : float, optional
         Average scattering coefficient for all surfaces and frequencies.
     temperature : float, optional
         Temperature in Celsius.
     software : str, optional
-        Which simulation software to use. "pyroomacoustics" (default) or
-        "pygsound".
+        Which simulation software to use. "pyroomacoustics" (default),
+        "pygsound" or "numpy".
+    seed : int or list of int, optional
+        Seed of the random parts of the simulation, i.e. `pyroomacoustics`
+        ray tracing engine if supported and the late tail. NumPy's global
+        random generator is left untouched.
+    cache : RIRCache, optional
+        On-disk cache to look up RIRs from and store them to, see
+        `rir_cache.RIRCache`.
+    profiler : StageProfiler, optional
+        Collector of the duration and sizes of each simulation stage, see
+        `profiling.StageProfiler`.
+    dense : bool, optional
+        Whether to return RIRs as a single float32 array of shape
+        (n_sources, T), zero-padded to the longest RIR, followed by the
+        length of each RIR, i.e. `rirs, lengths, sample_rate`.
+    trim_db : float, optional
+        Trim trailing samples of each RIR whose remaining energy is more than
+        `trim_db` dB below the total energy of the RIR.
+    ism_energy_db : float, optional
+        Energy floor in dB of `ism_order="auto"`.
+    late_tail : bool, optional
+        Whether to replace the reflections after the mixing time by a
+        statistical late tail, shaped by the RT60 or the per-band absorption
+        of the materials, see `late_tail.py`. Default ISM order is then the
+        lowest one covering the early reflections. Not compatible with
+        `ray_tracing`.
+    arrivals : bool, optional
+        Whether to return the arrivals of the image sources, i.e. their
+        delay, amplitude per band and reflection order, packed as in
+        `arrivals.py`, instead of RIRs. They can be rendered at any sample
+        rate with `arrivals.render_arrivals`. Only available for "numpy",
+        not compatible with `ray_tracing` and `late_tail`, and not cached.
+    arrivals_floor_db : float, optional
+        Drop arrivals more than `arrivals_floor_db` dB below the strongest
+        arrival of their RIR in every band, see `arrivals.pack_arrivals`.
+    """
+
+    assert len(mic_pos) == 3
+    res = compute_multi_mic_room_irs(
+        room_dim=room_dim,
+        mic_pos=[mic_pos],
+        source_pos=source_pos,
+        ray_tracing=ray_tracing,
+        room_properties=room_properties,
+        sample_rate=sample_rate,
+        ism_order=ism_order,
+        air_absorption=air_absorption,
+        ray_tracing_param=ray_tracing_param,
+        scattering=scattering,
+        temperature=temperature,
+        software=software,
+        seed=seed,
+        cache=cache,
+        profiler=profiler,
+        dense=dense,
+        trim_db=trim_db,
+        ism_energy_db=ism_energy_db,
+        late_tail=late_tail,
+        arrivals=arrivals,
+        arrivals_floor_db=arrivals_floor_db,
+    )
+    if arrivals:
+        return res
+    if dense:
+        rirs, lengths, sample_rate = res
+        return rirs[0], lengths[0], sample_rate
+    rirs, sample_rate = res
+    return rirs[0], sample_rate
+
+
+def compute_multi_mic_room_irs(
+    room_dim,
+    mic_pos,
+    source_pos,
+    ray_tracing=False,
+    room_properties=0.5,
+    sample_rate=16000,
+    ism_order=None,
+    air_absorption=False,
+    ray_tracing_param=None,
+    scattering=0.5,
+    temperature=None,
+    software=RoomSimSoftware.PYROOMACOUSTICS,
+    seed=None,
+    cache=None,
+    profiler=None,
+    dense=False,
+    trim_db=None,
+    ism_energy_db=ISM_ENERGY_DB,
+    late_tail=False,
+    arrivals=False,
+    arrivals_floor_db=None,
+):
+    """
+
+    Compute the RIRs between multiple mic positions and one or multiple
+    source position(s), building a single room for all of them. Parameters
+    are the same as for `compute_room_irs`, except `mic_pos` which is a list
+    of mic coordinates.
+
+    Return the RIRs as a list (one entry per mic) of lists (one entry per
+    source), i.e. `rirs[m][s]` is the RIR between mic `m` and source `s`, and
+    the sample rate. If `dense`, return a float32 array of shape
+    (n_mics, n_sources, T), an array of shape (n_mics, n_sources) with the
+    length of each RIR, and the sample rate. If `arrivals`, return the
+    packed arrivals of all mic-source pairs.
+
+    Parameters
+    ----------
+    room_dim : array or list
+        3D array, specifying (width, length, height) or a Shoebox room.
+    mic_pos : list of arrays
+        List of coordinates for microphone positions.
+    source_pos : list of arrays
+        List of coordinates for source positions.
+    room_properties : float, list or dict, optional
+        Same as for `compute_room_irs`, except that a list of RT60s can also
+        be nested, i.e. one list per mic with one RT60 per source. With the
+        "numpy" software, image geometry is computed once for all pairs and
+        only re-weighted for each RT60. Other software simulate one room per
+        mic-source pair.
+
     """
 
+    if profiler is None:
+        profiler = null_profiler
+    backend = get_backend(software)
+
     # check input parameters
     assert len(room_dim) == 3
-    assert len(mic_pos) == 3
+    for _pos in mic_pos:
+        assert len(_pos) == 3
     mic_pos = np.array(mic_pos, ndmin=2).T
     for _pos in source_pos:
         assert len(_pos) == 3
 
-    # prepare parameters
-    energy_absorption = None
-    scattering_config = {
-        "description": "Flat scattering",
-        "coeffs": [scattering],
-    }
-    if isinstance(room_properties, dict):
-        materials_config = dict()
-        for wall in room_properties:
-            materials_config[wall] = pra.Material(
-                energy_absorption=materials_absorption_table[
-                    room_properties[wall]
-                ],
-                scattering=scattering_config,
+    # adaptive ISM order, resolved first so that cache keys hold the order
+    if isinstance(ism_order, str) and backend.ism_order:
+        if ism_order != "auto":
+            raise ValueError("Invalid `ism_order` : {}".format(ism_order))
+        with profiler.stage("ism_order") as sizes:
+            ism_order = resolve_ism_order(
+                room_dim=room_dim,
+                room_properties=room_properties,
+                n_mics=mic_pos.shape[1],
+                n_sources=len(source_pos),
+                energy_db=ism_energy_db,
+            )
+            sizes["max_order"] = int(np.max(ism_order))
+
+    # hybrid of early reflections and statistical late tail, imported on use
+    # as it depends on `numpy_ism`
+    if late_tail:
+        from late_tail import early_ism_order
+
+        if ray_tracing:
+            raise ValueError("`late_tail` replaces ray tracing.")
+        if not backend.ism_order:
+            raise ValueError(
+                "`late_tail` requires setting the ISM order, not available "
+                "for `{}`.".format(software)
             )
-    elif isinstance(room_properties, float):
+        if ism_order is None:
+            ism_order = early_ism_order(
+                room_dim, mic_pos.T, source_pos, temperature=temperature
+            )
+
+    # sparse arrivals of the image sources, rendered by the caller
+    if arrivals:
+        if ray_tracing or late_tail:
+            raise ValueError(
+                "`arrivals` are only available for the image source method."
+            )
+        if backend.arrivals is None:
+            raise ValueError(
+                "`arrivals` not available for `{}`.".format(software)
+            )
+
+    # look up previously simulated RIRs
+    if cache is not None and not arrivals:
+        cache_param = dict()
+        if late_tail:
+            cache_param["late_tail"] = late_tail
+        cache_key = make_cache_key(
+            **cache_param,
+            room_dim=room_dim,
+            mic_pos=mic_pos.T,
+            source_pos=source_pos,
+            ray_tracing=ray_tracing,
+            room_properties=room_properties,
+            sample_rate=sample_rate,
+            ism_order=ism_order,
+            air_absorption=air_absorption,
+            ray_tracing_param=ray_tracing_param,
+            scattering=scattering,
+            temperature=temperature,
+            software=software,
+            seed=_seed_key(seed),
+        )
+        with profiler.stage("cache_lookup") as sizes:
+            cached = cache.get(cache_key)
+            sizes["hits"] = int(cached is not None)
+        if cached is not None:
+            return _format_rirs(*cached, dense=dense, trim_db=trim_db)
+
+    # seed can also be a sequence of ints, e.g. [run, room, mic], and is
+    # only used by the simulation, not by NumPy's global generator
+    seed_sequence = None
+    if seed is not None:
+        seed_sequence = seed
+        if not isinstance(seed, np.random.SeedSequence):
+            seed_sequence = np.random.SeedSequence(seed)
+        seed = int(seed_sequence.generate_state(1)[0])
+
+    # unique RT60 per mic-source pair
+    if isinstance(room_properties, list):
+        rt60 = np.array(room_properties, dtype=float, ndmin=2)
+        rt60 = np.broadcast_to(rt60, (mic_pos.shape[1], len(source_pos)))
+        if not backend.per_pair_rt60:
+            # independent seed for each pair
+            pair_seeds = None
+            if seed_sequence is not None:
+                pair_seeds = seed_sequence.spawn(rt60.size)
+            rirs = []
+            for m in range(mic_pos.shape[1]):
+                mic_rirs = []
+                for n, _pos in enumerate(source_pos):
+                    resp, sample_rate = compute_multi_mic_room_irs(
+                        room_dim=room_dim,
+                        mic_pos=[mic_pos[:, m]],
+                        source_pos=[_pos],
+                        ray_tracing=ray_tracing,
+                        room_properties=float(rt60[m, n]),
+                        sample_rate=sample_rate,
+                        ism_order=(
+                            ism_order[m][n]
+                            if isinstance(ism_order, list)
+                            else ism_order
+                        ),
+                        air_absorption=air_absorption,
+                        ray_tracing_param=ray_tracing_param,
+                        scattering=scattering,
+                        temperature=temperature,
+                        software=software,
+                        seed=(
+                            pair_seeds[m * len(source_pos) + n]
+                            if pair_seeds is not None
+                            else None
+                        ),
+                        cache=cache,
+                        profiler=profiler,
+                        late_tail=late_tail,
+                    )
+                    mic_rirs += resp[0]
+                rirs.append(mic_rirs)
+            return _format_rirs(
+                rirs, sample_rate, dense=dense, trim_db=trim_db
+            )
+
+    # RT60 to absorption, materials are resolved by each backend
+    energy_absorption = None
+    if isinstance(room_properties, float):
         energy_absorption = rt60_to_absorption(
             room_dim=room_dim, rt60=room_properties
         )
-        materials_config = pra.Material(
-            energy_absorption=energy_absorption, scattering=scattering_config
-        )
-    else:
+    elif isinstance(room_properties, list):
+        energy_absorption = rt60_to_absorption(room_dim=room_dim, rt60=rt60)
+        # one absorption per mic-source pair, for all walls and frequencies
+        energy_absorption = energy_absorption[:, :, None, None]
+    elif not isinstance(room_properties, dict):
         raise ValueError(
             "Invalid `materials`, must be `dict` with an entry"
-            " for each wall or a `float` for an RT60."
+            " for each wall, a `float` for an RT60 or a `list` of RT60s."
+        )
+
+    if air_absorption and not backend.air_absorption:
+        print("Air absorption not available for `{}`.".format(software))
+    if ism_order is not None and not backend.ism_order:
+        print("ISM order cannot be set for `{}`.".format(software))
+    if ray_tracing and not backend.ray_tracing:
+        print("Ray tracing not available for `{}`.".format(software))
+    if isinstance(room_properties, dict) and not backend.freq_dep:
+        raise ValueError(
+            "`room_property` must be an RT60 value for `{}`".format(software)
+        )
+
+    if arrivals:
+        return backend.arrivals(
+            room_dim=room_dim,
+            mic_pos=mic_pos,
+            source_pos=source_pos,
+            room_properties=room_properties,
+            energy_absorption=energy_absorption,
+            ism_order=ism_order,
+            air_absorption=air_absorption,
+            temperature=temperature,
+            profiler=profiler,
+            floor_db=arrivals_floor_db,
         )
 
     # build room and simulate
-    if software == RoomSimSoftware.PYROOMACOUSTICS:
+    rirs = backend.simulate(
+        room_dim=room_dim,
+        mic_pos=mic_pos,
+        source_pos=source_pos,
+        room_properties=room_properties,
+        energy_absorption=energy_absorption,
+        sample_rate=sample_rate,
+        ism_order=ism_order,
+        air_absorption=air_absorption,
+        ray_tracing=ray_tracing,
+        ray_tracing_param=ray_tracing_param,
+        scattering=scattering,
+        temperature=temperature,
+        seed=seed,
+        profiler=profiler,
+        dense=dense and not late_tail,
+    )
 
-        if ism_order is None:
-            ism_order = 17
+    if late_tail:
+        from late_tail import add_late_tail, room_decay_times
+
+        with profiler.stage("late_tail") as sizes:
+            t60, center_freqs = room_decay_times(
+                room_dim, room_properties, air_absorption=air_absorption
+            )
+            rirs = add_late_tail(
+                rirs,
+                room_dim=room_dim,
+                mic_pos=mic_pos.T,
+                source_pos=source_pos,
+                t60=t60,
+                sample_rate=sample_rate,
+                center_freqs=center_freqs,
+                temperature=temperature,
+                direct_gain=backend.direct_gain,
+                seed=seed_sequence,
+            )
+            sizes["rir_samples"] = int(
+                sum(len(_rir) for _mic in rirs for _rir in _mic)
+            )
+
+    if cache is not None:
+        with profiler.stage("cache_put"):
+            if isinstance(rirs, tuple):
+                # views of dense output, without padding
+                _rirs, _lengths = rirs
+                cache.put(
+                    cache_key,
+                    [
+                        [_rir[: _lengths[m, s]] for s, _rir in enumerate(_mic)]
+                        for m, _mic in enumerate(_rirs)
+                    ],
+                    sample_rate,
+                )
+            else:
+                cache.put(cache_key, rirs, sample_rate)
+
+    return _format_rirs(rirs, sample_rate, dense=dense, trim_db=trim_db)
+
+
+def _seed_key(seed):
+    """Seed as it is hashed in cache keys, e.g. for spawned seeds."""
+    if isinstance(seed, np.random.SeedSequence):
+        return [seed.entropy] + list(seed.spawn_key)
+    return seed
+
+
+def rir_lengths(rirs):
+    """Length of each RIR of a list of lists, as an integer array."""
+    return np.array(
+        [[len(_rir) for _rir in _mic] for _mic in rirs], dtype=np.int64
+    )
 
-        pyroomacoustics_rt_param = {
-            "n_rays": int(1e5),
-            "receiver_radius": 0.5,
-            "time_thres": 10.0,
+
+def stack_rirs(rirs, lengths=None, dtype=np.float32):
+    """
+    Stack RIRs into a single array, zero-padded to the longest RIR.
+
+    Parameters
+    ----------
+    rirs : list of lists
+        `rirs[m][s]` is the RIR between mic `m` and source `s`.
+    lengths : array, optional
+        Number of samples to keep for each RIR, shape (n_mics, n_sources).
+        Default is the full length of each RIR.
+    dtype : numpy dtype, optional
+        Data type of output.
+
+    Returns
+    -------
+    array
+        RIRs of shape (n_mics, n_sources, max(lengths)).
+    """
+    if lengths is None:
+        lengths = rir_lengths(rirs)
+    out = np.zeros(lengths.shape + (int(lengths.max()),), dtype=dtype)
+    for m, _mic in enumerate(rirs):
+        for s, _rir in enumerate(_mic):
+            out[m, s, : lengths[m, s]] = _rir[: lengths[m, s]]
+    return out
+
+
+def trim_lengths(rirs, trim_db, lengths=None):
+    """
+    Length of each RIR after trimming trailing samples whose remaining
+    energy, i.e. sum of squares until the end, is more than `trim_db` dB below
+    the total energy of the RIR.
+
+    Parameters
+    ----------
+    rirs : list of lists or array
+        `rirs[m][s]` is the RIR between mic `m` and source `s`, e.g. output of
+        `stack_rirs`.
+    trim_db : float
+        Energy floor in dB, e.g. 60 to trim below -60 dB.
+    lengths : array, optional
+        Current length of each RIR, shape (n_mics, n_sources).
+    """
+    if lengths is None:
+        lengths = rir_lengths(rirs)
+    trimmed = np.zeros_like(lengths)
+    for m, _mic in enumerate(rirs):
+        for s, _rir in enumerate(_mic):
+            # remaining energy is non-increasing, so samples above the floor
+            # are exactly those to keep
+            energy = np.cumsum(
+                np.square(_rir[: lengths[m, s]][::-1], dtype=float)
+            )[::-1]
+            if len(energy) == 0:
+                continue
+            floor = energy[0] * 10 ** (-trim_db / 10)
+            trimmed[m, s] = np.count_nonzero(energy > floor)
+    return trimmed
+
+
+def _format_rirs(rirs, sample_rate, dense=False, trim_db=None):
+    """
+    Output of `compute_multi_mic_room_irs` from simulated RIRs, either a list
+    of lists or a tuple of a dense array and lengths.
+    """
+    if isinstance(rirs, tuple):
+        rirs, lengths = rirs
+    else:
+        lengths = rir_lengths(rirs)
+    if trim_db is not None:
+        lengths = trim_lengths(rirs, trim_db, lengths=lengths)
+
+    if not dense:
+        rirs = [
+            [_rir[: lengths[m, s]] for s, _rir in enumerate(_mic)]
+            for m, _mic in enumerate(rirs)
+        ]
+        return rirs, sample_rate
+
+    if isinstance(rirs, np.ndarray) and rirs.dtype == np.float32:
+        # already dense, only zero trimmed samples and shorten
+        rirs = rirs[..., : int(lengths.max())]
+        if trim_db is not None:
+            rirs[np.arange(rirs.shape[-1]) >= lengths[..., None]] = 0
+    else:
+        rirs = stack_rirs(rirs, lengths=lengths)
+    return rirs, lengths, sample_rate
+
+
+def _simulate_pyroomacoustics(
+    room_dim,
+    mic_pos,
+    source_pos,
+    room_properties,
+    energy_absorption,
+    sample_rate,
+    ism_order,
+    air_absorption,
+    ray_tracing,
+    ray_tracing_param,
+    scattering,
+    temperature,
+    seed,
+    profiler,
+    dense,
+):
+    pra = get_backend(RoomSimSoftware.PYROOMACOUSTICS).load()
+
+    if ism_order is None:
+        ism_order = DEFAULT_ISM_ORDER
+
+    pyroomacoustics_rt_param = {
+        "n_rays": int(1e5),
+        "receiver_radius": 0.5,
+        "time_thres": 10.0,
+    }
+    if ray_tracing_param is not None:
+        pyroomacoustics_rt_param.update(ray_tracing_param)
+    adaptive_param = None
+    if pyroomacoustics_rt_param["n_rays"] == "auto":
+        adaptive_param = {
+            key: pyroomacoustics_rt_param.pop(key, value)
+            for key, value in ADAPTIVE_RAYS_PARAM.items()
         }
-        if ray_tracing_param is not None:
-            pyroomacoustics_rt_param.update(ray_tracing_param)
+        pyroomacoustics_rt_param["n_rays"] = adaptive_param["rays_step"]
 
+    with profiler.stage("materials"):
+        if isinstance(room_properties, dict):
+            materials_config = {
+                wall: get_pra_material(room_properties[wall], scattering)
+                for wall in room_properties
+            }
+        else:
+            materials_config = pra.Material(
+                energy_absorption=energy_absorption,
+                scattering={
+                    "description": "Flat scattering",
+                    "coeffs": [scattering],
+                },
+            )
+
+    with profiler.stage("room_setup", n_sources=len(source_pos)):
         room = pra.room.ShoeBox(
             p=room_dim,
             fs=sample_rate,
@@ -179,73 +891,196 @@ def compute_room_irs(
             temperature=temperature,
             humidity=0 if temperature is not None else None,
         )
+        rng_state = None
         if ray_tracing:
             room.set_ray_tracing(**pyroomacoustics_rt_param)
+            if seed is not None and hasattr(pra, "random"):
+                # ray tracing engine has its own generator in recent versions,
+                # whose state is restored after simulating
+                rng_state = pra.random.get_rng().bit_generator.state
+                pra.random.seed(seed)
 
         # add sources
         for _source_loc in source_pos:
             room.add_source(list(_source_loc))
 
-        # compute RIRs
-        room.compute_rir()
-        rirs = room.rir[0]
-
-    elif software == RoomSimSoftware.PYGSOUND:
-
-        assert energy_absorption is not None
-        assert isinstance(
-            room_properties, float
-        ), "`room_property` must be an RT60 value for `pygsound`"
-        if air_absorption:
-            print("Air absorption not available for `pygsound`.")
-        if ism_order is not None:
-            print("ISM order cannot be set for `pygsound`.")
-        pygsound_param = {
-            "diffuse_count": 20000,
-            "specular_count": 2000,
-            "src_radius": 0.01,
-            "mic_radius": 0.01,
-        }
-        if ray_tracing_param is not None:
-            pygsound_param.update(ray_tracing_param)
+    # compute RIRs, stages are run explicitly to time them separately
+    try:
+        if room.simulator_state["ism_needed"]:
+            with profiler.stage("image_source_model") as sizes:
+                room.image_source_model()
+                sizes["n_images"] = int(
+                    sum(_source.images.shape[1] for _source in room.sources)
+                )
+        if ray_tracing:
+            with profiler.stage(
+                "ray_tracing", n_pairs=mic_pos.shape[1] * len(source_pos)
+            ) as sizes:
+                if adaptive_param is None:
+                    room.ray_tracing()
+                    sizes["n_rays"] = int(pyroomacoustics_rt_param["n_rays"])
+                else:
+                    sizes["n_rays"] = pra_adaptive_ray_tracing(
+                        room, pyroomacoustics_rt_param, **adaptive_param
+                    )
+        with profiler.stage("compute_rir") as sizes:
+            room.compute_rir()
+            rirs = room.rir
+            sizes["rir_samples"] = int(
+                sum(len(_rir) for _mic in rirs for _rir in _mic)
+            )
+    finally:
+        if rng_state is not None:
+            pra.random.get_rng().bit_generator.state = rng_state
+    return rirs
 
-        # simulation variables
-        ctx = ps.Context()
-        ctx.diffuse_count = pygsound_param["diffuse_count"]
-        ctx.specular_count = pygsound_param["specular_count"]
-        if "specular_depth" in pygsound_param:
-            ctx.specular_depth = pygsound_param["specular_depth"]
-        ctx.channel_type = ps.ChannelLayoutType.mono
-        ctx.sample_rate = sample_rate
 
-        # create ShoeBox room
-        mesh2 = ps.createbox(
-            _width=room_dim[0],
-            _length=room_dim[1],
-            _height=room_dim[2],
-            _absorp=energy_absorption,
-            _scatter=scattering,
+def _simulate_pygsound(
+    room_dim,
+    mic_pos,
+    source_pos,
+    room_properties,
+    energy_absorption,
+    sample_rate,
+    ism_order,
+    air_absorption,
+    ray_tracing,
+    ray_tracing_param,
+    scattering,
+    temperature,
+    seed,
+    profiler,
+    dense,
+):
+    assert isinstance(
+        room_properties, float
+    ), "`room_property` must be an RT60 value for `pygsound`"
+    pygsound_param = {
+        "diffuse_count": 20000,
+        "specular_count": 2000,
+        "src_radius": 0.01,
+        "mic_radius": 0.01,
+    }
+    if ray_tracing_param is not None:
+        pygsound_param.update(ray_tracing_param)
+
+    # scene and context are reused across calls with the same parameters
+    with profiler.stage("pygsound_scene") as sizes:
+        n_scenes = len(_pygsound_scenes)
+        scene, ctx = get_pygsound_scene(
+            room_dim=room_dim,
+            energy_absorption=energy_absorption,
+            scattering=scattering,
+            sample_rate=sample_rate,
+            diffuse_count=pygsound_param["diffuse_count"],
+            specular_count=pygsound_param["specular_count"],
+            specular_depth=pygsound_param.get("specular_depth"),
         )
-        scene = ps.Scene()
-        scene.setMesh(mesh2)
+        sizes["created"] = int(len(_pygsound_scenes) != n_scenes)
 
-        # compute RIRs
-        rirs = []
-        for _pos in source_pos:
-            _rir = pygsound_compute_ir(
-                scene=scene,
-                context=ctx,
-                source_pos=_pos,
-                mic_pos=mic_pos,
-                src_radius=pygsound_param["src_radius"],
-                mic_radius=pygsound_param["mic_radius"],
-            )
-            rirs.append(_rir)
+    # compute RIRs, scene is shared by all mics
+    return pygsound_compute_irs(
+        scene=scene,
+        context=ctx,
+        source_pos=source_pos,
+        mic_pos=mic_pos,
+        src_radius=pygsound_param["src_radius"],
+        mic_radius=pygsound_param["mic_radius"],
+        profiler=profiler,
+    )
 
-    else:
-        raise ValueError("Invalid simulation software.")
 
-    return rirs, sample_rate
+def _simulate_numpy(
+    room_dim,
+    mic_pos,
+    source_pos,
+    room_properties,
+    energy_absorption,
+    sample_rate,
+    ism_order,
+    air_absorption,
+    ray_tracing,
+    ray_tracing_param,
+    scattering,
+    temperature,
+    seed,
+    profiler,
+    dense,
+):
+    numpy_ism = get_backend(RoomSimSoftware.NUMPY).load()
+
+    if ism_order is None:
+        ism_order = DEFAULT_ISM_ORDER
+
+    return numpy_ism.simulate_shoebox(
+        room_dim=room_dim,
+        mic_pos=mic_pos.T,
+        source_pos=source_pos,
+        absorption=_numpy_absorption(
+            room_properties, energy_absorption, profiler
+        ),
+        sample_rate=sample_rate,
+        ism_order=ism_order,
+        air_absorption=air_absorption,
+        temperature=temperature,
+        profiler=profiler,
+        dense=dense,
+    )
+
+
+def _numpy_arrivals(
+    room_dim,
+    mic_pos,
+    source_pos,
+    room_properties,
+    energy_absorption,
+    ism_order,
+    air_absorption,
+    temperature,
+    profiler,
+    floor_db=None,
+):
+    from arrivals import pack_arrivals
+
+    numpy_ism = get_backend(RoomSimSoftware.NUMPY).load()
+
+    if ism_order is None:
+        ism_order = DEFAULT_ISM_ORDER
+
+    delays, gains, orders, center_freqs = numpy_ism.shoebox_arrivals(
+        room_dim=room_dim,
+        mic_pos=mic_pos.T,
+        source_pos=source_pos,
+        absorption=_numpy_absorption(
+            room_properties, energy_absorption, profiler
+        ),
+        ism_order=ism_order,
+        air_absorption=air_absorption,
+        temperature=temperature,
+        profiler=profiler,
+    )
+    with profiler.stage("pack_arrivals") as sizes:
+        res = pack_arrivals(
+            delays,
+            gains,
+            orders,
+            center_freqs=center_freqs,
+            floor_db=floor_db,
+        )
+        sizes["n_arrivals"] = len(res["delays"])
+    return res
+
+
+def _numpy_absorption(room_properties, energy_absorption, profiler):
+    """Energy absorption of the walls for `numpy_ism`."""
+    if energy_absorption is not None:
+        return energy_absorption
+    numpy_ism = get_backend(RoomSimSoftware.NUMPY).load()
+    with profiler.stage("materials"):
+        return material_absorption(
+            [room_properties[wall] for wall in numpy_ism.WALLS],
+            center_freqs=numpy_ism.OCTAVE_CENTER_FREQS,
+        )
 
 
 def pygsound_compute_ir(
@@ -255,6 +1090,8 @@ def pygsound_compute_ir(
     assert mic_pos.shape[0] == 3
     assert len(source_pos) == 3
 
+    ps = get_backend(RoomSimSoftware.PYGSOUND).load()
+
     # set source and receiver
     src = ps.Source(source_pos)
     src.radius = src_radius
@@ -267,3 +1104,332 @@ def pygsound_compute_ir(
     if np.linalg.norm(ir) == 0.0:
         raise ValueError("Either source or mic is outside of room.")
     return ir
+
+
+# `pyroomacoustics` materials built from compiled absorption coefficients,
+# in least-recently-used order
+PRA_MATERIAL_CACHE_SIZE = 256
+_pra_materials = OrderedDict()
+
+
+def get_pra_material(material, scattering):
+    """
+    Return a `pyroomacoustics` Material for a material of
+    `materials_absorption_table` with flat scattering, on the bands of
+    `compile_materials`. Materials are built once per (material, scattering)
+    and a shallow copy is returned, as `pyroomacoustics` resamples the
+    materials of a room in place.
+
+    Parameters
+    ----------
+    material : str or dict
+        Name of material, or material description with the same format as
+        the entries of `materials_absorption_table`, e.g. fitted materials.
+    scattering : float
+        Scattering coefficient.
+    """
+    if isinstance(material, dict):
+        # material description, e.g. fitted, built on each call
+        pra = get_backend(RoomSimSoftware.PYROOMACOUSTICS).load()
+        return pra.Material(
+            energy_absorption=dict(material),
+            scattering={
+                "description": "Flat scattering",
+                "coeffs": [scattering],
+            },
+        )
+
+    key = (material, scattering)
+    if key in _pra_materials:
+        _pra_materials.move_to_end(key)
+        cached = _pra_materials[key]
+    else:
+        pra = get_backend(RoomSimSoftware.PYROOMACOUSTICS).load()
+        index, absorption = compile_materials()
+        cached = pra.Material(
+            energy_absorption={
+                "coeffs": absorption[index[material]].tolist(),
+                "center_freqs": list(CENTER_FREQS),
+            },
+            scattering={
+                "description": "Flat scattering",
+                "coeffs": [scattering],
+            },
+        )
+        _pra_materials[key] = cached
+        while len(_pra_materials) > PRA_MATERIAL_CACHE_SIZE:
+            _pra_materials.popitem(last=False)
+
+    # shallow copy, without the overhead of `copy.copy`
+    material_config = object.__new__(type(cached))
+    material_config.__dict__.update(cached.__dict__)
+    return material_config
+
+
+# prepared `pygsound` contexts and scenes, in least-recently-used order
+PYGSOUND_CACHE_SIZE = 16
+_pygsound_contexts = OrderedDict()
+_pygsound_scenes = OrderedDict()
+
+
+# parameters of adaptive ray tracing, i.e. `ray_tracing_param` with
+# `n_rays="auto"`: rays of the first batch, maximum number of rays, and
+# tolerance in dB on the change of the EDCs between successive estimates
+ADAPTIVE_RAYS_PARAM = {
+    "rays_step": 5000,
+    "max_rays": int(1e6),
+    "rays_tol": 0.5,
+}
+
+# EDCs of adaptive ray tracing are compared down to this level, in dB
+ADAPTIVE_RAYS_RANGE_DB = 30.0
+
+
+def _histogram_edc(histograms):
+    """
+    EDCs in dB of ray tracing histograms, along the last axis, normalized to
+    0 dB at the first bin.
+    """
+    edc = np.cumsum(histograms[..., ::-1], axis=-1)[..., ::-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return 10 * np.log10(edc / edc[..., :1])
+
+
+def pra_adaptive_ray_tracing(
+    room, rt_param, rays_step=5000, max_rays=int(1e6), rays_tol=0.5
+):
+    """
+    Ray tracing of a `pyroomacoustics` room with batches of increasing size
+    until the EDCs of all mic-source pairs and bands converge.
+
+    Each batch has as many rays as all previous ones, i.e. the number of rays
+    doubles, and as `pyroomacoustics` histograms are normalized per ray,
+    the estimate after each batch is the average of all batches weighted by
+    their number of rays. Batches of different sizes are traced in different
+    directions. Tracing stops once the EDCs change by less than `rays_tol`
+    dB down to `ADAPTIVE_RAYS_RANGE_DB` below their start, or after
+    `max_rays`. The histograms of the room are then set to the final
+    estimate, for `room.compute_rir`.
+
+    Return the total number of rays traced per source.
+
+    Parameters
+    ----------
+    room : pyroomacoustics.room.ShoeBox
+        Room with ray tracing set.
+    rt_param : dict
+        Other arguments of `room.set_ray_tracing`.
+    rays_step : int, optional
+        Number of rays of the first batch.
+    max_rays : int, optional
+        Maximum total number of rays.
+    rays_tol : float, optional
+        Tolerance in dB on the change of the EDCs.
+    """
+    n_rays = 0
+    n_batch = int(rays_step)
+    histograms = 0.0
+    edc = None
+    while True:
+        room.set_ray_tracing(**dict(rt_param, n_rays=n_batch))
+        room.ray_tracing()
+        # shape (n_mics, n_sources, n_directions, n_bands, n_bins)
+        histograms = histograms + n_batch * np.asarray(room.rt_histograms)
+        n_rays += n_batch
+
+        new_edc = _histogram_edc(histograms)
+        if edc is not None:
+            valid = (edc >= -ADAPTIVE_RAYS_RANGE_DB) & (
+                new_edc >= -ADAPTIVE_RAYS_RANGE_DB
+            )
+            change = np.abs(new_edc[valid] - edc[valid])
+            if change.size == 0 or change.max() <= rays_tol:
+                break
+        if n_rays >= max_rays:
+            break
+        edc = new_edc
+        n_batch = min(n_rays, max_rays - n_rays)
+
+    room.rt_histograms = [
+        [list(_hist) for _hist in _mic] for _mic in histograms / n_rays
+    ]
+    return n_rays
+
+
+def _cache_lookup(cache, key, create):
+    if key in cache:
+        cache.move_to_end(key)
+        return cache[key]
+    value = create()
+    cache[key] = value
+    while len(cache) > PYGSOUND_CACHE_SIZE:
+        cache.popitem(last=False)
+    return value
+
+
+def get_pygsound_scene(
+    room_dim,
+    energy_absorption,
+    scattering,
+    sample_rate,
+    diffuse_count=20000,
+    specular_count=2000,
+    specular_depth=None,
+):
+    """
+    Return `(scene, context)` for a ShoeBox room with `pygsound`, creating
+    them only if no call with the same parameters was made recently.
+
+    Parameters
+    ----------
+    room_dim : 3D array
+        Width, length, and height of room.
+    energy_absorption : float
+        Energy absorption of all walls.
+    scattering : float
+        Scattering coefficient of all walls.
+    sample_rate : int
+        Sample rate in Hz.
+    diffuse_count : int, optional
+        Number of diffuse rays.
+    specular_count : int, optional
+        Number of specular rays.
+    specular_depth : int, optional
+        Maximum specular reflection order, `pygsound` default if not provided.
+    """
+
+    ps = get_backend(RoomSimSoftware.PYGSOUND).load()
+
+    def _create_context():
+        ctx = ps.Context()
+        ctx.diffuse_count = diffuse_count
+        ctx.specular_count = specular_count
+        if specular_depth is not None:
+            ctx.specular_depth = specular_depth
+        ctx.channel_type = ps.ChannelLayoutType.mono
+        ctx.sample_rate = sample_rate
+        return ctx
+
+    def _create_scene():
+        mesh = ps.createbox(
+            _width=room_dim[0],
+            _length=room_dim[1],
+            _height=room_dim[2],
+            _absorp=energy_absorption,
+            _scatter=scattering,
+        )
+        scene = ps.Scene()
+        scene.setMesh(mesh)
+        return scene
+
+    ctx_key = (
+        int(diffuse_count),
+        int(specular_count),
+        specular_depth,
+        int(sample_rate),
+    )
+    scene_key = (
+        tuple(float(d) for d in room_dim),
+        float(energy_absorption),
+        float(scattering),
+    )
+    ctx = _cache_lookup(_pygsound_contexts, ctx_key, _create_context)
+    scene = _cache_lookup(_pygsound_scenes, scene_key, _create_scene)
+    return scene, ctx
+
+
+def clear_pygsound_cache():
+    """Release all cached `pygsound` contexts and scenes."""
+    _pygsound_contexts.clear()
+    _pygsound_scenes.clear()
+
+
+def pygsound_compute_irs(
+    scene,
+    context,
+    source_pos,
+    mic_pos,
+    src_radius=0.01,
+    mic_radius=0.01,
+    profiler=None,
+):
+    """
+    Compute RIRs between many sources and listeners of the same scene.
+
+    Parameters
+    ----------
+    scene : pygsound.Scene
+        Scene, e.g. from `get_pygsound_scene`.
+    context : pygsound.Context
+        Simulation context, e.g. from `get_pygsound_scene`.
+    source_pos : list of 3D arrays
+        Source positions.
+    mic_pos : array
+        Listener positions, of shape (3, n_mics).
+    src_radius : float, optional
+        Source radius in meters.
+    mic_radius : float, optional
+        Listener radius in meters.
+    profiler : StageProfiler, optional
+        Collector of the duration of each call to `computeIR`.
+
+    Returns
+    -------
+    rirs : list of lists
+        `rirs[m][s]` is the RIR between mic `m` and source `s`.
+    """
+    if profiler is None:
+        profiler = null_profiler
+    mic_pos = np.array(mic_pos)
+    assert mic_pos.shape[0] == 3
+    rirs = []
+    for m in range(mic_pos.shape[1]):
+        mic_rirs = []
+        for _pos in source_pos:
+            with profiler.stage("compute_ir") as sizes:
+                _rir = pygsound_compute_ir(
+                    scene=scene,
+                    context=context,
+                    source_pos=_pos,
+                    mic_pos=mic_pos[:, m : m + 1],
+                    src_radius=src_radius,
+                    mic_radius=mic_radius,
+                )
+                sizes["rir_samples"] = len(_rir)
+            mic_rirs.append(_rir)
+        rirs.append(mic_rirs)
+    return rirs
+
+
+register_backend(
+    SimulationBackend(
+        name=RoomSimSoftware.PYROOMACOUSTICS,
+        module="pyroomacoustics",
+        simulate=_simulate_pyroomacoustics,
+        air_absorption=True,
+        ism_order=True,
+        freq_dep=True,
+        ray_tracing=True,
+    )
+)
+register_backend(
+    SimulationBackend(
+        name=RoomSimSoftware.PYGSOUND,
+        module="pygsound",
+        simulate=_simulate_pygsound,
+        ray_tracing=True,
+        ray_tracing_only=True,
+    )
+)
+register_backend(
+    SimulationBackend(
+        name=RoomSimSoftware.NUMPY,
+        module="numpy_ism",
+        simulate=_simulate_numpy,
+        air_absorption=True,
+        ism_order=True,
+        freq_dep=True,
+        per_pair_rt60=True,
+        arrivals=_numpy_arrivals,
+    )
+)